@@ -23,6 +23,78 @@ def create_app():
     app.config["TOGETHER_MODEL"] = Config.TOGETHER_MODEL
     app.config["GOOGLE_API_KEY"] = Config.GOOGLE_API_KEY
     app.config["GOOGLE_CSE_ID"] = Config.GOOGLE_CSE_ID
+    app.config["AI_PROVIDER"] = Config.AI_PROVIDER
+    app.config["FAKE_AI_LATENCY"] = Config.FAKE_AI_LATENCY
+    app.config["FAKE_AI_ERROR_RATE"] = Config.FAKE_AI_ERROR_RATE
+    app.config["AI_RECORD"] = Config.AI_RECORD
+    app.config["AI_RECORDING_PATH"] = Config.AI_RECORDING_PATH
+    app.config["REPLAY_LATENCY"] = Config.REPLAY_LATENCY
+    app.config["REPLAY_TOKENS_PER_SECOND"] = Config.REPLAY_TOKENS_PER_SECOND
+    app.config["REPLAY_CSE_LATENCY"] = Config.REPLAY_CSE_LATENCY
+    app.config["AI_MAX_CONCURRENT"] = Config.AI_MAX_CONCURRENT
+    app.config["AI_MAX_CONCURRENT_PER_SEKOLAH"] = Config.AI_MAX_CONCURRENT_PER_SEKOLAH
+    app.config["AI_QUEUE_TIMEOUT"] = Config.AI_QUEUE_TIMEOUT
+    app.config["AI_RATE_LIMIT_PER_MINUTE"] = Config.AI_RATE_LIMIT_PER_MINUTE
+    app.config["AI_RATE_LIMIT_BURST"] = Config.AI_RATE_LIMIT_BURST
+    app.config["AI_RETRY_MAX"] = Config.AI_RETRY_MAX
+    app.config["AI_RETRY_BASE_DELAY"] = Config.AI_RETRY_BASE_DELAY
+    app.config["AI_RETRY_MAX_DELAY"] = Config.AI_RETRY_MAX_DELAY
+    app.config["AI_BREAKER_THRESHOLD"] = Config.AI_BREAKER_THRESHOLD
+    app.config["AI_BREAKER_COOLDOWN"] = Config.AI_BREAKER_COOLDOWN
+    app.config["AI_FALLBACK_MODELS"] = Config.AI_FALLBACK_MODELS
+    app.config["AI_HEDGE_DELAY"] = Config.AI_HEDGE_DELAY
+    app.config["AI_HEDGE_MAX"] = Config.AI_HEDGE_MAX
+    app.config["AI_HEDGE_WORKERS"] = Config.AI_HEDGE_WORKERS
+    app.config["CACHE_DIR"] = Config.CACHE_DIR
+    app.config["AI_CACHE_ENABLED"] = Config.AI_CACHE_ENABLED
+    app.config["AI_CACHE_TTL"] = Config.AI_CACHE_TTL
+    app.config["AI_CACHE_MAX_ITEMS"] = Config.AI_CACHE_MAX_ITEMS
+    app.config["AI_COALESCE_ENABLED"] = Config.AI_COALESCE_ENABLED
+    app.config["IDEMPOTENCY_TTL"] = Config.IDEMPOTENCY_TTL
+    app.config["IDEMPOTENCY_MAX_ITEMS"] = Config.IDEMPOTENCY_MAX_ITEMS
+    app.config["IMAGE_SEARCH_WORKERS"] = Config.IMAGE_SEARCH_WORKERS
+    app.config["IMAGE_SEARCH_TIMEOUT"] = Config.IMAGE_SEARCH_TIMEOUT
+    app.config["IMAGE_CACHE_TTL"] = Config.IMAGE_CACHE_TTL
+    app.config["IMAGE_CACHE_NEGATIVE_TTL"] = Config.IMAGE_CACHE_NEGATIVE_TTL
+    app.config["IMAGE_CACHE_MAX_ITEMS"] = Config.IMAGE_CACHE_MAX_ITEMS
+    app.config["IMAGE_CACHE_MAX_ITEMS_DISK"] = Config.IMAGE_CACHE_MAX_ITEMS_DISK
+    app.config["EXTRACTION_WORKERS"] = Config.EXTRACTION_WORKERS
+    app.config["EXTRACTION_PAGE_TIMEOUT"] = Config.EXTRACTION_PAGE_TIMEOUT
+    app.config["EXTRACTION_PAGES_PER_TASK"] = Config.EXTRACTION_PAGES_PER_TASK
+    app.config["TESSERACT_CMD"] = Config.TESSERACT_CMD
+    app.config["OCR_LANG"] = Config.OCR_LANG
+    app.config["OCR_PSM"] = Config.OCR_PSM
+    app.config["OCR_DPI"] = Config.OCR_DPI
+    app.config["OCR_MAX_SIDE"] = Config.OCR_MAX_SIDE
+    app.config["OCR_BINARIZE"] = Config.OCR_BINARIZE
+    app.config["OCR_USE_TESSEROCR"] = Config.OCR_USE_TESSEROCR
+    app.config["OCR_WORKERS"] = Config.OCR_WORKERS
+    app.config["OCR_TIMEOUT"] = Config.OCR_TIMEOUT
+    app.config["EXTRACTION_CACHE_TTL"] = Config.EXTRACTION_CACHE_TTL
+    app.config["EXTRACTION_CACHE_MAX_ITEMS"] = Config.EXTRACTION_CACHE_MAX_ITEMS
+    app.config["EXTRACTION_CACHE_MAX_BYTES"] = Config.EXTRACTION_CACHE_MAX_BYTES
+    app.config["PDF_RENDER_WORKERS"] = Config.PDF_RENDER_WORKERS
+    app.config["PDF_RENDER_TIMEOUT"] = Config.PDF_RENDER_TIMEOUT
+    app.config["EXAM_VARIANTS_MAX"] = Config.EXAM_VARIANTS_MAX
+    app.config["RENDITION_CACHE_MAX_BYTES"] = Config.RENDITION_CACHE_MAX_BYTES
+    app.config["ANALYSIS_CHUNK_TOKENS"] = Config.ANALYSIS_CHUNK_TOKENS
+    app.config["ANALYSIS_MAX_PARALLEL"] = Config.ANALYSIS_MAX_PARALLEL
+    app.config["RETRIEVAL_PASSAGE_TOKENS"] = Config.RETRIEVAL_PASSAGE_TOKENS
+    app.config["RETRIEVAL_TOP_K"] = Config.RETRIEVAL_TOP_K
+    app.config["RULES_PATH"] = Config.RULES_PATH
+    app.config["PROMPT_TEMPLATE_DIR"] = Config.PROMPT_TEMPLATE_DIR
+    app.config["PROMPT_RELOAD_INTERVAL"] = Config.PROMPT_RELOAD_INTERVAL
+    app.config["SOAL_SHARD_SIZE"] = Config.SOAL_SHARD_SIZE
+    app.config["SOAL_SHARD_WORKERS"] = Config.SOAL_SHARD_WORKERS
+    app.config["SOAL_DEDUP_THRESHOLD"] = Config.SOAL_DEDUP_THRESHOLD
+    app.config["SOAL_JUMLAH_MAX"] = Config.SOAL_JUMLAH_MAX
+    app.config["AI_JOB_WORKERS"] = Config.AI_JOB_WORKERS
+    app.config["AI_JOB_MAX_PER_SEKOLAH"] = Config.AI_JOB_MAX_PER_SEKOLAH
+    app.config["AI_JOB_POLL_INTERVAL"] = Config.AI_JOB_POLL_INTERVAL
+    app.config["AI_JOB_HEARTBEAT_INTERVAL"] = Config.AI_JOB_HEARTBEAT_INTERVAL
+    app.config["AI_JOB_STALE_AFTER"] = Config.AI_JOB_STALE_AFTER
+    app.config["AI_JOB_EVENTS_MAX_SECONDS"] = Config.AI_JOB_EVENTS_MAX_SECONDS
+    app.config["METRICS_TOKEN"] = Config.METRICS_TOKEN
 
     # --- INISIALISASI EKSTENSI ---
     db.init_app(app)
@@ -33,15 +105,23 @@ def create_app():
         resources={r"/api/.*": {"origins": "*"}},
         supports_credentials=True,
         allow_headers=["*"],
-        expose_headers=["Content-Type", "Authorization"]
+        expose_headers=["Content-Type", "Authorization", "X-AI-Cache", "Idempotent-Replayed"]
     )
 
     # --- DAFTARKAN BLUEPRINT ---
     with app.app_context():
-        from .api import auth, classroom, ai_tools
+        from .api import auth, classroom, ai_tools, jobs, metrics
         app.register_blueprint(auth.bp)
         app.register_blueprint(classroom.bp)
         app.register_blueprint(ai_tools.bp)
+        app.register_blueprint(jobs.bp)
+        app.register_blueprint(metrics.bp)
+
+        from .services.job_service import job_queue
+        job_queue.init_app(app)
+
+        from .services.registry import registry
+        registry.init_app(app)
 
     @app.route("/")
     def index():
@@ -2,52 +2,95 @@
 
 import json
 import os
-import tempfile
-import shutil
 import io
 import random
 import re
-import markdown2
+import threading
+import time
+from concurrent.futures import wait
 
-from flask import Blueprint, request, jsonify, current_app, send_file, g
+from flask import Blueprint, request, jsonify, current_app, send_file, Response, stream_with_context, has_request_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from ..models import RPP, Soal, Ujian, Kelas, User, UserRole
 from .. import db
-from app.services.ai_service import AIService
+from app.services.ai_service import FormatSoalError
+from app.services.registry import registry
+from app.services.extraction import BerkasReferensi
+from app.services.pdf_render import RenderPDFTimeout
+from app.services.ujian import (
+    pisahkan_soal, susun_ujian, seed_dasar, seed_varian, deskripsi_kunci, kunci_csv, gabung_pdf, alirkan_zip
+)
+from app.services.cache_service import status_cache_ai, lewati_cache_ai, buat_kunci, get_rendition_cache
+from app.services.resilience import tetapkan_sekolah_ai, LayananAISibukError
 from app.api.auth import roles_required
+from app.api.decorators import idempoten
 
 from PIL import Image
 import pytesseract
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_JUSTIFY, TA_LEFT, TA_CENTER
-from reportlab.lib.units import inch
 
 bp = Blueprint('ai_api', __name__, url_prefix='/api')
 
 # 1. Fungsi Bantuan untuk mendapatkan instance AIService
-def get_ai_service():
-    if 'ai_service' not in g:
-        api_key = current_app.config.get('TOGETHER_API_KEY')
-        model_name = current_app.config.get('TOGETHER_MODEL')
-        
-        if not api_key or not model_name:
-            current_app.logger.error("Together AI API key atau model name tidak ditemukan dalam konfigurasi aplikasi.")
-            raise RuntimeError("Konfigurasi Together AI tidak lengkap. Pastikan TOGETHER_API_KEY dan TOGETHER_MODEL diatur.")
-        
-        g.ai_service = AIService(api_key=api_key, model_name=model_name)
-    return g.ai_service
+# Instance dibangun sekali per proses oleh registry, bukan per request
+def get_ai_service(sekolah_id=None):
+    # Sekolah pemilik request (dari data yang sudah dimuat endpoint, tanpa query tambahan) dicatat
+    # agar panggilan AI dibatasi per sekolah (lihat services/resilience.py). Job latar belakang
+    # mencatat sekolahnya sendiri di JobQueue.
+    if has_request_context():
+        tetapkan_sekolah_ai(sekolah_id)
+    return registry.get_ai_service()
+
+def terapkan_opsi_cache():
+    # ?segarkan=1 memaksa generate ulang tanpa membaca cache (hasil baru tetap disimpan)
+    if request.args.get('segarkan') in ('1', 'true'):
+        lewati_cache_ai()
+
+def tandai_status_cache(response):
+    # Header ini dibaca UI untuk menampilkan bahwa hasil berasal dari cache
+    response.headers['X-AI-Cache'] = 'HIT' if status_cache_ai() else 'MISS'
+    return response
 
 # 2. Hapus instance global:
 # baris "ai_service_instance = AIService(...)" dihapus dari sini.
 
+def baca_berkas_upload(file_storages):
+    # Upload diekstrak langsung dari buffer Werkzeug, tanpa disimpan ulang ke folder sementara
+    return [BerkasReferensi.dari_upload(f) for f in file_storages if f and f.filename]
+
+def tutup_berkas(berkas_list):
+    for berkas in berkas_list:
+        berkas.tutup()
+
+def analisis_file_referensi(ai_service, berkas_list, sekolah_id=None, user_id=None):
+    """Ekstrak teks dari semua file lalu analisis; None jika tidak ada teks yang terbaca."""
+    teks_list = ai_service.extract_texts(berkas_list)
+    # Teks yang sudah diekstrak sekalian disimpan ke pustaka referensi sekolah
+    ai_service.indeks_referensi(berkas_list, teks_list, sekolah_id, user_id)
+    combined_text = "".join(teks + "\n\n" for teks in teks_list)
+
+    if not combined_text.strip():
+        return None
+    return ai_service.analyze_reference_text(combined_text)
+
 # 3. Gunakan get_ai_service() di setiap endpoint
+@bp.route('/ai-stats', methods=['GET'])
+@jwt_required()
+@roles_required(['Super User'])
+def ai_stats_endpoint():
+    # Statistik per proses worker: pelindung panggilan dan win rate backend (untuk menyetel AI_HEDGE_DELAY)
+    ai_service = registry.get_ai_service()
+    return jsonify({
+        "pelindung": ai_service.pelindung.stats(),
+        "hedging": ai_service.hedging.stats(),
+        "penggabung": ai_service.penggabung.stats()
+    }), 200
+
 @bp.route('/analyze-referensi', methods=['POST'])
 @jwt_required()
 @roles_required(['Admin', 'Guru', 'Super User'])
+@idempoten('analyze-referensi')
 def analyze_referensi_endpoint():
-    ai_service = get_ai_service() # <--- Gunakan fungsi ini
+    terapkan_opsi_cache()
     if 'file' not in request.files:
         return jsonify({'message': 'Request harus menyertakan setidaknya satu file.'}), 400
 
@@ -56,40 +99,37 @@ def analyze_referensi_endpoint():
     if not uploaded_files or uploaded_files[0].filename == '':
         return jsonify({'message': 'Tidak ada file yang dipilih.'}), 400
 
-    temp_dir = tempfile.mkdtemp()
-    combined_text = ""
-    bibliography = []
+    user = User.query.get_or_404(get_jwt_identity())
+    ai_service = get_ai_service(user.sekolah_id)
+    berkas_list = baca_berkas_upload(uploaded_files)
+    bibliography = [berkas.nama for berkas in berkas_list]
 
     try:
-        for file_storage in uploaded_files:
-            if file_storage and file_storage.filename:
-                file_path = os.path.join(temp_dir, file_storage.filename)
-                file_storage.save(file_path)
-                
-                extracted_text = ai_service.extract_text_from_file(file_path)
-                combined_text += extracted_text + "\n\n"
-                bibliography.append(file_storage.filename)
-
-        if not combined_text.strip():
+        analysis_result = analisis_file_referensi(ai_service, berkas_list, user.sekolah_id, user.id)
+        if analysis_result is None:
             return jsonify({'message': 'Gagal mengekstrak teks dari file atau semua file kosong.'}), 400
 
-        analysis_result = ai_service.analyze_reference_text(combined_text)
         analysis_result['bibliografi'] = bibliography
+        analysis_result['cache_hit'] = status_cache_ai()
 
-        return jsonify(analysis_result)
+        return tandai_status_cache(jsonify(analysis_result))
 
+    except LayananAISibukError as e:
+        # Provider sedang terganggu/antrean penuh: gagal cepat agar klien bisa mencoba lagi
+        return jsonify({'message': str(e)}), 503
     except Exception as e:
         current_app.logger.error(f"Error pada saat analisis referensi: {e}", exc_info=True)
         return jsonify({'message': f"Terjadi kesalahan internal: {str(e)}"}), 500
     finally:
-        shutil.rmtree(temp_dir, ignore_errors=True)
+        tutup_berkas(berkas_list)
 
 # 3. Endpoint untuk Generate RPP
 @bp.route('/generate-rpp', methods=['POST'])
 @jwt_required()
 @roles_required(['Admin', 'Guru', 'Super User'])
+@idempoten('generate-rpp')
 def generate_rpp_endpoint():
-    ai_service = get_ai_service() # <--- Gunakan fungsi ini
+    terapkan_opsi_cache()
     data = request.form
     required_fields = ['mapel', 'jenjang', 'topik', 'alokasi_waktu']
     if not all(k in data for k in required_fields):
@@ -97,18 +137,9 @@ def generate_rpp_endpoint():
 
     user_id = get_jwt_identity()
     user = User.query.get_or_404(user_id)
+    ai_service = get_ai_service(user.sekolah_id)
     
-    file_uploads = request.files.getlist('file_paths')
-    file_paths = []
-    temp_dir = None
-    
-    if file_uploads:
-        temp_dir = tempfile.mkdtemp()
-        for file_upload in file_uploads:
-            if file_upload and file_upload.filename:
-                file_path = os.path.join(temp_dir, file_upload.filename)
-                file_upload.save(file_path)
-                file_paths.append(file_path)
+    berkas_list = baca_berkas_upload(request.files.getlist('file_paths'))
 
     try:
         rpp_data = {
@@ -121,15 +152,78 @@ def generate_rpp_endpoint():
         
         hasil_rpp = ai_service.generate_rpp_from_ai(
             rpp_data=rpp_data,
-            file_paths=file_paths
+            berkas_list=berkas_list,
+            sekolah_id=user.sekolah_id,
+            user_id=user.id
         )
-        return jsonify({'rpp': hasil_rpp})
+        return tandai_status_cache(jsonify({'rpp': hasil_rpp, 'cache_hit': status_cache_ai()}))
+    except LayananAISibukError as e:
+        # Provider sedang terganggu/antrean penuh: gagal cepat agar klien bisa mencoba lagi
+        return jsonify({'message': str(e)}), 503
     except Exception as e:
         current_app.logger.error(f"Error saat memanggil AI untuk RPP: {e}", exc_info=True)
         return jsonify({'message': f'Terjadi kesalahan internal: {e}'}), 500
     finally:
-        if temp_dir:
-            shutil.rmtree(temp_dir, ignore_errors=True)
+        tutup_berkas(berkas_list)
+
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# Versi streaming dari /generate-rpp: potongan markdown dikirim sebagai Server-Sent Events
+@bp.route('/generate-rpp/stream', methods=['POST'])
+@jwt_required()
+@roles_required(['Admin', 'Guru', 'Super User'])
+def generate_rpp_stream_endpoint():
+    terapkan_opsi_cache()
+    data = request.form
+    required_fields = ['mapel', 'jenjang', 'topik', 'alokasi_waktu']
+    if not all(k in data for k in required_fields):
+        return jsonify({'message': 'Data input (mapel, jenjang, topik, alokasi_waktu) tidak lengkap.'}), 400
+
+    user_id = get_jwt_identity()
+    user = User.query.get_or_404(user_id)
+    ai_service = get_ai_service(user.sekolah_id)
+
+    # File referensi diekstrak sebelum streaming dimulai, selagi buffer upload masih terbuka
+    rpp_data = {
+        "mapel": data.get('mapel'),
+        "jenjang": data.get('jenjang'),
+        "topik": data.get('topik'),
+        "alokasi_waktu": data.get('alokasi_waktu'),
+        "nama_penyusun": user.nama_lengkap
+    }
+
+    berkas_list = baca_berkas_upload(request.files.getlist('file_paths'))
+    try:
+        referensi_text = ai_service.siapkan_referensi_rpp(rpp_data, berkas_list, user.sekolah_id, user.id)
+    except LayananAISibukError as e:
+        # Sama seperti /generate-rpp: klien membaca pesan JSON sebelum stream dimulai
+        return jsonify({'message': str(e)}), 503
+    except Exception as e:
+        current_app.logger.error(f"Error saat menyiapkan referensi RPP: {e}", exc_info=True)
+        return jsonify({'message': f'Terjadi kesalahan internal: {e}'}), 500
+    finally:
+        tutup_berkas(berkas_list)
+
+    def generate():
+        waktu_mulai = time.monotonic()
+        try:
+            for jenis, isi in ai_service.stream_rpp_from_ai(rpp_data, referensi_text):
+                if jenis == "chunk":
+                    yield format_sse("chunk", {"teks": isi})
+                else:
+                    isi["durasi_detik"] = round(time.monotonic() - waktu_mulai, 2)
+                    yield format_sse("selesai", isi)
+        except Exception as e:
+            current_app.logger.error(f"Error saat streaming RPP: {e}", exc_info=True)
+            yield format_sse("error", {"message": f"Terjadi kesalahan internal: {e}"})
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Matikan buffering reverse proxy (nginx) agar event langsung sampai ke browser
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 
 @bp.route('/rpp', methods=['POST'])
@@ -223,6 +317,7 @@ def update_rpp(id_rpp):
     rpp.konten_markdown = data.get('konten_markdown', rpp.konten_markdown)
     
     db.session.commit()
+    get_rendition_cache().hapus('rpp', rpp.id)
     return jsonify({'message': 'RPP berhasil diperbarui!'}), 200
 
 @bp.route('/rpp/<int:id_rpp>', methods=['DELETE'])
@@ -239,12 +334,104 @@ def delete_rpp(id_rpp):
     try:
         db.session.delete(rpp)
         db.session.commit()
+        get_rendition_cache().hapus('rpp', id_rpp)
         return jsonify({'message': f'RPP "{rpp.judul}" berhasil dihapus!'}), 200
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"Error saat menghapus RPP: {e}", exc_info=True)
         return jsonify({'message': 'Gagal menghapus RPP.'}), 500
     
+# Naikkan jika tampilan PDF RPP berubah agar rendisi lama di cache tidak dipakai lagi
+VERSI_RENDER_RPP = '2'
+
+def sidik_rpp(rpp):
+    # Sidik isi RPP: kunci cache rendisi sekaligus ETag
+    return buat_kunci('rpp-pdf', VERSI_RENDER_RPP, rpp.judul, rpp.konten_markdown)
+
+def deskripsi_pdf_rpp(rpp):
+    # Deskripsi dokumen yang dikirim ke process pool render PDF (lihat services/pdf_render.py)
+    return {'jenis': 'rpp', 'judul': rpp.judul, 'konten_markdown': rpp.konten_markdown}
+
+VERSI_RENDER_UJIAN = '1'
+
+def sidik_ujian(ujian):
+    # Sidik isi ujian tersimpan: kunci cache rendisi sekaligus ETag
+    return buat_kunci('ujian-pdf', VERSI_RENDER_UJIAN, ujian.judul, ujian.konten_json, ujian.pengaturan_layout or '{}')
+
+def deskripsi_pdf_ujian(ujian):
+    # Pengacakan memakai seed dari isi ujian, sehingga PDF yang di-cache tetap sama untuk isi yang sama
+    questions_data = json.loads(ujian.konten_json)
+    layout_settings = json.loads(ujian.pengaturan_layout or '{}')
+    mcq_questions, essay_questions = pisahkan_soal(questions_data)
+    deskripsi, _ = susun_ujian(mcq_questions, essay_questions, layout_settings,
+                               rng=random.Random(seed_dasar(ujian.judul, questions_data, layout_settings)))
+    return deskripsi
+
+# Pra-render ujian yang sedang berjalan di proses ini: {(id_ujian, sidik): future}
+_prarender_ujian = {}
+_prarender_ujian_lock = threading.Lock()
+
+def prarender_ujian(ujian):
+    """
+    Mengajukan render PDF ujian di latar belakang; hasilnya disimpan ke cache rendisi
+    oleh callback future, sehingga unduhan pertama tidak perlu menunggu render.
+    """
+    kunci = (ujian.id, sidik_ujian(ujian))
+    cache = get_rendition_cache()
+    logger = current_app.logger
+    future = registry.get_pdf_renderer().submit(deskripsi_pdf_ujian(ujian))
+
+    def simpan(f):
+        # Dijalankan di thread process pool, tanpa konteks aplikasi
+        try:
+            data, _ = f.result()
+            cache.simpan('ujian', kunci[0], kunci[1], data)
+        except Exception as e:
+            logger.warning(f"Pra-render PDF ujian {kunci[0]} gagal: {e}")
+        finally:
+            with _prarender_ujian_lock:
+                _prarender_ujian.pop(kunci, None)
+
+    with _prarender_ujian_lock:
+        _prarender_ujian[kunci] = future
+    future.add_done_callback(simpan)
+
+def render_ujian(ujian, sidik):
+    # Pra-render yang masih berjalan ditunggu, bukan dirender ulang
+    with _prarender_ujian_lock:
+        future = _prarender_ujian.get((ujian.id, sidik))
+    renderer = registry.get_pdf_renderer()
+    if future is None:
+        return renderer.render(deskripsi_pdf_ujian(ujian))
+    return renderer.hasil(future)
+
+def kirim_pdf(data, nama_file):
+    # Bytes PDF dikirim bertahap oleh Werkzeug (file wrapper), bukan sebagai satu body besar
+    return send_file(io.BytesIO(data), as_attachment=True, download_name=nama_file, mimetype='application/pdf')
+
+def kirim_rendisi(jenis, id_objek, sidik, render, nama_file):
+    """
+    Mengirim PDF dari cache rendisi dengan ETag = sidik. Klien yang mengirim If-None-Match
+    yang cocok mendapat 304; PDF baru dirender (render()) hanya jika belum ada di cache.
+    """
+    if request.if_none_match.contains(sidik):
+        response = Response(status=304)
+    else:
+        cache = get_rendition_cache()
+        path = cache.ambil(jenis, id_objek, sidik)
+        try:
+            berkas = open(path, 'rb') if path else None
+        except FileNotFoundError:
+            # Terhapus oleh eviksi proses lain di antara ambil() dan open()
+            berkas = None
+        if berkas is None:
+            berkas = open(cache.simpan(jenis, id_objek, sidik, render()), 'rb')
+        response = send_file(berkas, as_attachment=True, download_name=nama_file, mimetype='application/pdf')
+    response.set_etag(sidik)
+    # Isi bergantung pada pengguna yang login; browser wajib validasi ulang dengan If-None-Match
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
 @bp.route('/rpp/<int:id_rpp>/download-pdf', methods=['GET'])
 @jwt_required()
 @roles_required(['Super User', 'Guru'])
@@ -257,103 +444,107 @@ def download_rpp_pdf(id_rpp):
         return jsonify({'message': 'Anda tidak memiliki hak untuk mengunduh RPP ini.'}), 403
 
     try:
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4,
-                                rightMargin=inch, leftMargin=inch,
-                                topMargin=inch, bottomMargin=inch)
-        
-        styles = getSampleStyleSheet()
-        styles.add(ParagraphStyle(name='H1', parent=styles['h1'], fontSize=14, leading=18, spaceBefore=12, spaceAfter=6, alignment=TA_LEFT))
-        styles.add(ParagraphStyle(name='H2', parent=styles['h2'], fontSize=12, leading=16, spaceBefore=10, spaceAfter=5, alignment=TA_LEFT))
-        styles.add(ParagraphStyle(name='Body', parent=styles['Normal'], alignment=TA_JUSTIFY, spaceAfter=10, leading=14))
-        styles.add(ParagraphStyle(name='ListItem', parent=styles['Normal'], leftIndent=20, spaceAfter=2, leading=14, bulletIndent=0))
-
-        story = []
-        story.append(Paragraph(rpp.judul, styles['Title']))
-        story.append(Spacer(1, 0.2 * inch))
-        
-        paragraph_buffer = []
-
-        def close_unclosed_b_tags(text):
-            # Count <b> and </b>
-            open_count = text.count('<b>')
-            close_count = text.count('</b>')
-            if open_count > close_count:
-                text += '</b>' * (open_count - close_count)
-            elif close_count > open_count:
-                # Remove excess closing tags
-                text = text.replace('</b>', '', close_count - open_count)
-            return text
-
-        def escape_stray_angle_brackets(text):
-            # Only allow <b> and </b>, escape others
-            text = re.sub(r'<(?!/?b>)', '&lt;', text)
-            text = re.sub(r'(?<!<b)(?<!</b)>', '&gt;', text)
-            return text
-
-        def process_buffer(story_list, buffer_list):
-            if buffer_list:
-                full_paragraph = " ".join(buffer_list)
-                # Ganti **...** dengan <b>...</b> di dalam paragraf yang sudah digabung
-                full_paragraph = re.sub(r'\*\*(.*?)\*\*', r'<b>\1</b>', full_paragraph)
-                full_paragraph = close_unclosed_b_tags(full_paragraph)
-                full_paragraph = escape_stray_angle_brackets(full_paragraph)
-                story_list.append(Paragraph(full_paragraph, styles['Body']))
-                buffer_list.clear()
-
-
-        for line in rpp.konten_markdown.strip().split('\n'):
-            clean_line = line.strip()
-
-            if not clean_line: # Jika baris kosong, proses buffer paragraf
-                process_buffer(story, paragraph_buffer)
-                continue
-
-            # Cek elemen khusus (Judul, Daftar)
-            is_special_element = False
-
-            # Ganti **...** dengan <b>...</b> sebelum diproses lebih lanjut
-            formatted_line = re.sub(r'\*\*(.*?)\*\*', r'<b>\1</b>', clean_line)
-            formatted_line = close_unclosed_b_tags(formatted_line)
-            formatted_line = escape_stray_angle_brackets(formatted_line)
-
-            if clean_line.startswith('# '):
-                process_buffer(story, paragraph_buffer)
-                story.append(Paragraph(formatted_line.replace('# ', ''), styles['H1']))
-                is_special_element = True
-            elif clean_line.startswith('## '):
-                process_buffer(story, paragraph_buffer)
-                story.append(Paragraph(formatted_line.replace('## ', ''), styles['H2']))
-                is_special_element = True
-            elif clean_line.startswith('* ') or clean_line.startswith('• '):
-                process_buffer(story, paragraph_buffer)
-                final_line = f"•&nbsp;&nbsp;{formatted_line.replace('* ', '').replace('• ', '')}"
-                story.append(Paragraph(final_line, styles['ListItem']))
-                is_special_element = True
-            elif re.match(r'^\d+\.\s+', clean_line):
-                process_buffer(story, paragraph_buffer)
-                story.append(Paragraph(formatted_line, styles['ListItem']))
-                is_special_element = True
-
-            if not is_special_element:
-                paragraph_buffer.append(clean_line)
-
-        process_buffer(story, paragraph_buffer) # Proses sisa buffer di akhir file
-
-        doc.build(story)
-        buffer.seek(0)
         safe_filename = "".join([c for c in rpp.judul if c.isalpha() or c.isdigit() or c in (' ', '-')]).rstrip()
-        
-        return send_file(buffer, as_attachment=True, download_name=f'{safe_filename}.pdf', mimetype='application/pdf')
+        return kirim_rendisi(
+            'rpp', rpp.id, sidik_rpp(rpp),
+            lambda: registry.get_pdf_renderer().render(deskripsi_pdf_rpp(rpp)),
+            f'{safe_filename}.pdf'
+        )
 
+    except RenderPDFTimeout as e:
+        return jsonify({'message': str(e)}), 503
     except Exception as e:
         current_app.logger.error(f"Gagal membuat RPP PDF: {e}", exc_info=True)
         return jsonify({'message': f'Terjadi kesalahan saat membuat file PDF: {str(e)}'}), 500
 
 # 4. Endpoint untuk Generate Soal
+def baca_jumlah_soal(data):
+    """
+    Membaca `jumlah_soal` dari body request (default 5). ValueError (pesan untuk klien)
+    jika bukan bilangan bulat positif atau melebihi SOAL_JUMLAH_MAX.
+    """
+    try:
+        jumlah = int(data.get('jumlah_soal', 5))
+    except (TypeError, ValueError):
+        raise ValueError('jumlah_soal harus berupa angka.')
+    if jumlah < 1:
+        raise ValueError('jumlah_soal minimal 1.')
+    batas = current_app.config['SOAL_JUMLAH_MAX']
+    if jumlah > batas:
+        raise ValueError(f'Jumlah soal maksimal {batas} per permintaan.')
+    return jumlah
+
+def target_jumlah_visual(jumlah_soal_diminta):
+    # Akan mengusahakan 60% dari total soal memiliki visual, dibulatkan (minimal 1).
+    return min(jumlah_soal_diminta, max(1, round(jumlah_soal_diminta * 0.6)))
+
+def soal_punya_visual(soal):
+    # Periksa apakah soal memiliki deskripsi gambar ATAU tabel tertanam
+    # Mengidentifikasi tabel dengan mencari sintaks markdown tabel
+    has_table_in_question = ("|" in soal.get("pertanyaan", "") and 
+                             "---" in soal.get("pertanyaan", "") and 
+                             soal.get("pertanyaan", "").count("|") >= 2)
+    return bool(soal.get("deskripsi_gambar")) or has_table_in_question
+
+def buat_set_soal(ai_service, rpp, jenis_soal, jumlah_soal_diminta):
+    """Menghasilkan list soal final (termasuk saran gambar) untuk sebuah RPP."""
+    jenjang_kelas = rpp.kelas.jenjang if rpp.kelas else 'Umum'
+
+    # Permintaan besar dipecah paralel per shard dan dideduplikasi di dalam service
+    soal_list = ai_service.generate_soal_list(
+        sumber_materi=rpp.konten_markdown,
+        jenis_soal=jenis_soal,
+        jumlah_soal=jumlah_soal_diminta, # Menggunakan jumlah_soal_diminta
+        jenjang=jenjang_kelas,
+        sekolah_id=rpp.sekolah_id,
+        topik=rpp.judul
+    )
+
+    # --- LOGIKA BARU: Terapkan aturan 3 dari 5 gambar/tabel secara proporsional ---
+    
+    # Menentukan target jumlah soal dengan visual (minimal 1 jika ada soal, proporsional)
+    target_visual_count = target_jumlah_visual(jumlah_soal_diminta)
+    
+    candidates_for_visuals = []
+    no_visuals = []
+
+    # Pisahkan soal berdasarkan potensi visual (punya deskripsi_gambar atau tabel)
+    for soal in soal_list:
+        if soal_punya_visual(soal):
+            candidates_for_visuals.append(soal)
+        else:
+            no_visuals.append(soal)
+
+    final_soal_list = []
+    visuals_added_count = 0
+
+    # Prioritaskan soal yang memiliki potensi visual
+    for soal in candidates_for_visuals:
+        if visuals_added_count < target_visual_count:
+            # Soal bertabel sudah lengkap (tabel ada di soal["pertanyaan"]); gambar dicari di bawah
+            final_soal_list.append(soal)
+            visuals_added_count += 1
+        else:
+            no_visuals.append(soal) 
+
+    # Cari gambar untuk semua soal terpilih dalam satu batch paralel
+    soal_perlu_gambar = [soal for soal in final_soal_list if soal.get("deskripsi_gambar")]
+    if soal_perlu_gambar:
+        ai_service.search_images_for_soal(soal_perlu_gambar)
+    
+    # Tambahkan soal tanpa visual hingga mencapai jumlah yang diminta
+    remaining_needed = jumlah_soal_diminta - len(final_soal_list)
+    if remaining_needed > 0:
+        final_soal_list.extend(no_visuals[:remaining_needed])
+    
+    # Potong list jika AI menghasilkan lebih dari jumlah_soal_diminta (atau jika logika di atas menambahkan lebih)
+    return final_soal_list[:jumlah_soal_diminta]
+
+
 @bp.route('/generate-soal', methods=['POST'])
 @jwt_required()
 @roles_required(['Guru'])
+@idempoten('generate-soal')
 def generate_soal_endpoint():
     data = request.get_json()
     if not data or not data.get('rpp_id'):
@@ -368,84 +559,114 @@ def generate_soal_endpoint():
     # Logika 'sertakan_ilustrasi' dihapus karena sekarang diatur secara otomatis
     # sertakan_ilustrasi = data.get('sertakan_ilustrasi', False) 
     
-    jenjang_kelas = rpp.kelas.jenjang if rpp.kelas else 'Umum'
-    jumlah_soal_diminta = data.get('jumlah_soal', 5) # Pastikan default jika tidak ada
+    try:
+        jumlah_soal_diminta = baca_jumlah_soal(data)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
 
     try:
-        ai_service = get_ai_service()
-        
-        hasil_soal_json_str = ai_service.generate_soal_from_ai(
-            sumber_materi=rpp.konten_markdown,
-            jenis_soal=data.get('jenis_soal'),
-            jumlah_soal=jumlah_soal_diminta, # Menggunakan jumlah_soal_diminta
-            jenjang=jenjang_kelas
-        )
-        
-        # --- Logika pembersihan dan parsing JSON dari respons AI ---
-        soal_list = None
-        if "```json" in hasil_soal_json_str:
-            clean_str = hasil_soal_json_str.split('```json', 1)[1].rsplit('```', 1)[0]
-        else:
-            clean_str = hasil_soal_json_str
+        ai_service = get_ai_service(rpp.sekolah_id)
+        terapkan_opsi_cache()
+        final_soal_list = buat_set_soal(ai_service, rpp, data.get('jenis_soal'), jumlah_soal_diminta)
+        return tandai_status_cache(jsonify(final_soal_list))
+
+    except FormatSoalError as e:
+        return jsonify({'message': str(e)}), 500
+    except LayananAISibukError as e:
+        return jsonify({'message': str(e)}), 503
+    except Exception as e:
+        current_app.logger.error(f"Error saat generate soal: {e}", exc_info=True)
+        return jsonify({'message': f'Terjadi kesalahan internal: {str(e)}'}), 500
 
-        try:
-            soal_list = json.loads(clean_str.strip())
-            if not isinstance(soal_list, list):
-                raise ValueError("Respons AI bukan dalam format list of objects.")
-        except (json.JSONDecodeError, ValueError) as e:
-            current_app.logger.error(f"AI mengembalikan respons non-JSON atau format tidak valid: {e}. Raw: {hasil_soal_json_str}")
-            return jsonify({'message': 'AI gagal menghasilkan format soal yang valid. Silakan coba lagi.'}), 500
-        # ----------------------------------------------------------------
-
-        # --- LOGIKA BARU: Terapkan aturan 3 dari 5 gambar/tabel secara proporsional ---
-        
-        # Menentukan target jumlah soal dengan visual (minimal 1 jika ada soal, proporsional)
-        # Akan mengusahakan 60% dari total soal memiliki visual, dibulatkan.
-        target_visual_count = min(jumlah_soal_diminta, max(1, round(jumlah_soal_diminta * 0.6)))
-        
-        candidates_for_visuals = []
-        no_visuals = []
-
-        # Pisahkan soal berdasarkan potensi visual (punya deskripsi_gambar atau tabel)
-        for soal in soal_list:
-            # Periksa apakah soal memiliki deskripsi gambar ATAU tabel tertanam
-            # Mengidentifikasi tabel dengan mencari sintaks markdown tabel
-            has_table_in_question = ("|" in soal.get("pertanyaan", "") and 
-                                     "---" in soal.get("pertanyaan", "") and 
-                                     soal.get("pertanyaan", "").count("|") >= 2)
-
-            if soal.get("deskripsi_gambar") and soal["deskripsi_gambar"] or has_table_in_question:
-                candidates_for_visuals.append(soal)
-            else:
-                no_visuals.append(soal)
-
-        final_soal_list = []
+
+# Versi streaming dari /generate-soal: tiap soal dikirim begitu selesai diterima dari AI,
+# dan pencarian gambarnya langsung dimulai sehingga berjalan bersamaan dengan generate
+@bp.route('/generate-soal/stream', methods=['POST'])
+@jwt_required()
+@roles_required(['Guru'])
+def generate_soal_stream_endpoint():
+    data = request.get_json()
+    if not data or not data.get('rpp_id'):
+        return jsonify({'message': 'ID RPP wajib disertakan.'}), 400
+
+    user_id = int(get_jwt_identity())
+    rpp = RPP.query.get_or_404(data['rpp_id'])
+
+    if rpp.user_id != user_id:
+        return jsonify({'message': 'Akses ditolak.'}), 403
+    try:
+        jumlah_soal_diminta = baca_jumlah_soal(data)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    ai_service = get_ai_service(rpp.sekolah_id)
+    terapkan_opsi_cache()
+    target_visual_count = target_jumlah_visual(jumlah_soal_diminta)
+    jenjang_kelas = rpp.kelas.jenjang if rpp.kelas else 'Umum'
+    sekolah_id = rpp.sekolah_id
+    sumber_materi = rpp.konten_markdown
+    topik = rpp.judul
+
+    def generate():
+        waktu_mulai = time.monotonic()
+        cari_gambar_aktif = bool(ai_service.search_service and ai_service.google_cse_id)
+        berjalan = {} # kueri -> Future, agar kueri yang sama hanya dicari sekali
+        menunggu_gambar = [] # (indeks soal, kueri, Future, batas waktu)
+        jumlah_terkirim = 0
         visuals_added_count = 0
 
-        # Prioritaskan soal yang memiliki potensi visual
-        for soal in candidates_for_visuals:
-            if visuals_added_count < target_visual_count:
-                # Jika soal ini memiliki deskripsi gambar, cari gambarnya
-                if soal.get("deskripsi_gambar") and soal["deskripsi_gambar"]:
-                    processed_soal = ai_service.search_images_for_soal([soal])[0]
-                    final_soal_list.append(processed_soal)
-                else: # Soal ini memiliki tabel (sudah ada di soal["pertanyaan"])
-                    final_soal_list.append(soal)
-                visuals_added_count += 1
-            else:
-                no_visuals.append(soal) 
-        
-        # Tambahkan soal tanpa visual hingga mencapai jumlah yang diminta
-        remaining_needed = jumlah_soal_diminta - len(final_soal_list)
-        if remaining_needed > 0:
-            final_soal_list.extend(no_visuals[:remaining_needed])
-        
-        # Potong list jika AI menghasilkan lebih dari jumlah_soal_diminta (atau jika logika di atas menambahkan lebih)
-        return jsonify(final_soal_list[:jumlah_soal_diminta])
+        def kirim_gambar_selesai(tunggu=False):
+            for item in list(menunggu_gambar):
+                indeks, kueri, future, batas_waktu = item
+                if tunggu and not future.done():
+                    wait([future], timeout=max(0, batas_waktu - time.monotonic()))
+                if future.done() or time.monotonic() >= batas_waktu:
+                    menunggu_gambar.remove(item)
+                    yield format_sse("gambar", {
+                        "indeks": indeks,
+                        "saran_gambar": ai_service.hasil_cari_gambar(future, kueri)
+                    })
 
-    except Exception as e:
-        current_app.logger.error(f"Error saat generate soal: {e}", exc_info=True)
-        return jsonify({'message': f'Terjadi kesalahan internal: {str(e)}'}), 500
+        try:
+            for jenis, isi in ai_service.stream_soal(
+                sumber_materi, data.get('jenis_soal'), jumlah_soal_diminta, jenjang_kelas,
+                sekolah_id=sekolah_id, topik=topik
+            ):
+                if jenis == "soal":
+                    if jumlah_soal_diminta <= jumlah_terkirim:
+                        continue
+                    soal = isi
+                    # Aturan 60% visual diterapkan sesuai urutan soal tiba
+                    if soal_punya_visual(soal) and visuals_added_count < target_visual_count:
+                        visuals_added_count += 1
+                        if soal.get("deskripsi_gambar") and cari_gambar_aktif:
+                            kueri = ai_service.bangun_kueri_gambar(soal)
+                            if kueri:
+                                menunggu_gambar.append((
+                                    jumlah_terkirim, kueri, ai_service.mulai_cari_gambar(kueri, berjalan),
+                                    time.monotonic() + ai_service.image_search_timeout
+                                ))
+                    yield format_sse("soal", {"indeks": jumlah_terkirim, "soal": soal})
+                    jumlah_terkirim += 1
+                    yield from kirim_gambar_selesai()
+                else:
+                    yield from kirim_gambar_selesai(tunggu=True)
+                    if not jumlah_terkirim:
+                        yield format_sse("error", {"message": 'AI gagal menghasilkan format soal yang valid. Silakan coba lagi.'})
+                        return
+                    isi["jumlah_soal"] = jumlah_terkirim
+                    isi["durasi_detik"] = round(time.monotonic() - waktu_mulai, 2)
+                    yield format_sse("selesai", isi)
+        except Exception as e:
+            current_app.logger.error(f"Error saat streaming soal: {e}", exc_info=True)
+            # Soal yang sudah terkirim tetap berlaku; gambar yang sudah selesai ikut dikirim
+            yield from kirim_gambar_selesai()
+            yield format_sse("error", {"message": f"Terjadi kesalahan internal: {e}", "jumlah_soal": jumlah_terkirim})
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 
 @bp.route('/soal', methods=['POST'])
@@ -548,86 +769,132 @@ def generate_exam_pdf_endpoint():
     if not questions_data:
         return jsonify({'message': 'Tidak ada soal yang diberikan untuk membuat ujian PDF.'}), 400
 
-    shuffle_questions = layout_settings.get('shuffle_questions', False)
-    shuffle_answers = layout_settings.get('shuffle_answers', False)
-    student_info_fields = layout_settings.get('student_info_fields', []) 
+    mcq_questions, essay_questions = pisahkan_soal(questions_data)
+    deskripsi, _ = susun_ujian(mcq_questions, essay_questions, layout_settings)
 
-    mcq_questions = []
-    essay_questions = []
+    try:
+        # doc.build berjalan di process pool, bukan di thread request
+        data_pdf = registry.get_pdf_renderer().render(deskripsi)
+    except RenderPDFTimeout as e:
+        return jsonify({'message': str(e)}), 503
+    except Exception as e:
+        current_app.logger.error("Error creating exam PDF: %s", str(e), exc_info=True)
+        return jsonify({'message': f'Gagal membuat file PDF: {e}'}), 500
 
-    for q in questions_data:
-        if q.get('pilihan') and isinstance(q['pilihan'], dict) and q['pilihan']:
-            mcq_questions.append(q)
-        elif q.get('jawaban_ideal') and (not q.get('pilihan') or (isinstance(q.get('pilihan'), dict) and not q['pilihan'])):
-            essay_questions.append(q)
-        else:
-            current_app.logger.warning(f"Soal dengan tipe ambigu atau tidak teridentifikasi dilewati: {q}")
-
-    if shuffle_questions:
-        random.shuffle(mcq_questions)
-        random.shuffle(essay_questions)
-
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4,
-                            leftMargin=inch, rightMargin=inch,
-                            topMargin=inch, bottomMargin=inch)
-    styles = getSampleStyleSheet()
-
-    styles.add(ParagraphStyle(name='TitleStyle', parent=styles['h1'],
-                              fontSize=18, leading=22, spaceAfter=18, alignment=TA_CENTER))
-    styles.add(ParagraphStyle(name='InfoFieldStyle', parent=styles['Normal'],
-                              fontSize=10, leading=12, spaceAfter=6, alignment=TA_LEFT))
-    styles.add(ParagraphStyle(name='QuestionStyle', parent=styles['Normal'],
-                              fontSize=11, leading=13, spaceAfter=8, alignment=TA_JUSTIFY))
-    styles.add(ParagraphStyle(name='OptionStyle', parent=styles['Normal'],
-                              fontSize=10, leading=12, spaceAfter=2, leftIndent=20))
-    styles.add(ParagraphStyle(name='SectionTitleStyle', parent=styles['h2'],
-                              fontSize=14, leading=16, spaceBefore=18, spaceAfter=8, alignment=TA_LEFT))
-
-    story = []
-
-    for field_label in student_info_fields:
-        story.append(Paragraph(f"{field_label}: ___________________________________________", styles['InfoFieldStyle']))
-    story.append(Spacer(1, 0.3 * inch)) 
-
-    if mcq_questions:
-        story.append(Paragraph("Bagian I: Pilihan Ganda", styles['SectionTitleStyle']))
-        for i, q_data in enumerate(mcq_questions):
-            question_text = f"{i+1}. {q_data.get('pertanyaan', '')}"
-            story.append(Paragraph(question_text, styles['QuestionStyle']))
-            
-            if q_data.get('pilihan') and isinstance(q_data['pilihan'], dict):
-                option_values = list(q_data['pilihan'].values())
-                if shuffle_answers:
-                    random.shuffle(option_values)
-                
-                option_labels = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H'] 
-                for j, value in enumerate(option_values):
-                    if j < len(option_labels):
-                        story.append(Paragraph(f"   {option_labels[j]}. {value}", styles['OptionStyle']))
-                    else:
-                        story.append(Paragraph(f"   {chr(65 + j)}. {value}", styles['OptionStyle'])) 
-            story.append(Spacer(1, 0.1 * inch))
-
-    if essay_questions:
-        if mcq_questions:
-            story.append(PageBreak())
-        story.append(Paragraph("Bagian II: Esai", styles['SectionTitleStyle']))
-        for i, q_data in enumerate(essay_questions):
-            question_text = f"{i+1}. {q_data.get('pertanyaan', '')}"
-            story.append(Paragraph(question_text, styles['QuestionStyle']))
-            story.append(Paragraph("   Jawaban: ____________________________________________________________________", styles['OptionStyle']))
-            story.append(Spacer(1, 0.5 * inch)) 
-        story.append(Spacer(1, 0.1 * inch))
+    return kirim_pdf(data_pdf, f"{exam_title.replace(' ', '_')}.pdf")
+
+def _daftar_varian(data, current_user):
+    """
+    Daftar (kode, nama siswa, penanda seed) untuk batch varian: satu varian per siswa
+    di `kelas_id` (urut nama), atau `jumlah_varian` varian tanpa nama.
+    """
+    if data.get('kelas_id'):
+        kelas = Kelas.query.get_or_404(data['kelas_id'])
+        if current_user.role == UserRole.GURU and kelas.user_id != current_user.id:
+            raise PermissionError('Akses ditolak: Anda hanya bisa membuat varian untuk kelas Anda sendiri.')
+        if current_user.role == UserRole.ADMIN and kelas.sekolah_id != current_user.sekolah_id:
+            raise PermissionError('Akses ditolak: Anda hanya bisa membuat varian untuk kelas di sekolah Anda.')
+        siswa_list = sorted(kelas.siswa, key=lambda s: (s.nama_lengkap or '').lower())
+        return [(f"V{i:02d}", s.nama_lengkap, f"siswa:{s.id}") for i, s in enumerate(siswa_list, start=1)]
+    jumlah = int(data.get('jumlah_varian') or 0)
+    return [(f"V{i:02d}", None, f"varian:{i}") for i in range(1, jumlah + 1)]
+
+def _nama_berkas(teks):
+    return re.sub(r'[^\w.-]+', '_', teks).strip('_') or 'ujian'
+
+@bp.route('/generate-exam-pdf/batch', methods=['POST'])
+@jwt_required()
+@roles_required(['Admin', 'Guru', 'Super User'])
+def generate_exam_variants_endpoint():
+    """
+    Membuat satu varian ujian teracak per siswa (atau per nomor varian) beserta kunci
+    jawabannya. Seed tiap varian diturunkan dari `seed` (default: sidik isi ujian) dan
+    identitas siswa, sehingga permintaan yang sama menghasilkan varian yang sama.
+    Format 'zip' (default) di-stream per file; format 'pdf' menggabungkan semua varian.
+    """
+    data = request.get_json() or {}
+    exam_title = data.get('exam_title', 'Ujian')
+    questions_data = data.get('questions', [])
+    layout_settings = data.get('layout', {})
+    format_keluaran = data.get('format', 'zip')
 
+    if not questions_data:
+        return jsonify({'message': 'Tidak ada soal yang diberikan untuk membuat ujian PDF.'}), 400
+    if format_keluaran not in ('zip', 'pdf'):
+        return jsonify({'message': "Format harus 'zip' atau 'pdf'."}), 400
+
+    current_user = User.query.get_or_404(get_jwt_identity())
     try:
-        doc.build(story)
+        varian_spesifikasi = _daftar_varian(data, current_user)
+    except PermissionError as e:
+        return jsonify({'message': str(e)}), 403
+    except (TypeError, ValueError):
+        return jsonify({'message': 'jumlah_varian harus berupa angka.'}), 400
+    if not varian_spesifikasi:
+        return jsonify({'message': 'Isi kelas_id yang memiliki siswa atau jumlah_varian lebih dari 0.'}), 400
+    batas_varian = current_app.config['EXAM_VARIANTS_MAX']
+    if len(varian_spesifikasi) > batas_varian:
+        return jsonify({'message': f'Jumlah varian maksimal {batas_varian} per permintaan.'}), 400
+
+    seed = data.get('seed')
+    if seed is None:
+        seed = seed_dasar(exam_title, questions_data, layout_settings)
+    mcq_questions, essay_questions = pisahkan_soal(questions_data)
+
+    varian_list = []
+    for kode, nama, penanda in varian_spesifikasi:
+        seed_v = seed_varian(seed, penanda)
+        kepala = [f"{exam_title} - Varian {kode}"] + ([nama] if nama else [])
+        deskripsi, kunci = susun_ujian(mcq_questions, essay_questions, layout_settings,
+                                       rng=random.Random(seed_v), kepala=kepala)
+        varian_list.append({'kode': kode, 'nama': nama, 'seed': seed_v, 'deskripsi': deskripsi, 'kunci': kunci})
+
+    renderer = registry.get_pdf_renderer()
+    # Semua varian dan kunci jawaban diajukan sekaligus agar dirender paralel di process pool
+    futures = renderer.submit_banyak([v['deskripsi'] for v in varian_list] + [deskripsi_kunci(exam_title, varian_list)])
+    nama_dasar = _nama_berkas(exam_title)
+
+    if format_keluaran == 'pdf':
+        try:
+            data_pdf = gabung_pdf([renderer.hasil(f) for f in futures])
+        except RenderPDFTimeout as e:
+            renderer.batalkan(futures)
+            return jsonify({'message': str(e)}), 503
+        except Exception as e:
+            renderer.batalkan(futures)
+            current_app.logger.error("Error creating exam variant PDF: %s", str(e), exc_info=True)
+            return jsonify({'message': f'Gagal membuat file PDF: {e}'}), 500
+        return kirim_pdf(data_pdf, f"{nama_dasar}_varian.pdf")
+
+    try:
+        # Varian pertama ditunggu sebelum respons dimulai, agar kegagalan render masih bisa dilaporkan sebagai JSON
+        pdf_pertama = renderer.hasil(futures[0])
+    except RenderPDFTimeout as e:
+        renderer.batalkan(futures)
+        return jsonify({'message': str(e)}), 503
     except Exception as e:
-        current_app.logger.error("Error creating exam PDF: %s", str(e), exc_info=True)
+        renderer.batalkan(futures)
+        current_app.logger.error("Error creating exam variant PDF: %s", str(e), exc_info=True)
         return jsonify({'message': f'Gagal membuat file PDF: {e}'}), 500
 
-    buffer.seek(0)
-    return send_file(buffer, as_attachment=True, download_name=f"{exam_title.replace(' ', '_')}.pdf", mimetype='application/pdf')
+    def berkas_zip():
+        for i, (v, future) in enumerate(zip(varian_list, futures)):
+            nama_file = f"{v['kode']}_{_nama_berkas(v['nama'])}.pdf" if v['nama'] else f"{v['kode']}.pdf"
+            yield nama_file, pdf_pertama if i == 0 else renderer.hasil(future)
+        yield 'kunci_jawaban.csv', kunci_csv(varian_list).encode('utf-8')
+        yield 'kunci_jawaban.pdf', renderer.hasil(futures[-1])
+
+    def generate():
+        try:
+            yield from alirkan_zip(berkas_zip())
+        except Exception as e:
+            # Status sudah terkirim; arsip dihentikan dan klien menerima ZIP yang tidak lengkap
+            renderer.batalkan(futures)
+            current_app.logger.error("Error streaming exam variant ZIP: %s", str(e), exc_info=True)
+
+    response = Response(stream_with_context(generate()), mimetype='application/zip')
+    response.headers['Content-Disposition'] = f'attachment; filename="{nama_dasar}_varian.zip"'
+    return response
 
 @bp.route('/ujian', methods=['POST'])
 @jwt_required()
@@ -635,6 +902,7 @@ def generate_exam_pdf_endpoint():
 def simpan_ujian():
     data = request.get_json()
     current_user_id = get_jwt_identity()
+    current_user = User.query.get_or_404(current_user_id)
 
     if not data or not all(k in data for k in ['exam_title', 'questions']):
         return jsonify({'message': 'Data tidak lengkap. Pastikan judul ujian dan daftar soal terisi.'}), 400
@@ -648,10 +916,16 @@ def simpan_ujian():
         judul=data['exam_title'], 
         konten_json=json.dumps(data['questions']), 
         user_id=current_user_id,
-        pengaturan_layout=json.dumps(pengaturan_layout) 
+        pengaturan_layout=json.dumps(pengaturan_layout),
+        sekolah_id=current_user.sekolah_id
     )
     db.session.add(ujian_baru)
     db.session.commit()
+    try:
+        prarender_ujian(ujian_baru)
+    except Exception as e:
+        # Pra-render hanya optimasi; unduhan tetap merender jika belum ada di cache
+        current_app.logger.warning(f"Gagal mengajukan pra-render PDF ujian {ujian_baru.id}: {e}")
     return jsonify({'message': f'Ujian "{ujian_baru.judul}" berhasil disimpan!', 'id': ujian_baru.id}), 201
 
 @bp.route('/ujian', methods=['GET'])
@@ -669,6 +943,30 @@ def lihat_satu_ujian(id_ujian):
     ujian_set = Ujian.query.get_or_404(id_ujian)
     return jsonify(ujian_set.to_dict())
 
+@bp.route('/ujian/<int:id_ujian>/pdf', methods=['GET'])
+@jwt_required()
+@roles_required(['Admin', 'Guru', 'Super User'])
+def download_ujian_pdf(id_ujian):
+    current_user = User.query.get_or_404(get_jwt_identity())
+    ujian_set = Ujian.query.get_or_404(id_ujian)
+    # Guru hanya ujian miliknya, Admin hanya ujian sekolahnya (seperti akses RPP dan kelas)
+    if current_user.role == UserRole.GURU and ujian_set.user_id != current_user.id:
+        return jsonify({'message': 'Anda tidak memiliki hak untuk mengunduh ujian ini.'}), 403
+    if current_user.role == UserRole.ADMIN and ujian_set.sekolah_id != current_user.sekolah_id:
+        return jsonify({'message': 'Akses ditolak: Anda hanya bisa mengunduh ujian di sekolah Anda.'}), 403
+    sidik = sidik_ujian(ujian_set)
+    try:
+        return kirim_rendisi(
+            'ujian', ujian_set.id, sidik,
+            lambda: render_ujian(ujian_set, sidik),
+            f"{ujian_set.judul.replace(' ', '_')}.pdf"
+        )
+    except RenderPDFTimeout as e:
+        return jsonify({'message': str(e)}), 503
+    except Exception as e:
+        current_app.logger.error("Error creating exam PDF: %s", str(e), exc_info=True)
+        return jsonify({'message': f'Gagal membuat file PDF: {e}'}), 500
+
 @bp.route('/ujian/<int:id_ujian>', methods=['DELETE'])
 @jwt_required()
 @roles_required(['Admin', 'Guru', 'Super User'])
@@ -676,4 +974,5 @@ def delete_ujian(id_ujian):
     ujian_set = Ujian.query.get_or_404(id_ujian)
     db.session.delete(ujian_set)
     db.session.commit()
+    get_rendition_cache().hapus('ujian', id_ujian)
     return jsonify({'message': f'Ujian "{ujian_set.judul}" berhasil dihapus!'}), 200
\ No newline at end of file
@@ -1,6 +1,12 @@
+import hashlib
+import json
 from functools import wraps
-from flask_jwt_extended import get_jwt
-from flask import jsonify
+from flask_jwt_extended import get_jwt, get_jwt_identity
+from flask import Response, current_app, jsonify, request
+
+from app.core.metrics import IDEMPOTENSI
+from app.services.cache_service import buat_kunci, get_idempotency_cache
+from app.services.coalescing import PenggabungPanggilan
 
 def roles_required(roles):
     def decorator(fn):
@@ -12,3 +18,94 @@ def roles_required(roles):
             return fn(*args, **kwargs)
         return wrapper
     return decorator
+
+
+# --- Idempotency-Key ---
+# Header yang ikut disimpan dan diputar ulang bersama isi respons
+HEADER_DISIMPAN = ('Content-Type', 'X-AI-Cache')
+PANJANG_MAKS_KUNCI = 255
+
+# Request dengan kunci yang sama yang masih berjalan di proses ini
+_penggabung_idempotensi = PenggabungPanggilan()
+
+
+def sidik_permintaan():
+    """Hash isi request (path, query, form, file, atau body) untuk mendeteksi kunci yang dipakai ulang."""
+    digest = hashlib.sha256()
+    digest.update(request.full_path.encode('utf-8'))
+    if request.mimetype in ('multipart/form-data', 'application/x-www-form-urlencoded'):
+        for nama, nilai in sorted(request.form.items(multi=True)):
+            digest.update(f"\x1f{nama}={nilai}".encode('utf-8'))
+        for nama, berkas in request.files.items(multi=True):
+            digest.update(f"\x1f{nama}:{berkas.filename}\x1f".encode('utf-8'))
+            for blok in iter(lambda: berkas.stream.read(1 << 16), b''):
+                digest.update(blok)
+            berkas.stream.seek(0)
+    else:
+        digest.update(request.get_data(cache=True))
+    return digest.hexdigest()
+
+
+def _respons_dari_simpanan(simpanan):
+    response = Response(simpanan['body'], status=simpanan['status'])
+    for nama, nilai in simpanan['headers'].items():
+        response.headers[nama] = nilai
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempoten(operasi):
+    """
+    Header Idempotency-Key opsional untuk endpoint POST yang mahal. Request dengan kunci
+    yang sama (per pengguna dan operasi) yang datang saat request pertama masih berjalan
+    menunggu dan menerima respons yang sama; setelah selesai, respons sukses (2xx)
+    disimpan IDEMPOTENCY_TTL detik sehingga retry klien tidak memicu panggilan AI baru.
+    Kunci yang dipakai ulang dengan isi request berbeda ditolak dengan 422. Hanya untuk
+    endpoint non-stream, karena respons stream tidak dapat disimpan maupun dibagikan.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            kunci_klien = request.headers.get('Idempotency-Key', '').strip()
+            if not kunci_klien:
+                return fn(*args, **kwargs)
+            if len(kunci_klien) > PANJANG_MAKS_KUNCI:
+                return jsonify({'message': f'Idempotency-Key maksimal {PANJANG_MAKS_KUNCI} karakter.'}), 400
+
+            kunci = buat_kunci('idempotensi', get_jwt_identity(), operasi, kunci_klien)
+            sidik = sidik_permintaan()
+            cache = get_idempotency_cache()
+
+            tersimpan = cache.get(kunci)
+            if tersimpan is not None:
+                simpanan = json.loads(tersimpan)
+                if simpanan['sidik'] != sidik:
+                    IDEMPOTENSI.inc(hasil='konflik')
+                    return jsonify({'message': 'Idempotency-Key sudah dipakai untuk request dengan isi berbeda.'}), 422
+                IDEMPOTENSI.inc(hasil='diputar_ulang')
+                return _respons_dari_simpanan(simpanan)
+
+            def jalankan():
+                response = current_app.make_response(fn(*args, **kwargs))
+                if response.is_streamed:
+                    raise TypeError(f"@idempoten('{operasi}') tidak mendukung respons stream.")
+                simpanan = {
+                    'sidik': sidik,
+                    'status': response.status_code,
+                    'headers': {nama: response.headers[nama] for nama in HEADER_DISIMPAN if nama in response.headers},
+                    'body': response.get_data(as_text=True),
+                }
+                # Hanya respons sukses yang disimpan; error (mis. 503 saat provider sibuk) boleh dicoba ulang
+                if 200 <= response.status_code < 300:
+                    cache.set(kunci, json.dumps(simpanan, ensure_ascii=False))
+                return response, simpanan
+
+            # Sidik ikut menjadi kunci agar request berbeda dengan kunci sama tidak saling menumpang
+            (response, simpanan), digabung = _penggabung_idempotensi.jalankan((kunci, sidik), jalankan)
+            if not digabung:
+                IDEMPOTENSI.inc(hasil='baru')
+                return response
+            IDEMPOTENSI.inc(hasil='digabung')
+            return _respons_dari_simpanan(simpanan)
+        return wrapper
+    return decorator
@@ -0,0 +1,192 @@
+# backend/app/api/jobs.py
+
+import time
+
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from ..models import RPP, User
+from .. import db
+from app.api.auth import roles_required
+from app.api.decorators import idempoten
+from app.api.ai_tools import (
+    get_ai_service, analisis_file_referensi, buat_set_soal, baca_jumlah_soal, format_sse
+)
+from app.services.cache_service import status_cache_ai
+from app.services.job_service import job_queue, STATUS_SELESAI
+from app.services.extraction import BerkasReferensi
+
+bp = Blueprint('jobs_api', __name__, url_prefix='/api/jobs')
+
+
+def baca_upload(file_storages):
+    # Isi file disalin ke memori karena buffer upload ditutup saat request selesai
+    return [BerkasReferensi(f.filename, f.read()) for f in file_storages if f and f.filename]
+
+
+# --- Handler yang dijalankan oleh worker latar belakang ---
+# sekolah_id/user_id dipakai JobQueue untuk kepemilikan job, jadi handler memakai nama lain
+def job_analyze_referensi(berkas_list, sekolah_referensi_id=None, pengunggah_id=None):
+    analysis_result = analisis_file_referensi(get_ai_service(), berkas_list, sekolah_referensi_id, pengunggah_id)
+    if analysis_result is None:
+        raise ValueError('Gagal mengekstrak teks dari file atau semua file kosong.')
+    analysis_result['bibliografi'] = [berkas.nama for berkas in berkas_list]
+    analysis_result['cache_hit'] = status_cache_ai()
+    return analysis_result
+
+
+def job_generate_rpp(rpp_data, berkas_list, sekolah_referensi_id=None, pengunggah_id=None):
+    hasil_rpp = get_ai_service().generate_rpp_from_ai(
+        rpp_data=rpp_data, berkas_list=berkas_list,
+        sekolah_id=sekolah_referensi_id, user_id=pengunggah_id
+    )
+    return {'rpp': hasil_rpp, 'cache_hit': status_cache_ai()}
+
+
+def job_generate_soal(rpp_id, jenis_soal, jumlah_soal):
+    rpp = RPP.query.get(rpp_id)
+    if rpp is None:
+        # RPP dihapus setelah job diajukan
+        raise ValueError('RPP tidak ditemukan.')
+    soal_list = buat_set_soal(get_ai_service(), rpp, jenis_soal, jumlah_soal)
+    return {'soal': soal_list, 'cache_hit': status_cache_ai()}
+
+
+# --- Endpoint pengajuan job ---
+@bp.route('/analyze-referensi', methods=['POST'])
+@jwt_required()
+@roles_required(['Admin', 'Guru', 'Super User'])
+@idempoten('job:analyze-referensi')
+def ajukan_analyze_referensi():
+    uploaded_files = request.files.getlist('file')
+    if not uploaded_files or uploaded_files[0].filename == '':
+        return jsonify({'message': 'Request harus menyertakan setidaknya satu file.'}), 400
+
+    user = User.query.get_or_404(get_jwt_identity())
+    berkas_list = baca_upload(uploaded_files)
+    job_id = job_queue.submit(
+        'analyze-referensi', job_analyze_referensi,
+        user_id=user.id, sekolah_id=user.sekolah_id,
+        payload={'file': [berkas.nama for berkas in berkas_list]},
+        berkas_list=berkas_list, sekolah_referensi_id=user.sekolah_id, pengunggah_id=user.id
+    )
+    return jsonify({'job_id': job_id, 'status': 'antri'}), 202
+
+
+@bp.route('/generate-rpp', methods=['POST'])
+@jwt_required()
+@roles_required(['Admin', 'Guru', 'Super User'])
+@idempoten('job:generate-rpp')
+def ajukan_generate_rpp():
+    data = request.form
+    required_fields = ['mapel', 'jenjang', 'topik', 'alokasi_waktu']
+    if not all(k in data for k in required_fields):
+        return jsonify({'message': 'Data input (mapel, jenjang, topik, alokasi_waktu) tidak lengkap.'}), 400
+
+    user = User.query.get_or_404(get_jwt_identity())
+    rpp_data = {
+        "mapel": data.get('mapel'),
+        "jenjang": data.get('jenjang'),
+        "topik": data.get('topik'),
+        "alokasi_waktu": data.get('alokasi_waktu'),
+        "nama_penyusun": user.nama_lengkap
+    }
+    berkas_list = baca_upload(request.files.getlist('file_paths'))
+    job_id = job_queue.submit(
+        'generate-rpp', job_generate_rpp,
+        user_id=user.id, sekolah_id=user.sekolah_id,
+        payload=dict(rpp_data, file=[berkas.nama for berkas in berkas_list]),
+        rpp_data=rpp_data, berkas_list=berkas_list,
+        sekolah_referensi_id=user.sekolah_id, pengunggah_id=user.id
+    )
+    return jsonify({'job_id': job_id, 'status': 'antri'}), 202
+
+
+@bp.route('/generate-soal', methods=['POST'])
+@jwt_required()
+@roles_required(['Guru'])
+@idempoten('job:generate-soal')
+def ajukan_generate_soal():
+    data = request.get_json()
+    if not data or not data.get('rpp_id'):
+        return jsonify({'message': 'ID RPP wajib disertakan.'}), 400
+
+    user = User.query.get_or_404(int(get_jwt_identity()))
+    rpp = RPP.query.get_or_404(data['rpp_id'])
+    if rpp.user_id != user.id:
+        return jsonify({'message': 'Akses ditolak.'}), 403
+    try:
+        jumlah_soal = baca_jumlah_soal(data)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    payload = {
+        'rpp_id': rpp.id,
+        'jenis_soal': data.get('jenis_soal'),
+        'jumlah_soal': jumlah_soal
+    }
+    job_id = job_queue.submit(
+        'generate-soal', job_generate_soal,
+        user_id=user.id, sekolah_id=user.sekolah_id,
+        payload=payload, **payload
+    )
+    return jsonify({'job_id': job_id, 'status': 'antri'}), 202
+
+
+# --- Endpoint status job ---
+def ambil_job_milik_user(job_id):
+    job_queue.tandai_job_hilang(job_id)
+    job = job_queue.get(job_id)
+    if job is None or job.user_id != int(get_jwt_identity()):
+        return None
+    return job
+
+
+@bp.route('/<job_id>', methods=['GET'])
+@jwt_required()
+def lihat_job(job_id):
+    job = ambil_job_milik_user(job_id)
+    if job is None:
+        return jsonify({'message': 'Job tidak ditemukan.'}), 404
+    return jsonify(job.to_dict())
+
+
+@bp.route('/<job_id>/events', methods=['GET'])
+@jwt_required()
+def ikuti_job(job_id):
+    """
+    Server-Sent Events: kirim status setiap kali berubah sampai job selesai atau gagal.
+    Koneksi ditutup dengan event 'timeout' setelah AI_JOB_EVENTS_MAX_SECONDS agar worker
+    tidak tertahan; klien cukup menyambung ulang.
+    """
+    job = ambil_job_milik_user(job_id)
+    if job is None:
+        return jsonify({'message': 'Job tidak ditemukan.'}), 404
+
+    interval = current_app.config['AI_JOB_POLL_INTERVAL']
+    batas_waktu = time.monotonic() + current_app.config['AI_JOB_EVENTS_MAX_SECONDS']
+
+    def generate():
+        status_terakhir = None
+        while True:
+            # Status dibaca ulang dari database agar job dari proses worker lain ikut terpantau
+            db.session.expire_all()
+            # Job yang hilang karena proses pemiliknya dimulai ulang ditandai gagal di sini juga
+            job_queue.tandai_job_hilang(job_id)
+            db_job = job_queue.get(job_id)
+            if db_job is None:
+                yield format_sse('error', {'message': 'Job tidak ditemukan.'})
+                return
+            if db_job.status != status_terakhir:
+                status_terakhir = db_job.status
+                yield format_sse('status', db_job.to_dict())
+            if db_job.status in STATUS_SELESAI:
+                return
+            if time.monotonic() >= batas_waktu:
+                yield format_sse('timeout', {'message': 'Sambungkan ulang untuk terus memantau job.', 'status': status_terakhir})
+                return
+            time.sleep(interval)
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,121 @@
+# backend/app/api/metrics.py
+
+import hmac
+import time
+
+from flask import Blueprint, Response, current_app, g, request
+
+from app.core.metrics import DURASI_HTTP, metrik
+from app.services.cache_service import stats_cache
+from app.services.job_service import job_queue
+from app.services.registry import registry
+
+bp = Blueprint('metrics', __name__)
+
+KEJADIAN_PELINDUNG = (
+    'panggilan', 'sukses', 'gagal', 'retry', 'breaker_dibuka',
+    'ditolak_breaker', 'ditolak_rate_limit', 'timeout_antrean'
+)
+KEJADIAN_BACKEND = ('dipanggil', 'menang', 'gagal', 'hedge', 'fallback', 'dibatalkan')
+
+
+# --- Durasi setiap request HTTP ---
+@bp.before_app_request
+def mulai_ukur_request():
+    g.mulai_request = time.perf_counter()
+
+
+@bp.after_app_request
+def catat_durasi_request(response):
+    mulai = g.pop('mulai_request', None)
+    # Request ke URL yang tidak dikenal tidak dicatat agar label endpoint tidak meledak
+    if mulai is not None and request.endpoint and request.endpoint != 'metrics.metrics_endpoint':
+        DURASI_HTTP.observe(
+            time.perf_counter() - mulai,
+            endpoint=request.endpoint, method=request.method, status=response.status_code
+        )
+    return response
+
+
+# --- Kolektor untuk statistik yang sudah dihitung service lain ---
+def _rasio_hit(s):
+    if 'hit_ratio' in s:
+        return s['hit_ratio']
+    # Hit untuk hasil kosong (negative caching) juga menghemat panggilan
+    hits = (s.get('hits') or 0) + (s.get('hits_negatif') or 0)
+    total = hits + (s.get('misses') or 0)
+    return hits / total if total else 0.0
+
+
+def kolektor_cache():
+    stats = stats_cache()
+    # Sampel bernilai None (statistik yang tidak dimiliki cache tersebut) dilewati saat render
+    return [
+        ('belajar_cache_hits_total', 'counter', 'Hit cache per nama cache.',
+         [({'cache': nama}, s.get('hits')) for nama, s in stats.items()]),
+        ('belajar_cache_misses_total', 'counter', 'Miss cache per nama cache.',
+         [({'cache': nama}, s.get('misses')) for nama, s in stats.items()]),
+        ('belajar_cache_hit_ratio', 'gauge', 'Rasio hit cache sejak proses dimulai, per nama cache.',
+         [({'cache': nama}, _rasio_hit(s)) for nama, s in stats.items()]),
+        ('belajar_cache_hits_negatif_total', 'counter', 'Hit cache untuk hasil kosong yang disimpan (mis. pencarian gambar tanpa hasil).',
+         [({'cache': nama}, s.get('hits_negatif')) for nama, s in stats.items()]),
+        ('belajar_cache_bytes_dihemat_total', 'counter', 'Byte file yang tidak perlu diekstrak ulang berkat cache.',
+         [({'cache': nama}, s.get('bytes_dihemat')) for nama, s in stats.items()]),
+    ]
+
+
+def kolektor_ai():
+    stats = registry.stats()
+    hasil = []
+    pelindung = stats['pelindung']
+    if pelindung:
+        hasil += [
+            ('belajar_ai_pelindung_total', 'counter', 'Kejadian pada pelindung panggilan LLM.',
+             [({'kejadian': k}, pelindung.get(k, 0)) for k in KEJADIAN_PELINDUNG]),
+            ('belajar_ai_slot_menunggu', 'gauge', 'Panggilan LLM yang sedang menunggu slot.',
+             [({}, pelindung.get('menunggu_slot', 0))]),
+            ('belajar_ai_slot_berjalan', 'gauge', 'Panggilan LLM yang sedang berjalan.',
+             [({}, pelindung.get('sedang_berjalan', 0))]),
+            ('belajar_ai_breaker_terbuka', 'gauge', 'Circuit breaker bawaan terbuka (1) atau tidak (0).',
+             [({}, int(pelindung.get('status_breaker') != 'tertutup'))]),
+        ]
+
+    kejadian, win_rate, latensi, tunda = [], [], [], []
+    for hedging in stats['hedging']:
+        tunda.append(({}, hedging['tunda_hedge_detik']))
+        for nama, s in hedging['backend'].items():
+            kejadian += [({'backend': nama, 'kejadian': k}, s.get(k, 0)) for k in KEJADIAN_BACKEND]
+            win_rate.append(({'backend': nama}, s.get('win_rate')))
+            latensi += [
+                ({'backend': nama, 'kuantil': '0.5'}, s.get('latensi_p50')),
+                ({'backend': nama, 'kuantil': '0.95'}, s.get('latensi_p95')),
+            ]
+    if tunda:
+        hasil += [
+            ('belajar_ai_hedge_delay_detik', 'gauge', 'Ambang waktu sebelum hedge dikirim (AI_HEDGE_DELAY).', tunda[:1]),
+            ('belajar_ai_backend_total', 'counter', 'Kejadian per backend LLM (hedge, fallback, menang, ...).', kejadian),
+            ('belajar_ai_backend_win_rate', 'gauge', 'Rasio panggilan yang dimenangkan per backend LLM.', win_rate),
+            ('belajar_ai_backend_latensi_detik', 'gauge', 'Latensi panggilan sukses terakhir per backend LLM.', latensi),
+        ]
+    return hasil
+
+
+def kolektor_job():
+    stats = job_queue.stats()
+    return [('belajar_job_ai', 'gauge', 'Job AI latar belakang di proses ini, per status.',
+             [({'status': status}, jumlah) for status, jumlah in stats.items()])]
+
+
+for _kolektor in (kolektor_cache, kolektor_ai, kolektor_job):
+    metrik.tambah_kolektor(_kolektor)
+
+
+@bp.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    # Metrik berlaku per proses worker; Prometheus perlu men-scrape tiap worker
+    token = current_app.config.get('METRICS_TOKEN')
+    if token:
+        diberikan = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+        if not hmac.compare_digest(diberikan, token):
+            return Response("Unauthorized\n", status=401, mimetype='text/plain')
+    return Response(metrik.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
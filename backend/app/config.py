@@ -1,6 +1,8 @@
 # backend/app/config.py
 import os
 
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'a-super-secret-key'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
@@ -12,5 +14,129 @@ class Config:
     GOOGLE_API_KEY = os.environ.get('GOOGLE_API_KEY')
     GOOGLE_CSE_ID = os.environ.get('GOOGLE_CSE_ID')
 
+    # Direktori lokal untuk semua cache berbasis disk (dibagi antar proses worker)
+    CACHE_DIR = os.environ.get('CACHE_DIR') or os.path.join(BASE_DIR, 'cache')
+
+    # Provider LLM: 'together', 'fake' (jawaban tiruan lokal untuk pengembangan/uji beban),
+    # atau 'replay' (memutar ulang rekaman Together dan Google CSE dari AI_RECORDING_PATH)
+    AI_PROVIDER = os.environ.get('AI_PROVIDER') or 'together'
+    FAKE_AI_LATENCY = float(os.environ.get('FAKE_AI_LATENCY') or 0.5)
+    FAKE_AI_ERROR_RATE = float(os.environ.get('FAKE_AI_ERROR_RATE') or 0.0)
+
+    # Rekam/putar ulang: AI_RECORD=1 merekam panggilan Together dan Google CSE asli ke AI_RECORDING_PATH.
+    # Saat replay, latensi sintetis = REPLAY_LATENCY detik sampai token pertama + token / REPLAY_TOKENS_PER_SECOND.
+    AI_RECORD = os.environ.get('AI_RECORD', '0') in ('1', 'true', 'True')
+    AI_RECORDING_PATH = os.environ.get('AI_RECORDING_PATH') or os.path.join(BASE_DIR, 'rekaman_ai.jsonl')
+    REPLAY_LATENCY = float(os.environ.get('REPLAY_LATENCY') or 0.5)
+    REPLAY_TOKENS_PER_SECOND = float(os.environ.get('REPLAY_TOKENS_PER_SECOND') or 40)
+    REPLAY_CSE_LATENCY = float(os.environ.get('REPLAY_CSE_LATENCY') or 0.3)
+
+    # Pelindung panggilan LLM: batas bersamaan, rate limit, retry, dan circuit breaker (per proses)
+    AI_MAX_CONCURRENT = int(os.environ.get('AI_MAX_CONCURRENT') or 8)
+    AI_MAX_CONCURRENT_PER_SEKOLAH = int(os.environ.get('AI_MAX_CONCURRENT_PER_SEKOLAH') or 3)
+    AI_QUEUE_TIMEOUT = float(os.environ.get('AI_QUEUE_TIMEOUT') or 30)
+    AI_RATE_LIMIT_PER_MINUTE = float(os.environ.get('AI_RATE_LIMIT_PER_MINUTE') or 60)
+    AI_RATE_LIMIT_BURST = int(os.environ.get('AI_RATE_LIMIT_BURST') or 10)
+    AI_RETRY_MAX = int(os.environ.get('AI_RETRY_MAX') or 3)
+    AI_RETRY_BASE_DELAY = float(os.environ.get('AI_RETRY_BASE_DELAY') or 1.0)
+    AI_RETRY_MAX_DELAY = float(os.environ.get('AI_RETRY_MAX_DELAY') or 20)
+    AI_BREAKER_THRESHOLD = int(os.environ.get('AI_BREAKER_THRESHOLD') or 5)
+    AI_BREAKER_COOLDOWN = float(os.environ.get('AI_BREAKER_COOLDOWN') or 30)
+
+    # Backend cadangan (urut, dipisah koma; awalan opsional 'together:'/'fake:') untuk hedge dan fallback.
+    # Hedge dikirim ke backend berikutnya jika panggilan belum selesai setelah AI_HEDGE_DELAY detik.
+    AI_FALLBACK_MODELS = os.environ.get('AI_FALLBACK_MODELS') or ''
+    AI_HEDGE_DELAY = float(os.environ.get('AI_HEDGE_DELAY') or 8.0)
+    AI_HEDGE_MAX = int(os.environ.get('AI_HEDGE_MAX') or 1)
+    AI_HEDGE_WORKERS = int(os.environ.get('AI_HEDGE_WORKERS') or 16)
+
+    # Cache prompt/respons AI
+    AI_CACHE_ENABLED = os.environ.get('AI_CACHE_ENABLED', '1') not in ('0', 'false', 'False')
+    AI_CACHE_TTL = int(os.environ.get('AI_CACHE_TTL') or 7 * 24 * 3600)
+    AI_CACHE_MAX_ITEMS = int(os.environ.get('AI_CACHE_MAX_ITEMS') or 256)
+
+    # Panggilan AI identik yang sedang berjalan di satu proses digabung menjadi satu panggilan ke provider
+    AI_COALESCE_ENABLED = os.environ.get('AI_COALESCE_ENABLED', '1') not in ('0', 'false', 'False')
+    # Header Idempotency-Key: respons sukses per kunci disimpan IDEMPOTENCY_TTL detik dan diputar ulang untuk retry
+    IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL') or 24 * 3600)
+    IDEMPOTENCY_MAX_ITEMS = int(os.environ.get('IDEMPOTENCY_MAX_ITEMS') or 256)
+
+    # Pencarian gambar Google CSE (paralel, dengan batas waktu per kueri dalam detik)
+    IMAGE_SEARCH_WORKERS = int(os.environ.get('IMAGE_SEARCH_WORKERS') or 8)
+    IMAGE_SEARCH_TIMEOUT = float(os.environ.get('IMAGE_SEARCH_TIMEOUT') or 10)
+
+    # Cache hasil pencarian gambar (TTL dalam detik; hasil kosong memakai TTL negatif)
+    IMAGE_CACHE_TTL = int(os.environ.get('IMAGE_CACHE_TTL') or 30 * 24 * 3600)
+    IMAGE_CACHE_NEGATIVE_TTL = int(os.environ.get('IMAGE_CACHE_NEGATIVE_TTL') or 24 * 3600)
+    IMAGE_CACHE_MAX_ITEMS = int(os.environ.get('IMAGE_CACHE_MAX_ITEMS') or 1024)
+    IMAGE_CACHE_MAX_ITEMS_DISK = int(os.environ.get('IMAGE_CACHE_MAX_ITEMS_DISK') or 50000)
+
+    # Ekstraksi teks referensi paralel (0 = sebanyak jumlah core)
+    EXTRACTION_WORKERS = int(os.environ.get('EXTRACTION_WORKERS') or 0)
+    EXTRACTION_PAGE_TIMEOUT = float(os.environ.get('EXTRACTION_PAGE_TIMEOUT') or 30)
+    EXTRACTION_PAGES_PER_TASK = int(os.environ.get('EXTRACTION_PAGES_PER_TASK') or 8)
+
+    # OCR gambar (Tesseract): path binary, bahasa (mis. 'ind+eng'), mode segmentasi halaman, dan praproses.
+    # Gambar diperkecil ke OCR_DPI dan sisi terpanjang OCR_MAX_SIDE piksel, lalu dibinarisasi.
+    # Pool OCR terpisah dari pool PDF (0 = separuh jumlah core); timeout per gambar dalam detik.
+    TESSERACT_CMD = os.environ.get('TESSERACT_CMD') or 'tesseract'
+    OCR_LANG = os.environ.get('OCR_LANG') or ''
+    OCR_PSM = int(os.environ.get('OCR_PSM') or 4)
+    OCR_DPI = int(os.environ.get('OCR_DPI') or 300)
+    OCR_MAX_SIDE = int(os.environ.get('OCR_MAX_SIDE') or 3000)
+    OCR_BINARIZE = os.environ.get('OCR_BINARIZE', '1') not in ('0', 'false', 'False')
+    OCR_USE_TESSEROCR = os.environ.get('OCR_USE_TESSEROCR', '1') not in ('0', 'false', 'False')
+    OCR_WORKERS = int(os.environ.get('OCR_WORKERS') or 0)
+    OCR_TIMEOUT = float(os.environ.get('OCR_TIMEOUT') or 60)
+
+    # Cache teks hasil ekstraksi (dikunci hash isi file)
+    EXTRACTION_CACHE_TTL = int(os.environ.get('EXTRACTION_CACHE_TTL') or 180 * 24 * 3600)
+    EXTRACTION_CACHE_MAX_ITEMS = int(os.environ.get('EXTRACTION_CACHE_MAX_ITEMS') or 32)
+    EXTRACTION_CACHE_MAX_BYTES = int(os.environ.get('EXTRACTION_CACHE_MAX_BYTES') or 512 * 1024 * 1024)
+
+    # Render PDF di process pool terpisah (0 = separuh jumlah core); batas waktu per dokumen dalam detik
+    PDF_RENDER_WORKERS = int(os.environ.get('PDF_RENDER_WORKERS') or 0)
+    PDF_RENDER_TIMEOUT = float(os.environ.get('PDF_RENDER_TIMEOUT') or 60)
+
+    # Varian ujian per siswa: jumlah maksimal varian dalam satu permintaan batch
+    EXAM_VARIANTS_MAX = int(os.environ.get('EXAM_VARIANTS_MAX') or 200)
+
+    # Cache file PDF hasil render (RPP, ujian) di CACHE_DIR/rendisi; file terlama dihapus di atas batas total ukuran
+    RENDITION_CACHE_MAX_BYTES = int(os.environ.get('RENDITION_CACHE_MAX_BYTES') or 256 * 1024 * 1024)
+
+    # Analisis referensi map-reduce: teks di atas batas token dipecah dan dianalisis paralel
+    ANALYSIS_CHUNK_TOKENS = int(os.environ.get('ANALYSIS_CHUNK_TOKENS') or 6000)
+    ANALYSIS_MAX_PARALLEL = int(os.environ.get('ANALYSIS_MAX_PARALLEL') or 4)
+
+    # Indeks passage referensi per sekolah (BM25): ukuran passage dalam token dan jumlah passage per prompt
+    RETRIEVAL_PASSAGE_TOKENS = int(os.environ.get('RETRIEVAL_PASSAGE_TOKENS') or 300)
+    RETRIEVAL_TOP_K = int(os.environ.get('RETRIEVAL_TOP_K') or 6)
+
+    # Pedoman soal dan template prompt: dimuat sekali per proses, dimuat ulang jika file berubah
+    RULES_PATH = os.environ.get('RULES_PATH') or os.path.join(BASE_DIR, 'rules.txt')
+    PROMPT_TEMPLATE_DIR = os.environ.get('PROMPT_TEMPLATE_DIR') or os.path.join(BASE_DIR, 'app', 'prompts')
+    PROMPT_RELOAD_INTERVAL = float(os.environ.get('PROMPT_RELOAD_INTERVAL') or 2.0)
+
+    # Pembuatan soal paralel: permintaan di atas SOAL_SHARD_SIZE dipecah per shard lalu dideduplikasi;
+    # SOAL_JUMLAH_MAX membatasi jumlah soal dalam satu permintaan
+    SOAL_SHARD_SIZE = int(os.environ.get('SOAL_SHARD_SIZE') or 10)
+    SOAL_SHARD_WORKERS = int(os.environ.get('SOAL_SHARD_WORKERS') or 4)
+    SOAL_DEDUP_THRESHOLD = float(os.environ.get('SOAL_DEDUP_THRESHOLD') or 0.85)
+    SOAL_JUMLAH_MAX = int(os.environ.get('SOAL_JUMLAH_MAX') or 50)
+
+    # Endpoint /metrics (format Prometheus); jika METRICS_TOKEN diisi, scraper wajib mengirim Bearer token
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+    # Antrean job AI latar belakang
+    AI_JOB_WORKERS = int(os.environ.get('AI_JOB_WORKERS') or 8)
+    AI_JOB_MAX_PER_SEKOLAH = int(os.environ.get('AI_JOB_MAX_PER_SEKOLAH') or 2)
+    AI_JOB_POLL_INTERVAL = float(os.environ.get('AI_JOB_POLL_INTERVAL') or 1.0)
+    # Proses pemilik memperbarui heartbeat job 'antri'/'berjalan' tiap AI_JOB_HEARTBEAT_INTERVAL detik;
+    # job tanpa heartbeat lebih lama dari AI_JOB_STALE_AFTER dianggap hilang, mis. karena worker dimulai ulang
+    AI_JOB_HEARTBEAT_INTERVAL = float(os.environ.get('AI_JOB_HEARTBEAT_INTERVAL') or 30)
+    AI_JOB_STALE_AFTER = int(os.environ.get('AI_JOB_STALE_AFTER') or 180)
+    # Umur maksimal satu koneksi SSE status job (detik); klien menyambung ulang setelahnya
+    AI_JOB_EVENTS_MAX_SECONDS = int(os.environ.get('AI_JOB_EVENTS_MAX_SECONDS') or 300)
+
     # GEMINI_MODEL = os.environ.get('GEMINI_MODEL') or 'gemini-1.5-flash'
-    # GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
\ No newline at end of file
+    # GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
@@ -0,0 +1,10 @@
+import contextvars
+
+
+def submit_dengan_konteks(executor, fn, *args, **kwargs):
+    """
+    Seperti executor.submit, tetapi fn dijalankan dengan salinan contextvars
+    pemanggil sehingga app context Flask (current_app, g) tetap tersedia di thread worker.
+    """
+    ctx = contextvars.copy_context()
+    return executor.submit(ctx.run, fn, *args, **kwargs)
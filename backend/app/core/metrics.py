@@ -0,0 +1,210 @@
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_app_context, has_request_context, request
+
+# Batas bucket histogram durasi (detik), dari query cepat sampai panggilan LLM yang lama
+BUCKET_DURASI = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+
+def _escape_label(nilai):
+    return str(nilai).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_label(nama_label, nilai_label, tambahan=()):
+    pasangan = list(zip(nama_label, nilai_label)) + list(tambahan)
+    if not pasangan:
+        return ''
+    return '{' + ','.join(f'{nama}="{_escape_label(nilai)}"' for nama, nilai in pasangan) + '}'
+
+
+def _format_angka(nilai):
+    if nilai == math.inf:
+        return '+Inf'
+    if isinstance(nilai, float) and nilai.is_integer():
+        return str(int(nilai))
+    return repr(nilai) if isinstance(nilai, float) else str(nilai)
+
+
+class _Metrik:
+    jenis = None
+
+    def __init__(self, nama, bantuan, label=()):
+        self.nama = nama
+        self.bantuan = bantuan
+        self.label = tuple(label)
+        self._lock = threading.Lock()
+        self._nilai = {} # tuple nilai label -> nilai
+
+    def _kunci(self, nilai_label):
+        if set(nilai_label) != set(self.label):
+            raise ValueError(f"Metrik {self.nama} membutuhkan label {self.label}, diberikan {tuple(nilai_label)}.")
+        return tuple(str(nilai_label[nama]) for nama in self.label)
+
+    def baris(self):
+        yield f"# HELP {self.nama} {self.bantuan}"
+        yield f"# TYPE {self.nama} {self.jenis}"
+        with self._lock:
+            item = sorted(self._nilai.items())
+        for nilai_label, nilai in item:
+            yield from self._baris_sampel(nilai_label, nilai)
+
+    def _baris_sampel(self, nilai_label, nilai):
+        yield f"{self.nama}{_format_label(self.label, nilai_label)} {_format_angka(nilai)}"
+
+
+class Counter(_Metrik):
+    jenis = 'counter'
+
+    def inc(self, jumlah=1, **nilai_label):
+        kunci = self._kunci(nilai_label)
+        with self._lock:
+            self._nilai[kunci] = self._nilai.get(kunci, 0) + jumlah
+
+
+class Histogram(_Metrik):
+    jenis = 'histogram'
+
+    def __init__(self, nama, bantuan, label=(), bucket=BUCKET_DURASI):
+        super().__init__(nama, bantuan, label)
+        self.bucket = tuple(sorted(bucket)) + (math.inf,)
+
+    def observe(self, nilai, **nilai_label):
+        kunci = self._kunci(nilai_label)
+        with self._lock:
+            data = self._nilai.get(kunci)
+            if data is None:
+                # [jumlah per bucket (tidak kumulatif)..., total nilai, jumlah observasi]
+                data = self._nilai[kunci] = [0] * len(self.bucket) + [0.0, 0]
+            data[bisect.bisect_left(self.bucket, nilai)] += 1
+            data[-2] += nilai
+            data[-1] += 1
+
+    @contextmanager
+    def ukur(self, **nilai_label):
+        """Mengukur durasi blok; label 'hasil' (jika ada) diisi 'sukses' atau 'gagal'."""
+        mulai = time.perf_counter()
+        hasil = 'gagal'
+        try:
+            yield
+            hasil = 'sukses'
+        finally:
+            if 'hasil' in self.label:
+                nilai_label['hasil'] = hasil
+            self.observe(time.perf_counter() - mulai, **nilai_label)
+
+    def _baris_sampel(self, nilai_label, data):
+        kumulatif = 0
+        for batas, jumlah in zip(self.bucket, data):
+            kumulatif += jumlah
+            label = _format_label(self.label, nilai_label, [('le', _format_angka(float(batas)))])
+            yield f"{self.nama}_bucket{label} {kumulatif}"
+        label = _format_label(self.label, nilai_label)
+        yield f"{self.nama}_sum{label} {_format_angka(data[-2])}"
+        yield f"{self.nama}_count{label} {data[-1]}"
+
+
+class RegistryMetrik:
+    """
+    Registry metrik per proses dalam format teks Prometheus. Selain counter dan histogram
+    yang diisi langsung, kolektor dapat didaftarkan untuk membaca statistik yang sudah
+    ada (cache, pelindung LLM, antrean job) saat /metrics diambil.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrik = {}
+        self._kolektor = []
+
+    def _daftar(self, metrik):
+        with self._lock:
+            if metrik.nama in self._metrik:
+                raise ValueError(f"Metrik {metrik.nama} sudah terdaftar.")
+            self._metrik[metrik.nama] = metrik
+        return metrik
+
+    def counter(self, nama, bantuan, label=()):
+        return self._daftar(Counter(nama, bantuan, label))
+
+    def histogram(self, nama, bantuan, label=(), bucket=BUCKET_DURASI):
+        return self._daftar(Histogram(nama, bantuan, label, bucket))
+
+    def tambah_kolektor(self, kolektor):
+        """
+        `kolektor()` mengembalikan list (nama, jenis, bantuan, sampel) dengan sampel berupa
+        list (dict label, nilai). Kolektor yang gagal dilewati agar /metrics tetap terbaca.
+        """
+        with self._lock:
+            self._kolektor.append(kolektor)
+
+    def render(self):
+        with self._lock:
+            metrik = list(self._metrik.values())
+            kolektor = list(self._kolektor)
+        baris = []
+        for m in metrik:
+            baris.extend(m.baris())
+        for fungsi in kolektor:
+            try:
+                hasil = fungsi()
+            except Exception:
+                continue
+            for nama, jenis, bantuan, sampel in hasil:
+                baris.append(f"# HELP {nama} {bantuan}")
+                baris.append(f"# TYPE {nama} {jenis}")
+                for label, nilai in sampel:
+                    if nilai is None:
+                        continue
+                    baris.append(f"{nama}{_format_label(label.keys(), label.values())} {_format_angka(nilai)}")
+        return "\n".join(baris) + "\n"
+
+
+def sumber_panggilan():
+    """Endpoint Flask yang sedang dilayani, atau sumber yang dicatat job latar belakang di flask.g."""
+    if has_request_context() and request.endpoint:
+        return request.endpoint
+    if has_app_context():
+        return g.get('sumber_metrik', 'lainnya')
+    return 'lainnya'
+
+
+def tetapkan_sumber_panggilan(sumber):
+    g.sumber_metrik = sumber
+
+
+metrik = RegistryMetrik()
+
+# --- Metrik bawaan aplikasi ---
+DURASI_HTTP = metrik.histogram(
+    'belajar_http_request_detik', 'Durasi request HTTP per endpoint.', ('endpoint', 'method', 'status')
+)
+DURASI_AI = metrik.histogram(
+    'belajar_ai_operasi_detik', 'Durasi panggilan LLM per operasi AI (tanpa hit cache).', ('operasi', 'hasil')
+)
+TOKEN_AI = metrik.counter(
+    'belajar_ai_token_total', 'Token LLM dari usage provider, per endpoint dan operasi.', ('endpoint', 'operasi', 'jenis')
+)
+CACHE_AI = metrik.counter(
+    'belajar_ai_cache_total', 'Hasil pencarian cache respons AI per operasi.', ('operasi', 'hasil')
+)
+PANGGILAN_AI_DIGABUNG = metrik.counter(
+    'belajar_ai_digabung_total', 'Panggilan AI yang menumpang panggilan identik yang sedang berjalan, per operasi.', ('operasi',)
+)
+IDEMPOTENSI = metrik.counter(
+    'belajar_idempotensi_total', 'Request ber-header Idempotency-Key, per hasil (baru, diputar_ulang, digabung, konflik).', ('hasil',)
+)
+DURASI_RENDER_PDF = metrik.histogram(
+    'belajar_pdf_render_detik', 'Durasi render PDF per jenis dokumen, diukur di proses worker.', ('jenis',)
+)
+DURASI_EKSTRAKSI_HALAMAN = metrik.histogram(
+    'belajar_ekstraksi_halaman_detik', 'Durasi ekstraksi per halaman (ocr atau pdf), diukur di proses worker.', ('jenis',)
+)
+PANGGILAN_CSE = metrik.counter(
+    'belajar_cse_panggilan_total', 'Panggilan Google Custom Search, per hasil.', ('hasil',)
+)
+DURASI_CSE = metrik.histogram(
+    'belajar_cse_detik', 'Durasi panggilan Google Custom Search.', ()
+)
@@ -2,4 +2,6 @@
 
 from .user_model import Sekolah, User, UserRole
 from .classroom_model import Kelas, Siswa, Absensi, kelas_siswa
-from .content_model import RPP, Soal, Ujian, JawabanSiswa
\ No newline at end of file
+from .content_model import RPP, Soal, Ujian, JawabanSiswa
+from .job_model import AIJob
+from .referensi_model import DokumenReferensi, PassageReferensi
@@ -0,0 +1,35 @@
+# backend/app/models/job_model.py
+
+from app import db
+from datetime import datetime
+import json
+
+class AIJob(db.Model):
+    __tablename__ = 'ai_job'
+    id = db.Column(db.String(36), primary_key=True) # UUID
+    jenis = db.Column(db.String(50), nullable=False) # generate-rpp, generate-soal, analyze-referensi
+    status = db.Column(db.String(20), nullable=False, default='antri') # antri, berjalan, selesai, gagal
+    payload = db.Column(db.Text, default='{}') # Input job (string JSON), tanpa isi file
+    hasil = db.Column(db.Text, nullable=True) # Hasil job (string JSON)
+    pesan_error = db.Column(db.Text, nullable=True)
+    tanggal_dibuat = db.Column(db.DateTime, default=datetime.utcnow)
+    tanggal_mulai = db.Column(db.DateTime, nullable=True)
+    tanggal_selesai = db.Column(db.DateTime, nullable=True)
+    # Heartbeat proses pemilik job; job aktif yang berhenti diperbarui dianggap hilang
+    diperbarui_pada = db.Column(db.DateTime, nullable=True)
+    pemilik = db.Column(db.String(100), nullable=True) # host:pid:id instance JobQueue yang memegang job
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False) # Pengaju job
+    sekolah_id = db.Column(db.Integer, db.ForeignKey('sekolah.id'), nullable=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'jenis': self.jenis,
+            'status': self.status,
+            'hasil': json.loads(self.hasil) if self.hasil else None,
+            'pesan_error': self.pesan_error,
+            'tanggal_dibuat': self.tanggal_dibuat.isoformat() if self.tanggal_dibuat else None,
+            'tanggal_mulai': self.tanggal_mulai.isoformat() if self.tanggal_mulai else None,
+            'tanggal_selesai': self.tanggal_selesai.isoformat() if self.tanggal_selesai else None
+        }
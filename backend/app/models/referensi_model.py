@@ -0,0 +1,33 @@
+# backend/app/models/referensi_model.py
+
+from app import db
+from datetime import datetime
+
+class DokumenReferensi(db.Model):
+    __tablename__ = 'dokumen_referensi'
+    id = db.Column(db.Integer, primary_key=True)
+    nama_file = db.Column(db.String(255), nullable=False)
+    hash_isi = db.Column(db.String(64), nullable=False) # SHA-256 isi file, untuk mencegah indeks ganda
+    jumlah_passage = db.Column(db.Integer, default=0)
+    tanggal_dibuat = db.Column(db.DateTime, default=datetime.utcnow)
+
+    sekolah_id = db.Column(db.Integer, db.ForeignKey('sekolah.id'), nullable=True) # NULL = pustaka bersama semua sekolah
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True) # NULL jika diimpor lewat CLI
+
+    passages = db.relationship('PassageReferensi', backref='dokumen', lazy=True, cascade="all, delete-orphan")
+
+    __table_args__ = (
+        db.UniqueConstraint('sekolah_id', 'hash_isi', name='uq_dokumen_referensi_sekolah_hash'),
+        # NULL dianggap berbeda oleh constraint di atas, jadi pustaka bersama dijaga index parsial tersendiri
+        db.Index('uq_dokumen_referensi_bersama_hash', 'hash_isi', unique=True,
+                 sqlite_where=db.text('sekolah_id IS NULL'), postgresql_where=db.text('sekolah_id IS NULL')),
+    )
+
+class PassageReferensi(db.Model):
+    __tablename__ = 'passage_referensi'
+    id = db.Column(db.Integer, primary_key=True)
+    dokumen_id = db.Column(db.Integer, db.ForeignKey('dokumen_referensi.id'), nullable=False, index=True)
+    sekolah_id = db.Column(db.Integer, db.ForeignKey('sekolah.id'), nullable=True, index=True) # Salinan dari dokumen, untuk filter cepat
+    urutan = db.Column(db.Integer, nullable=False) # Posisi passage di dalam dokumen
+    teks = db.Column(db.Text, nullable=False)
+    token = db.Column(db.Text, nullable=False) # Token hasil tokenisasi, dipisah spasi
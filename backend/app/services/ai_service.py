@@ -1,27 +1,166 @@
+import itertools
+import math
 import os
-import PyPDF2
-from PIL import Image
-import pytesseract
+import re
+import threading
+from contextlib import ExitStack
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+import httplib2
 from together import Together
 import json
 from flask import current_app
 from googleapiclient.discovery import build
+from app.core.concurrency import submit_dengan_konteks
+from app.core.metrics import CACHE_AI, DURASI_AI, DURASI_CSE, PANGGILAN_AI_DIGABUNG, PANGGILAN_CSE, TOKEN_AI, sumber_panggilan
+from app.services.chunking import bagi_teks, perkiraan_token
+from app.services.json_stream import PenguraiArrayBertahap
+from app.services.prompt_registry import PromptRegistry
+from app.services.resilience import PelindungLLM, LayananAISibukError, sekolah_ai_saat_ini
+from app.services.hedging import BackendLLM, PenjadwalHedging
+from app.services.coalescing import PenggabungPanggilan
+from app.services.extraction import ExtractionPipeline, BerkasReferensi, VERSI_EKSTRAKTOR, hash_berkas
+from app.services.cache_service import (
+    get_response_cache, get_image_cache, get_extracted_text_cache, buat_kunci, normalisasi_prompt, catat_cache_ai, cache_ai_dilewati
+)
 
-pytesseract.pytesseract.tesseract_cmd = r'D:\Games\Tesseract\tesseract.exe'
+
+# Komponen hasil analisis referensi, beserta judulnya saat dipakai sebagai ringkasan di prompt RPP
+KOMPONEN_REFERENSI = {
+    "cp": "Capaian Pembelajaran",
+    "tp": "Tujuan Pembelajaran",
+    "materi_pokok": "Materi Pokok",
+    "pertanyaan_pemantik": "Pertanyaan Pemantik",
+    "model_pembelajaran": "Model Pembelajaran",
+    "media_sumber": "Media dan Sumber Belajar",
+}
+
+
+def _parse_json_referensi(response_text):
+    clean_json_str = response_text.strip().replace('```json', '').replace('```', '').strip()
+    return json.loads(clean_json_str)
+
+
+def _json_valid(response_text):
+    try:
+        _parse_json_referensi(response_text)
+        return True
+    except json.JSONDecodeError:
+        return False
+
+
+class FormatSoalError(Exception):
+    """Respons AI untuk soal tidak dapat di-parsing menjadi list soal."""
+
+
+def parse_soal_json(hasil_soal_json_str):
+    """
+    Membersihkan dan mem-parsing respons AI menjadi list soal.
+    Melempar json.JSONDecodeError atau ValueError jika format tidak valid.
+    """
+    if "```json" in hasil_soal_json_str:
+        clean_str = hasil_soal_json_str.split('```json', 1)[1].rsplit('```', 1)[0]
+    else:
+        clean_str = hasil_soal_json_str
+
+    soal_list = json.loads(clean_str.strip())
+    if not isinstance(soal_list, list):
+        raise ValueError("Respons AI bukan dalam format list of objects.")
+    return soal_list
+
+
+def _soal_json_valid(response_text):
+    try:
+        parse_soal_json(response_text)
+        return True
+    except (json.JSONDecodeError, ValueError):
+        return False
+
+# Sub-fokus untuk tiap shard saat soal dalam jumlah besar dibuat paralel, agar shard tidak saling mengulang
+FOKUS_SHARD_SOAL = [
+    "pemahaman konsep dasar, istilah, dan definisi",
+    "penerapan konsep dalam kehidupan sehari-hari",
+    "analisis sebab-akibat dan penalaran",
+    "interpretasi data, tabel, grafik, atau gambar",
+    "evaluasi, perbandingan, dan pemecahan masalah",
+]
+
+
+def _kata_soal(soal):
+    return set(re.findall(r'\w+', str(soal.get("pertanyaan", "")).lower()))
+
+
+def hapus_soal_mirip(soal_list, ambang):
+    """Buang soal yang pertanyaannya hampir sama (kemiripan Jaccard kata >= ambang) dengan soal sebelumnya."""
+    hasil = []
+    kata_terpilih = []
+    for soal in soal_list:
+        kata = _kata_soal(soal)
+        if any(len(kata & lain) >= ambang * len(kata | lain) for lain in kata_terpilih if kata | lain):
+            continue
+        hasil.append(soal)
+        kata_terpilih.append(kata)
+    return hasil
+
+
+def _usage_ke_dict(usage):
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", None),
+        "completion_tokens": getattr(usage, "completion_tokens", None),
+        "total_tokens": getattr(usage, "total_tokens", None),
+    }
+
+
+def _catat_usage(operasi, usage):
+    """Menambahkan token prompt dan completion dari usage provider ke metrik."""
+    if not usage:
+        return
+    endpoint = sumber_panggilan()
+    for jenis in ("prompt", "completion"):
+        jumlah = usage.get(f"{jenis}_tokens") if isinstance(usage, dict) else getattr(usage, f"{jenis}_tokens", None)
+        if jumlah:
+            TOKEN_AI.inc(jumlah, endpoint=endpoint, operasi=operasi, jenis=jenis)
 
 class AIService:
-    def __init__(self, api_key, model_name) :
+    def __init__(self, api_key, model_name, google_api_key=None, google_cse_id=None,
+                 image_search_workers=8, image_search_timeout=10, extraction=None,
+                 analysis_chunk_tokens=6000, analysis_max_parallel=4, retrieval=None, prompts=None,
+                 soal_shard_size=10, soal_shard_workers=4, soal_dedup_threshold=0.85,
+                 client=None, pelindung=None, backends_cadangan=None, hedge_delay=8.0, hedge_max=1,
+                 hedge_workers=16, search_service=None, gabung_panggilan=True) :
         if not api_key:
             raise ValueError("Kunci API harus disediakan.")
         self.api_key = api_key
         self.model_name = model_name
-        self.client = Together(api_key=self.api_key)
+        # Satu client dipakai bersama oleh semua thread di proses ini (lihat services/registry.py)
+        self.client = client or Together(api_key=self.api_key)
+        self.pelindung = pelindung or PelindungLLM()
+        # Backend utama lebih dulu, lalu backend cadangan (BackendLLM) untuk hedge dan fallback
+        self.backends = [BackendLLM(model_name, self.client, model_name, self.pelindung.breaker)]
+        self.backends += list(backends_cadangan or [])
+        self.hedging = PenjadwalHedging(self.backends, tunda_hedge=hedge_delay, maks_hedge=hedge_max,
+                                        max_workers=hedge_workers)
+        # Panggilan identik yang sedang berjalan (mis. klik ganda, satu RPP diminta banyak guru) berbagi satu panggilan
+        self.penggabung = PenggabungPanggilan(aktif=gabung_panggilan)
+        self._http_lokal = threading.local()
+        self.extraction = extraction or ExtractionPipeline()
+        self.retrieval = retrieval
+        self.prompts = prompts or PromptRegistry()
+        self.image_search_timeout = image_search_timeout
+        self._executor_gambar = ThreadPoolExecutor(max_workers=image_search_workers, thread_name_prefix='cse')
+        self.analysis_chunk_tokens = analysis_chunk_tokens
+        self._executor_analisis = ThreadPoolExecutor(max_workers=analysis_max_parallel, thread_name_prefix='analisis')
+        self.soal_shard_size = soal_shard_size
+        self.soal_dedup_threshold = soal_dedup_threshold
+        self._executor_soal = ThreadPoolExecutor(max_workers=soal_shard_workers, thread_name_prefix='soal')
 
-        google_api_key = current_app.config.get('GOOGLE_API_KEY')
-        google_cse_id = current_app.config.get('GOOGLE_CSE_ID')
-
-        if google_api_key and google_cse_id:
-            self.search_service = build("customsearch", "v1", developerKey=google_api_key)
+        if search_service is not None:
+            # Service pengganti (mis. replay rekaman) dipakai apa adanya
+            self.search_service = search_service
+            self.google_cse_id = google_cse_id or 'replay'
+        elif google_api_key and google_cse_id:
+            # Dokumen discovery statis bawaan library dipakai, tanpa fetch ke jaringan
+            self.search_service = build("customsearch", "v1", developerKey=google_api_key,
+                                        cache_discovery=False, static_discovery=True)
             self.google_cse_id = google_cse_id
             current_app.logger.info("Google Custom Search API service initialized.")
         else:
@@ -29,196 +168,585 @@ class AIService:
             self.google_cse_id = None
             current_app.logger.warning("Google Custom Search API keys (GOOGLE_API_KEY, GOOGLE_CSE_ID) not found in app config. Image search will be skipped.")
 
-    def _generate_content(self, prompt_parts):
+    def _search_http(self):
+        # httplib2.Http tidak thread-safe; satu koneksi keep-alive per thread
+        http = getattr(self._http_lokal, 'http', None)
+        if http is None:
+            http = httplib2.Http(timeout=self.image_search_timeout)
+            self._http_lokal.http = http
+        return http
+
+    def _generate_content(self, prompt_parts, validasi=None, operasi="umum"):
+        if isinstance(prompt_parts, list):
+            prompt = "".join(prompt_parts)
+        else:
+            prompt = prompt_parts
+
+        # Cek cache respons terlebih dahulu (kunci: nama model + prompt ternormalisasi)
+        cache = get_response_cache()
+        kunci_cache = buat_kunci(self.model_name, normalisasi_prompt(prompt))
+        if cache is not None and not cache_ai_dilewati():
+            hasil_cache = cache.get(kunci_cache)
+            if hasil_cache is not None:
+                current_app.logger.info("Respons AI dilayani dari cache.")
+                catat_cache_ai(True)
+                CACHE_AI.inc(operasi=operasi, hasil="hit")
+                return hasil_cache
+            CACHE_AI.inc(operasi=operasi, hasil="miss")
+
+        content, digabung = self.penggabung.jalankan(
+            kunci_cache, lambda: self._panggil_llm(prompt, cache, kunci_cache, validasi, operasi)
+        )
+        if digabung:
+            PANGGILAN_AI_DIGABUNG.inc(operasi=operasi)
+            current_app.logger.info("Respons AI diambil dari panggilan identik yang sedang berjalan.")
+        catat_cache_ai(False)
+        return content
+
+    def _panggil_llm(self, prompt, cache, kunci_cache, validasi, operasi):
+        """Satu panggilan LLM non-stream (dengan hedging dan pelindung), lalu simpan hasilnya ke cache."""
         try:
-            messages_payload = []
-            if isinstance(prompt_parts, list):
-                messages_payload.append({"role": "user", "content": "".join(prompt_parts)})
-            else:
-                messages_payload.append({"role": "user", "content": prompt_parts})
+            messages_payload = [{"role": "user", "content": prompt}]
+            sekolah_id = sekolah_ai_saat_ini()
 
-            response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=messages_payload
-            )
-            return response.choices[0].message.content
+            with DURASI_AI.ukur(operasi=operasi):
+                backend, response = self.hedging.jalankan(lambda backend: (backend, self.pelindung.panggil(
+                    lambda: backend.client.chat.completions.create(
+                        model=backend.model_name,
+                        messages=messages_payload
+                    ),
+                    sekolah_id,
+                    backend.breaker
+                )))
+            _catat_usage(operasi, getattr(response, "usage", None))
+            content = response.choices[0].message.content
+        except LayananAISibukError:
+            raise
         except Exception as e:
             current_app.logger.error(f"Error saat menghubungi Together AI API: {e}", exc_info=True)
             raise RuntimeError(f"Gagal menghasilkan konten dari AI: {e}")
 
+        # Respons yang tidak lolos validasi (mis. JSON rusak) tidak disimpan agar tidak terulang
+        if self._boleh_disimpan(backend, cache, content, validasi):
+            cache.set(kunci_cache, content)
+        return content
+
+    def _boleh_disimpan(self, backend, cache, content, validasi):
+        """
+        Hanya jawaban backend utama yang disimpan: kunci cache memakai self.model_name,
+        jadi jawaban hedge/fallback dari model lain tidak boleh tercatat atas nama model itu.
+        """
+        if cache is None or not content or backend is not self.backends[0]:
+            return False
+        return validasi is None or validasi(content)
+
+    def _buka_stream(self, backend, prompt, sekolah_id):
+        """
+        Membuka stream ke satu backend dan menunggu chunk pertamanya. Mengembalikan
+        (ExitStack, iterator chunk, backend); ExitStack menahan slot pelindung dan menutup
+        stream, sehingga slot tetap terpakai sampai stream habis atau dibuang.
+        """
+        stack = ExitStack()
+        try:
+            stack.enter_context(self.pelindung.slot(sekolah_id))
+            # Retry hanya untuk membuka stream, bukan di tengah jalan
+            stream = self.pelindung.dengan_retry(lambda: backend.client.chat.completions.create(
+                model=backend.model_name,
+                messages=[{"role": "user", "content": prompt}],
+                stream=True
+            ), backend.breaker)
+            if hasattr(stream, 'close'):
+                stack.callback(stream.close)
+            iterator = iter(stream)
+            pertama = next(iterator, None)
+        except BaseException:
+            stack.close()
+            raise
+        return stack, itertools.chain([pertama] if pertama is not None else [], iterator), backend
+
+    def stream_content(self, prompt_parts, validasi=None, operasi="umum"):
+        """
+        Generator yang menghasilkan tuple (jenis, data):
+        - ("chunk", teks) untuk setiap potongan teks dari model,
+        - ("selesai", info) sekali di akhir, berisi statistik usage dan status cache.
+        Hasil lengkap disimpan ke cache respons seperti _generate_content.
+        """
+        if isinstance(prompt_parts, list):
+            prompt = "".join(prompt_parts)
+        else:
+            prompt = prompt_parts
+
+        cache = get_response_cache()
+        kunci_cache = buat_kunci(self.model_name, normalisasi_prompt(prompt))
+        if cache is not None and not cache_ai_dilewati():
+            hasil_cache = cache.get(kunci_cache)
+            if hasil_cache is not None:
+                catat_cache_ai(True)
+                CACHE_AI.inc(operasi=operasi, hasil="hit")
+                yield "chunk", hasil_cache
+                yield "selesai", {"usage": None, "cache_hit": True}
+                return
+            CACHE_AI.inc(operasi=operasi, hasil="miss")
+
+        # Stream identik yang sedang berjalan diikuti dari awal, bukan dibuka ulang ke provider
+        siaran, digabung = self.penggabung.siarkan(
+            ("stream", kunci_cache), lambda: self._stream_llm(prompt, cache, kunci_cache, validasi, operasi)
+        )
+        if digabung:
+            PANGGILAN_AI_DIGABUNG.inc(operasi=operasi)
+            current_app.logger.info("Stream AI mengikuti stream identik yang sedang berjalan.")
+
+        usage = None
+        for jenis, isi in siaran:
+            if jenis == "usage":
+                usage = isi
+            else:
+                yield jenis, isi
+        catat_cache_ai(False)
+        # Token hanya dihitung sekali (di thread pompa), jadi pengikut tidak melaporkan usage
+        yield "selesai", {"usage": None if digabung else usage, "cache_hit": False, "digabung": digabung}
+
+    def _stream_llm(self, prompt, cache, kunci_cache, validasi, operasi):
+        """
+        Generator satu stream LLM: ("chunk", teks) per potongan lalu ("usage", usage) di akhir.
+        Dijalankan di thread pompa PenggabungPanggilan sampai habis, walaupun klien terputus,
+        sehingga hasil lengkapnya tetap masuk cache.
+        """
+        potongan = []
+        usage = None
+        # Durasi stream diukur sampai chunk terakhir diterima
+        with DURASI_AI.ukur(operasi=operasi):
+            try:
+                # Hedge untuk stream diputuskan dari chunk pertama: backend yang lebih dulu mengirim chunk menang
+                sekolah_id = sekolah_ai_saat_ini()
+                slot_stream, chunks, backend = self.hedging.jalankan(
+                    lambda backend: self._buka_stream(backend, prompt, sekolah_id),
+                    buang=lambda hasil: hasil[0].close()
+                )
+                with slot_stream:
+                    for chunk in chunks:
+                        # Together mengirim usage pada chunk terakhir
+                        if getattr(chunk, "usage", None):
+                            usage = _usage_ke_dict(chunk.usage)
+                        if not chunk.choices:
+                            continue
+                        teks = getattr(chunk.choices[0].delta, "content", None)
+                        if teks:
+                            potongan.append(teks)
+                            yield "chunk", teks
+            except LayananAISibukError:
+                raise
+            except Exception as e:
+                current_app.logger.error(f"Error saat streaming dari Together AI API: {e}", exc_info=True)
+                raise RuntimeError(f"Gagal menghasilkan konten dari AI: {e}")
+
+        _catat_usage(operasi, usage)
+        content = "".join(potongan)
+        if self._boleh_disimpan(backend, cache, content, validasi):
+            cache.set(kunci_cache, content)
+        yield "usage", usage
+
     def extract_text_from_file(self, file_path):
-        _, extension = os.path.splitext(file_path)
-        text = ""
+        berkas = BerkasReferensi.dari_path(file_path)
         try:
-            if extension.lower() == '.pdf':
-                with open(file_path, 'rb') as f:
-                    reader = PyPDF2.PdfReader(f)
-                    for page in reader.pages:
-                        text += page.extract_text() or ""
-            elif extension.lower() in ['.png', '.jpg', '.jpeg', '.bmp', '.tiff']:
-                text = pytesseract.image_to_string(Image.open(file_path))
-        except Exception as e:
-            current_app.logger.error(f"Gagal mengekstrak teks dari {file_path}: {e}")
-        return text
+            return self.extract_texts([berkas])[0]
+        finally:
+            berkas.tutup()
 
-    def analyze_reference_text(self, combined_text):
-        prompt = f"""
-        TUGAS: Analisis dan ekstrak komponen RPP dari teks di bawah ini.
-        OUTPUT: Kembalikan HANYA format JSON yang berisi kunci berikut: "cp", "tp", "materi_pokok", "pertanyaan_pemantik", "model_pembelajaran", "media_sumber".
-        Jika sebuah komponen tidak ditemukan, kembalikan string kosong untuk nilai kuncinya.
+    def extract_texts(self, berkas_list):
+        """Ekstraksi paralel semua BerkasReferensi; satu teks per file sesuai urutan input."""
+        if not berkas_list:
+            return []
+
+        # File yang isinya pernah diekstrak (di proses mana pun) diambil dari cache
+        text_cache = get_extracted_text_cache(VERSI_EKSTRAKTOR)
+        hasil = [None] * len(berkas_list)
+        belum = []
+        for i, berkas in enumerate(berkas_list):
+            hash_isi = hash_berkas(berkas)
+            teks = text_cache.get(hash_isi, berkas.ukuran)
+            if teks is None:
+                belum.append((i, berkas, hash_isi))
+            else:
+                hasil[i] = teks
 
-        --- TEKS REFERENSI ---
-        {combined_text}
+        if belum:
+            teks_baru = self.extraction.ekstrak_banyak_dengan_status([berkas for _, berkas, _ in belum])
+            for (i, _, hash_isi), (teks, lengkap) in zip(belum, teks_baru):
+                hasil[i] = teks
+                # Hasil parsial (ada halaman gagal/timeout) tidak disimpan agar dicoba lagi nanti
+                if lengkap:
+                    text_cache.set(hash_isi, teks)
+        return hasil
+
+    def analyze_reference_text(self, combined_text):
         """
-        response_text = self._generate_content([prompt])
+        Analisis komponen RPP dari teks referensi. Teks yang melebihi ANALYSIS_CHUNK_TOKENS
+        dipecah per potongan, tiap potongan dianalisis paralel (map), lalu hasilnya
+        digabung dalam satu panggilan akhir (reduce).
+        """
+        if perkiraan_token(combined_text) <= self.analysis_chunk_tokens:
+            return self._analisis_teks(combined_text)
+
+        potongan = bagi_teks(combined_text, self.analysis_chunk_tokens)
+        current_app.logger.info(f"Teks referensi dianalisis dalam {len(potongan)} potongan.")
+        futures = [
+            submit_dengan_konteks(self._executor_analisis, self._analisis_teks, teks, i + 1, len(potongan))
+            for i, teks in enumerate(potongan)
+        ]
+
+        hasil_potongan = []
+        for i, future in enumerate(futures):
+            try:
+                hasil = future.result()
+            except Exception as e:
+                current_app.logger.error(f"Gagal menganalisis potongan referensi {i + 1}/{len(potongan)}: {e}")
+                continue
+            if isinstance(hasil, dict) and any(hasil.get(k) for k in KOMPONEN_REFERENSI):
+                hasil_potongan.append(hasil)
+
+        if not hasil_potongan:
+            raise RuntimeError("Semua potongan teks referensi gagal dianalisis.")
+        if len(hasil_potongan) == 1:
+            return hasil_potongan[0]
+        return self._gabung_analisis(hasil_potongan)
+
+    def _analisis_teks(self, teks, nomor_potongan=None, jumlah_potongan=None):
+        keterangan = ""
+        if nomor_potongan:
+            keterangan = f"Teks ini adalah bagian {nomor_potongan} dari {jumlah_potongan} bagian sebuah dokumen; analisis hanya bagian ini."
+        prompt = self.prompts.render("analisis_referensi", keterangan=keterangan, teks=teks)
+        response_text = self._generate_content([prompt], validasi=_json_valid, operasi="analisis_referensi")
         try:
-            clean_json_str = response_text.strip().replace('```json', '').replace('```', '').strip()
-            return json.loads(clean_json_str)
+            return _parse_json_referensi(response_text)
         except json.JSONDecodeError:
             current_app.logger.error("Gagal mem-parsing JSON dari hasil analisis referensi.")
-            return {"cp": "", "tp": "", "materi_pokok": "", "pertanyaan_pemantik": "", "model_pembelajaran": "", "media_sumber": ""}
-
-    def generate_rpp_from_ai(self, rpp_data, file_paths=None):
-        referensi_text = ""
-        if file_paths:
-            for path in file_paths:
-                referensi_text += self.extract_text_from_file(path) + "\n\n---\n\n"
-
-        prompt = f"""
-        # PERINTAH PEMBUATAN RENCANA PELAKSANAAN PEMBELAJARAN (RPP)
-
-        ## BAGIAN 1: DATA UTAMA (WAJIB DIPATUHI)
-        - **Nama Penyusun**: {rpp_data.get('nama_penyusun', 'Guru Pengampu')}
-        - **Mata Pelajaran**: {rpp_data.get('mapel')}
-        - **Jenjang/Kelas**: {rpp_data.get('jenjang')}
-        - **Topik Utama**: {rpp_data.get('topik')}
-        - **Alokasi Waktu**: {rpp_data.get('alokasi_waktu')}
-
-        ## BAGIAN 2: MATERI DARI FILE REFERENSI (JIKA ADA)
-        Teks berikut adalah konten dari file yang diunggah oleh pengguna.
-        --- AWAL FILE REFERENSI ---
-        {referensi_text if referensi_text else "Tidak ada file referensi yang diberikan."}
-        --- AKHIR FILE REFERENSI ---
-
-        ## TUGAS ANDA:
-        Buatlah RPP yang lengkap, sistematis, dan profesional dalam format **Markdown**.
-
-        ## INSTRUKSI KRITIS:
-        1.  **PRIORITAS UTAMA**: Seluruh konten RPP harus secara ketat relevan dengan **Topik Utama** dari **DATA UTAMA**. Jangan menyimpang dari topik ini.
-        2.  **PENGEMBANGAN KONTEN**: Gunakan kreativitas Anda untuk mengembangkan konten RPP (Tujuan Pembelajaran, Kegiatan Pembelajaran, Asesmen) agar selaras dengan **Topik Utama**.
-        3.  **ENRICHMENT (PENAMBAHAN KOLOM)**: 
-            - **ANALISIS FILE REFERENSI**: Analisis teks dari **BAGIAN 2**.
-            - **TAMBAHKAN JIKA RELEVAN**: Jika Anda menemukan informasi yang relevan dengan **Topik Utama** untuk kolom-kolom seperti **"Profil Pelajar Pancasila"**, **"Sarana dan Prasarana"**, **"Kompetensi Awal"**, atau **"Pemahaman Bermakna"**, maka **TAMBAKKAN kolom-kolom tersebut** ke dalam RPP yang Anda hasilkan.
-            - **JANGAN TAMBAHKAN JIKA TIDAK RELEVAN**: Jika informasi tersebut tidak ada atau tidak relevan, jangan paksakan untuk menambahkannya.
-        4.  **STRUKTUR OUTPUT**: RPP harus memiliki struktur yang jelas, mencakup minimal:
-            - A. Informasi Umum (Identitas, Nama Penyusun, Kompetensi Awal, dll.)
-            - B. Komponen Inti (Tujuan Pembelajaran, Pemahaman Bermakna, Pertanyaan Pemantik)
-            - C. Kegiatan Pembelajaran (Pendahuluan, Inti, Penutup)
-            - D. Asesmen/Penilaian
-            - E. Lampiran (jika perlu)
-        """
-        return self._generate_content([prompt])
-
-    def generate_soal_from_ai(self, sumber_materi, jenis_soal, jumlah_soal, jenjang):
-        
+            return dict.fromkeys(KOMPONEN_REFERENSI, "")
+
+    def _gabung_analisis(self, hasil_potongan):
+        prompt = self.prompts.render(
+            "gabung_analisis",
+            hasil_analisis=json.dumps(hasil_potongan, ensure_ascii=False, indent=1)
+        )
+        response_text = self._generate_content([prompt], validasi=_json_valid, operasi="gabung_analisis")
         try:
-            with open("rules.txt", "r", encoding="utf-8") as f:
-                pedoman_soal = f.read()
-        except FileNotFoundError:
-            pedoman_soal = "Pedoman tidak ditemukan. Buat soal berdasarkan praktik terbaik umum."
-
-        prompt = f"""
-        Anda adalah seorang ahli pedagogi dan pembuat soal ujian yang sangat berpengalaman.
-        Tugas Anda adalah membuat {jumlah_soal} soal jenis '{jenis_soal}'.
-
-        **PEDOMAN WAJIB PEMBUATAN SOAL:**
-        Anda **HARUS** mengikuti pedoman di bawah ini untuk menyesuaikan tingkat kesulitan kognitif (Taksonomi Bloom), gaya bahasa, dan jumlah opsi jawaban berdasarkan **Jenjang Target**.
-        ---
-        {pedoman_soal}
-        ---
-
-        **INFORMASI SPESIFIK UNTUK TUGAS INI:**
-        - **Jenjang Target**: {jenjang}
-        - **Materi Utama**: 
-        ---
-        {sumber_materi}
-        ---
-
-        **FORMAT OUTPUT (JSON STRING TUNGGAL):**
-        1.  Format output HARUS berupa JSON string tunggal yang valid, tanpa markdown atau teks pembuka/penutup.
-        2.  Struktur JSON adalah sebuah array dari objek, di mana setiap objek adalah satu soal.
-        3.  Setiap objek soal HARUS memiliki kunci "pertanyaan".
-        4.  **INSTRUKSI PENTING UNTUK KONTEKS GAMBAR:** Tambahkan kunci **"kategori_topik"** (string) yang berisi kategori umum atau topik spesifik soal tersebut (contoh: "Biologi Sel", "Fisika Klasik", "Sejarah Kemerdekaan Indonesia", "Aturan Sepak Bola"). Ini akan **sangat membantu** dalam pencarian gambar yang relevan secara global. Jika soal tidak memiliki kategori spesifik, berikan topik utama soal.
-        5.  Jika `jenis_soal` adalah 'Pilihan Ganda', tambahkan kunci "pilihan" (objek) dan "jawaban_benar".
-        6.  Jika `jenis_soal` adalah 'Esai Singkat', tambahkan kunci "jawaban_ideal".
-        7.  **INSTRUKSI PENTING UNTUK VISUAL (GAMBAR/TABEL):**
-            a.  **UNTUK TABEL:** Jika pertanyaan akan lebih efektif dengan penyajian data dalam format tabel, buatlah tabel tersebut langsung di dalam kunci "pertanyaan" menggunakan format Markdown.
-            b.  **UNTUK GAMBAR:** Jika pertanyaan akan sangat terbantu dengan ilustrasi visual (gambar), tambahkan kunci **"deskripsi_gambar"** berisi deskripsi detail untuk agen pencari gambar. Sertakan saran gaya (misal: "diagram ilustrasi", "foto historis", "peta", "grafik"). **Sertakan deskripsi gambar ini jika soal sangat relevan dan akan jauh lebih baik dengan visual.**
-            c.  Jika soal tidak memerlukan visual (baik gambar atau tabel) untuk dipahami dengan baik, **jangan sertakan kunci "deskripsi_gambar" atau tabel di "pertanyaan"**.
-
-        Patuhi semua instruksi dengan saksama untuk menghasilkan soal yang berkualitas tinggi dan sesuai secara pedagogis.
-        """
-        return self._generate_content([prompt])
+            return _parse_json_referensi(response_text)
+        except json.JSONDecodeError:
+            # Gabungan sederhana tanpa AI lebih baik daripada kehilangan semua hasil per potongan
+            current_app.logger.error("Gagal mem-parsing JSON dari penggabungan analisis referensi.")
+            return {
+                k: "\n".join(dict.fromkeys(str(h[k]) for h in hasil_potongan if h.get(k)))
+                for k in KOMPONEN_REFERENSI
+            }
+
+    def ringkas_referensi(self, referensi_text):
+        """
+        Teks referensi yang terlalu panjang untuk satu prompt RPP diganti dengan hasil
+        analisis map-reduce-nya; teks pendek dikembalikan apa adanya.
+        """
+        if perkiraan_token(referensi_text) <= self.analysis_chunk_tokens:
+            return referensi_text
+        analisis = self.analyze_reference_text(referensi_text)
+        return "\n\n".join(
+            f"{judul}:\n{analisis[k]}" for k, judul in KOMPONEN_REFERENSI.items() if analisis.get(k)
+        )
+
+    def indeks_referensi(self, berkas_list, teks_list, sekolah_id, user_id=None):
+        """
+        Simpan teks file referensi ke indeks passage sekolah agar bisa dipakai ulang.
+        Mengembalikan id dokumen per file (None untuk file yang tidak terindeks).
+        """
+        if self.retrieval is None or sekolah_id is None:
+            return [None] * len(berkas_list)
+        id_dokumen = []
+        for berkas, teks in zip(berkas_list, teks_list):
+            try:
+                dokumen = self.retrieval.indeks_teks(sekolah_id, berkas.nama, hash_berkas(berkas), teks, user_id)
+                id_dokumen.append(dokumen.id if dokumen is not None else None)
+            except Exception as e:
+                current_app.logger.error(f"Gagal mengindeks referensi {berkas.nama}: {e}", exc_info=True)
+                id_dokumen.append(None)
+        return id_dokumen
+
+    def _cari_passage(self, sekolah_id, kueri, **kwargs):
+        if self.retrieval is None or sekolah_id is None:
+            return []
+        try:
+            return self.retrieval.cari(sekolah_id, kueri, **kwargs)
+        except Exception as e:
+            current_app.logger.error(f"Gagal mencari passage referensi: {e}", exc_info=True)
+            return []
+
+    @staticmethod
+    def _format_kutipan(passages):
+        return "".join(f"[Kutipan {i}]\n{passage}\n\n" for i, passage in enumerate(passages, 1))
+
+    def cari_referensi(self, sekolah_id, kueri):
+        """Passage teratas dari indeks sekolah untuk kueri, sudah diformat untuk prompt ("" jika tidak ada)."""
+        return self._format_kutipan(self._cari_passage(sekolah_id, kueri))
+
+    def siapkan_referensi_rpp(self, rpp_data, berkas_list=None, sekolah_id=None, user_id=None):
+        """
+        Teks referensi untuk prompt RPP. File yang diunggah diindeks ke pustaka sekolah dan
+        diwakili passage-nya yang paling relevan dengan topik, lalu ditambah passage dari
+        dokumen lain di pustaka sekolah sebagai pelengkap. File unggahan yang tidak terindeks
+        atau tidak memiliki passage yang cocok dipakai utuh (diringkas jika terlalu panjang).
+        """
+        berkas_list = berkas_list or []
+        teks_list = self.extract_texts(berkas_list)
+        id_dokumen = self.indeks_referensi(berkas_list, teks_list, sekolah_id, user_id)
+        kueri = f"{rpp_data.get('topik', '')} {rpp_data.get('mapel', '')}"
+
+        diindeks = [i for i in id_dokumen if i is not None]
+        passages = self._cari_passage(sekolah_id, kueri, dokumen=diindeks) if diindeks else []
+        teks_utuh = [teks for teks, i in zip(teks_list, id_dokumen) if teks and (i is None or not passages)]
+        # Pustaka sekolah hanya pelengkap jika guru mengunggah file sendiri
+        k_pustaka = max(1, self.retrieval.top_k // 2) if (self.retrieval and berkas_list) else None
+        passages += self._cari_passage(sekolah_id, kueri, k=k_pustaka, kecuali_dokumen=diindeks)
+
+        referensi_text = "".join(teks + "\n\n---\n\n" for teks in teks_utuh) + self._format_kutipan(passages)
+        return self.ringkas_referensi(referensi_text)
+
+    def generate_rpp_from_ai(self, rpp_data, berkas_list=None, sekolah_id=None, user_id=None):
+        referensi_text = self.siapkan_referensi_rpp(rpp_data, berkas_list, sekolah_id, user_id)
+        return self._generate_content([self._build_rpp_prompt(rpp_data, referensi_text)], operasi="rpp")
+
+    def stream_rpp_from_ai(self, rpp_data, referensi_text=""):
+        """
+        Versi streaming dari generate_rpp_from_ai; referensi_text dari siapkan_referensi_rpp
+        (sudah diringkas) dipakai apa adanya.
+        """
+        return self.stream_content([self._build_rpp_prompt(rpp_data, referensi_text)], operasi="rpp")
+
+    def _build_rpp_prompt(self, rpp_data, referensi_text):
+        return self.prompts.render(
+            "rpp",
+            nama_penyusun=rpp_data.get('nama_penyusun', 'Guru Pengampu'),
+            mapel=rpp_data.get('mapel'),
+            jenjang=rpp_data.get('jenjang'),
+            topik=rpp_data.get('topik'),
+            alokasi_waktu=rpp_data.get('alokasi_waktu'),
+            referensi_text=referensi_text if referensi_text else "Tidak ada file referensi yang diberikan."
+        )
+
+    def generate_soal_from_ai(self, sumber_materi, jenis_soal, jumlah_soal, jenjang, sekolah_id=None, topik=None, fokus=None):
+        prompt = self._build_soal_prompt(sumber_materi, jenis_soal, jumlah_soal, jenjang, sekolah_id, topik, fokus)
+        return self._generate_content([prompt], validasi=_soal_json_valid, operasi="soal")
+
+    def stream_soal(self, sumber_materi, jenis_soal, jumlah_soal, jenjang, sekolah_id=None, topik=None):
+        """
+        Generator yang menghasilkan ("soal", dict) begitu objek soal selesai diterima dari
+        stream model, lalu ("selesai", info) di akhir. info berisi usage, cache_hit, dan
+        lengkap=False jika respons terpotong sebelum array soal ditutup.
+        """
+        prompt = self._build_soal_prompt(sumber_materi, jenis_soal, jumlah_soal, jenjang, sekolah_id, topik)
+        pengurai = PenguraiArrayBertahap()
+        for jenis, isi in self.stream_content([prompt], validasi=_soal_json_valid, operasi="soal"):
+            if jenis == "chunk":
+                for soal in pengurai.tambah(isi):
+                    if isinstance(soal, dict):
+                        yield "soal", soal
+            else:
+                if pengurai.jumlah_gagal:
+                    current_app.logger.warning(f"{pengurai.jumlah_gagal} objek soal dari stream AI tidak valid dan dilewati.")
+                if not pengurai.array_selesai:
+                    current_app.logger.warning("Stream soal dari AI terpotong sebelum array JSON ditutup.")
+                isi["lengkap"] = pengurai.array_selesai
+                yield "selesai", isi
+
+    def _build_soal_prompt(self, sumber_materi, jenis_soal, jumlah_soal, jenjang, sekolah_id=None, topik=None, fokus=None):
+        # Kutipan pustaka referensi sekolah yang relevan dengan topik, jika ada
+        kutipan_referensi = self.cari_referensi(sekolah_id, topik) if topik else ""
+        bagian_tambahan = (
+            "- **Kutipan Referensi Pendukung** (gunakan untuk memperkaya soal, tetap sesuai Materi Utama):\n"
+            f"---\n{kutipan_referensi}\n---\n"
+        ) if kutipan_referensi else ""
+        if fokus:
+            bagian_tambahan += f"- **Fokus Soal**: Semua soal pada bagian ini menekankan {fokus}.\n"
+
+        return self.prompts.render(
+            "soal",
+            jumlah_soal=jumlah_soal,
+            jenis_soal=jenis_soal,
+            pedoman_soal=self.prompts.pedoman_soal(),
+            jenjang=jenjang,
+            sumber_materi=sumber_materi,
+            bagian_tambahan=bagian_tambahan
+        )
     
+    def generate_soal_list(self, sumber_materi, jenis_soal, jumlah_soal, jenjang, sekolah_id=None, topik=None):
+        """
+        Menghasilkan list soal yang sudah di-parsing. Permintaan di atas SOAL_SHARD_SIZE
+        dipecah menjadi beberapa panggilan paralel dengan sub-fokus berbeda, lalu hasilnya
+        digabung dan soal yang hampir sama dibuang. Shard yang gagal tidak menggagalkan shard lain.
+        """
+        jumlah_soal = int(jumlah_soal)
+        if jumlah_soal <= self.soal_shard_size:
+            return self._generate_soal_shard(sumber_materi, jenis_soal, jumlah_soal, jenjang, sekolah_id, topik)
+
+        jumlah_shard = math.ceil(jumlah_soal / self.soal_shard_size)
+        # Tiap shard diminta sedikit lebih banyak untuk menutup soal yang terbuang saat deduplikasi
+        ukuran_shard = [
+            jumlah_soal // jumlah_shard + (1 if i < jumlah_soal % jumlah_shard else 0)
+            for i in range(jumlah_shard)
+        ]
+        futures = [
+            submit_dengan_konteks(
+                self._executor_soal, self._generate_soal_shard,
+                sumber_materi, jenis_soal, ukuran + max(1, ukuran // 5), jenjang, sekolah_id, topik,
+                FOKUS_SHARD_SOAL[i % len(FOKUS_SHARD_SOAL)]
+            )
+            for i, ukuran in enumerate(ukuran_shard)
+        ]
+
+        gabungan = []
+        for i, future in enumerate(futures):
+            try:
+                gabungan.extend(future.result())
+            except (FormatSoalError, RuntimeError) as e:
+                current_app.logger.error(f"Shard soal {i + 1}/{jumlah_shard} gagal: {e}")
+        if not gabungan:
+            raise FormatSoalError('AI gagal menghasilkan format soal yang valid. Silakan coba lagi.')
+
+        soal_list = hapus_soal_mirip(gabungan, self.soal_dedup_threshold)
+        current_app.logger.info(
+            f"{jumlah_shard} shard soal menghasilkan {len(gabungan)} soal, {len(soal_list)} setelah deduplikasi."
+        )
+        return soal_list
+
+    def _generate_soal_shard(self, sumber_materi, jenis_soal, jumlah_soal, jenjang, sekolah_id=None, topik=None, fokus=None):
+        hasil_soal_json_str = self.generate_soal_from_ai(
+            sumber_materi, jenis_soal, jumlah_soal, jenjang, sekolah_id=sekolah_id, topik=topik, fokus=fokus
+        )
+        try:
+            return [soal for soal in parse_soal_json(hasil_soal_json_str) if isinstance(soal, dict)]
+        except (json.JSONDecodeError, ValueError) as e:
+            current_app.logger.error(f"AI mengembalikan respons non-JSON atau format tidak valid: {e}. Raw: {hasil_soal_json_str}")
+            raise FormatSoalError('AI gagal menghasilkan format soal yang valid. Silakan coba lagi.')
+
     # Search for images based on the description in the soal
+    def bangun_kueri_gambar(self, soal):
+        base_query = soal["deskripsi_gambar"]
+        
+        # Mendapatkan kategori atau topik soal dari output AI (jika ada)
+        kategori_atau_topik = soal.get("kategori_topik", "")
+        
+        # Membangun kueri yang lebih cerdas dan global
+        # Prioritaskan kategori_topik jika ada
+        if kategori_atau_topik:
+            # Gabungkan deskripsi gambar, kategori/topik, dan istilah umum
+            enhanced_query = f"{base_query} {kategori_atau_topik} educational diagram illustration scientific"
+        else:
+            # Jika tidak ada kategori/topik, gunakan deskripsi gambar dan istilah umum saja
+            enhanced_query = f"{base_query} educational diagram illustration scientific"
+        
+        # Membersihkan spasi ekstra dan memastikan kueri tidak terlalu panjang atau kosong
+        return ' '.join(enhanced_query.split()).strip()
+
+    def _cari_gambar(self, final_search_query):
+        """Satu panggilan Google CSE; mengembalikan list URL gambar (kosong jika tidak ada)."""
+        current_app.logger.info(f"Mencari gambar dengan kueri: '{final_search_query}'")
+        try:
+            with DURASI_CSE.ukur():
+                res = self.search_service.cse().list(
+                    q=final_search_query,
+                    cx=self.google_cse_id,
+                    searchType='image',
+                    num=1 # Cukup 1 gambar yang paling relevan
+                ).execute(http=self._search_http())
+        except Exception:
+            PANGGILAN_CSE.inc(hasil="error")
+            raise
+
+        if res and 'items' in res and res['items']:
+            # Verifikasi bahwa link gambar ada dan valid
+            image_url = res['items'][0].get('link')
+            if image_url:
+                current_app.logger.info(f"Gambar ditemukan untuk '{final_search_query}': {image_url}")
+                PANGGILAN_CSE.inc(hasil="ditemukan")
+                return [image_url]
+            current_app.logger.info(f"Link gambar tidak ditemukan dalam respons untuk '{final_search_query}'.")
+        else:
+            current_app.logger.info(f"Tidak ada item gambar ditemukan dalam respons untuk '{final_search_query}'.")
+        PANGGILAN_CSE.inc(hasil="kosong")
+        return []
+
+    def _cari_dan_simpan_gambar(self, final_search_query):
+        urls = self._cari_gambar(final_search_query)
+        # Hasil kosong juga disimpan; error tidak, agar dicoba lagi nanti
+        get_image_cache().set(final_search_query, urls)
+        return urls
+
+    def mulai_cari_gambar(self, final_search_query, berjalan=None):
+        """
+        Memulai pencarian gambar di latar belakang dan langsung mengembalikan Future berisi
+        list URL. Hasil dari cache dikembalikan sebagai Future yang sudah selesai; kueri yang
+        sudah ada di dict `berjalan` memakai Future yang sama sehingga hanya dicari sekali.
+        """
+        if berjalan is not None and final_search_query in berjalan:
+            return berjalan[final_search_query]
+
+        hasil_cache = get_image_cache().get(final_search_query)
+        if hasil_cache is not None:
+            future = Future()
+            future.set_result(hasil_cache)
+        else:
+            future = submit_dengan_konteks(self._executor_gambar, self._cari_dan_simpan_gambar, final_search_query)
+
+        if berjalan is not None:
+            berjalan[final_search_query] = future
+        return future
+
+    def hasil_cari_gambar(self, future, final_search_query):
+        """List URL dari Future pencarian yang sudah selesai; [] jika belum selesai atau gagal."""
+        if not future.done():
+            future.cancel()
+            return []
+        try:
+            return list(future.result())
+        except Exception as e:
+            current_app.logger.error(f"Error saat mencari gambar (kueri: '{final_search_query}'): {e}", exc_info=True)
+            return []
+
     def search_images_for_soal(self, soal_list):
+        """
+        Mengisi "saran_gambar" untuk seluruh soal sekaligus. Kueri yang identik hanya
+        dicari sekali, dan semua kueri dijalankan paralel dengan batas waktu, sehingga
+        total latensi mendekati kueri tunggal yang paling lambat.
+        """
         if not self.search_service or not self.google_cse_id:
             current_app.logger.warning("Google Custom Search API not initialized. Skipping image search for soal.")
             return soal_list
 
+        kueri_per_soal = []
         for soal in soal_list:
             # Hanya proses jika ada kunci 'deskripsi_gambar' dan nilainya tidak kosong
             if "deskripsi_gambar" in soal and soal["deskripsi_gambar"]:
-                base_query = soal["deskripsi_gambar"]
-                
-                # Mendapatkan kategori atau topik soal dari output AI (jika ada)
-                kategori_atau_topik = soal.get("kategori_topik", "")
-                
-                # Membangun kueri yang lebih cerdas dan global
-                # Prioritaskan kategori_topik jika ada
-                if kategori_atau_topik:
-                    # Gabungkan deskripsi gambar, kategori/topik, dan istilah umum
-                    enhanced_query = f"{base_query} {kategori_atau_topik} educational diagram illustration scientific"
-                else:
-                    # Jika tidak ada kategori/topik, gunakan deskripsi gambar dan istilah umum saja
-                    enhanced_query = f"{base_query} educational diagram illustration scientific"
-                
-                # Membersihkan spasi ekstra dan memastikan kueri tidak terlalu panjang atau kosong
-                final_search_query = ' '.join(enhanced_query.split()).strip()
-
+                final_search_query = self.bangun_kueri_gambar(soal)
                 if not final_search_query:
-                    current_app.logger.warning(f"Kueri pencarian gambar kosong untuk deskripsi: '{base_query}'. Melewati pencarian.")
+                    current_app.logger.warning(f"Kueri pencarian gambar kosong untuk deskripsi: '{soal['deskripsi_gambar']}'. Melewati pencarian.")
                     soal["saran_gambar"] = []
                     continue # Lanjutkan ke soal berikutnya
-
-                current_app.logger.info(f"Mencari gambar dengan kueri: '{final_search_query}'")
-
-                try:
-                    res = self.search_service.cse().list(
-                        q=final_search_query,
-                        cx=self.google_cse_id,
-                        searchType='image',
-                        num=1 # Cukup 1 gambar yang paling relevan
-                    ).execute()
-
-                    if res and 'items' in res and res['items']:
-                        # Verifikasi bahwa link gambar ada dan valid
-                        image_url = res['items'][0].get('link')
-                        if image_url:
-                            soal["saran_gambar"] = [image_url]
-                            current_app.logger.info(f"Gambar ditemukan untuk '{base_query}': {image_url}")
-                        else:
-                            current_app.logger.info(f"Link gambar tidak ditemukan dalam respons untuk '{base_query}'.")
-                            soal["saran_gambar"] = []
-                    else:
-                        current_app.logger.info(f"Tidak ada item gambar ditemukan dalam respons untuk '{base_query}'.")
-                        soal["saran_gambar"] = []
-                except Exception as e:
-                    current_app.logger.error(f"Error saat mencari gambar untuk '{base_query}' (kueri: '{final_search_query}'): {e}", exc_info=True)
-                    soal["saran_gambar"] = []
+                kueri_per_soal.append((soal, final_search_query))
             else:
                 # Jika 'deskripsi_gambar' tidak ada atau kosong, pastikan 'saran_gambar' juga kosong
                 soal["saran_gambar"] = []
                 current_app.logger.debug(f"Soal tidak memiliki 'deskripsi_gambar'. Melewati pencarian gambar.")
-        
-        return soal_list
\ No newline at end of file
+
+        berjalan = {}
+        for _, final_search_query in kueri_per_soal:
+            self.mulai_cari_gambar(final_search_query, berjalan)
+
+        if berjalan:
+            _, belum_selesai = wait(berjalan.values(), timeout=self.image_search_timeout)
+            if belum_selesai:
+                current_app.logger.warning(f"{len(belum_selesai)} pencarian gambar melewati batas waktu {self.image_search_timeout} detik.")
+
+        hasil_per_kueri = {
+            final_search_query: self.hasil_cari_gambar(future, final_search_query)
+            for final_search_query, future in berjalan.items()
+        }
+        for soal, final_search_query in kueri_per_soal:
+            soal["saran_gambar"] = list(hasil_per_kueri[final_search_query])
+
+        return soal_list
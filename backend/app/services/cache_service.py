@@ -0,0 +1,443 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from flask import current_app, g
+
+
+class PersistentCache:
+    """
+    Cache dua lapis: LRU di memori untuk akses cepat di dalam satu proses,
+    dan SQLite di disk (dengan TTL) yang dibagi oleh semua proses worker.
+    """
+
+    def __init__(self, path, nama_tabel='cache', ttl=3600, max_items=256, max_items_disk=None, max_bytes_disk=None):
+        self.path = path
+        self.nama_tabel = nama_tabel
+        self.ttl = ttl
+        self.max_items = max_items
+        self.max_items_disk = max_items_disk
+        self.max_bytes_disk = max_bytes_disk
+
+        self._memori = OrderedDict()
+        self._lock = threading.Lock()
+        self._lokal = threading.local()
+        self._jumlah_tulis = 0
+
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._koneksi() as conn:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.nama_tabel} ("
+                "kunci TEXT PRIMARY KEY, nilai BLOB NOT NULL, kedaluwarsa REAL NOT NULL, diakses REAL, ukuran INTEGER)"
+            )
+            # File cache lama dibuat sebelum ada kolom 'diakses' dan 'ukuran'
+            kolom = [baris[1] for baris in conn.execute(f"PRAGMA table_info({self.nama_tabel})")]
+            if 'diakses' not in kolom:
+                conn.execute(f"ALTER TABLE {self.nama_tabel} ADD COLUMN diakses REAL")
+            if 'ukuran' not in kolom:
+                conn.execute(f"ALTER TABLE {self.nama_tabel} ADD COLUMN ukuran INTEGER")
+
+    def _koneksi(self):
+        # Koneksi SQLite tidak boleh dipakai lintas thread, jadi satu koneksi per thread
+        conn = getattr(self._lokal, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._lokal.conn = conn
+        return conn
+
+    def _simpan_di_memori(self, kunci, nilai, kedaluwarsa):
+        with self._lock:
+            self._memori[kunci] = (nilai, kedaluwarsa)
+            self._memori.move_to_end(kunci)
+            while len(self._memori) > self.max_items:
+                self._memori.popitem(last=False)
+
+    def get(self, kunci):
+        sekarang = time.time()
+        with self._lock:
+            entri = self._memori.get(kunci)
+            if entri is not None:
+                if entri[1] > sekarang:
+                    self._memori.move_to_end(kunci)
+                    self.hits += 1
+                    return entri[0]
+                del self._memori[kunci]
+
+        try:
+            baris = self._koneksi().execute(
+                f"SELECT nilai, kedaluwarsa FROM {self.nama_tabel} WHERE kunci = ?", (kunci,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            current_app.logger.warning(f"Gagal membaca cache '{self.nama_tabel}': {e}")
+            baris = None
+
+        if baris is None or baris[1] <= sekarang:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        if self.max_items_disk or self.max_bytes_disk:
+            # Waktu akses di disk hanya dicatat saat memori miss, cukup untuk eviksi LRU perkiraan
+            try:
+                with self._koneksi() as conn:
+                    conn.execute(f"UPDATE {self.nama_tabel} SET diakses = ? WHERE kunci = ?", (sekarang, kunci))
+            except sqlite3.Error:
+                pass
+
+        self._simpan_di_memori(kunci, baris[0], baris[1])
+        with self._lock:
+            self.hits += 1
+        return baris[0]
+
+    def set(self, kunci, nilai, ttl=None):
+        kedaluwarsa = time.time() + (self.ttl if ttl is None else ttl)
+        self._simpan_di_memori(kunci, nilai, kedaluwarsa)
+        try:
+            with self._koneksi() as conn:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO {self.nama_tabel} (kunci, nilai, kedaluwarsa, diakses, ukuran) VALUES (?, ?, ?, ?, ?)",
+                    (kunci, nilai, kedaluwarsa, time.time(), len(nilai))
+                )
+                self._jumlah_tulis += 1
+                if self.max_bytes_disk:
+                    # Entri besar (mis. teks buku) cepat memenuhi batas, jadi diperiksa setiap penulisan
+                    conn.execute(
+                        f"DELETE FROM {self.nama_tabel} WHERE kunci IN ("
+                        f"SELECT kunci FROM (SELECT kunci, SUM(ukuran) OVER (ORDER BY diakses DESC) AS kumulatif "
+                        f"FROM {self.nama_tabel}) WHERE kumulatif > ?)",
+                        (self.max_bytes_disk,)
+                    )
+                # Bersihkan entri kedaluwarsa sesekali, bukan di setiap penulisan
+                if self._jumlah_tulis % 100 == 0:
+                    conn.execute(f"DELETE FROM {self.nama_tabel} WHERE kedaluwarsa <= ?", (time.time(),))
+                    if self.max_items_disk:
+                        conn.execute(
+                            f"DELETE FROM {self.nama_tabel} WHERE kunci IN ("
+                            f"SELECT kunci FROM {self.nama_tabel} ORDER BY diakses DESC LIMIT -1 OFFSET ?)",
+                            (self.max_items_disk,)
+                        )
+        except sqlite3.Error as e:
+            current_app.logger.warning(f"Gagal menulis cache '{self.nama_tabel}': {e}")
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'items_memori': len(self._memori)}
+
+
+def buat_kunci(*bagian):
+    """Kunci berbasis konten: SHA-256 dari semua bagian yang digabung."""
+    digest = hashlib.sha256()
+    for b in bagian:
+        digest.update(str(b).encode('utf-8'))
+        digest.update(b'\x1f')
+    return digest.hexdigest()
+
+
+def normalisasi_prompt(prompt):
+    # Prompt dibangun dari f-string berindentasi; perbedaan spasi tidak mengubah makna
+    return ' '.join(prompt.split())
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    global _response_cache
+    if not current_app.config.get('AI_CACHE_ENABLED'):
+        return None
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                _response_cache = PersistentCache(
+                    os.path.join(current_app.config['CACHE_DIR'], 'ai_responses.sqlite'),
+                    nama_tabel='respons_ai',
+                    ttl=current_app.config['AI_CACHE_TTL'],
+                    max_items=current_app.config['AI_CACHE_MAX_ITEMS']
+                )
+    return _response_cache
+
+
+_idempotency_cache = None
+_idempotency_cache_lock = threading.Lock()
+
+
+def get_idempotency_cache():
+    """Respons yang sudah selesai per Idempotency-Key, dibagi antar proses worker."""
+    global _idempotency_cache
+    if _idempotency_cache is None:
+        with _idempotency_cache_lock:
+            if _idempotency_cache is None:
+                _idempotency_cache = PersistentCache(
+                    os.path.join(current_app.config['CACHE_DIR'], 'idempotensi.sqlite'),
+                    nama_tabel='idempotensi',
+                    ttl=current_app.config['IDEMPOTENCY_TTL'],
+                    max_items=current_app.config['IDEMPOTENCY_MAX_ITEMS']
+                )
+    return _idempotency_cache
+
+
+class ImageSearchCache:
+    """
+    Cache hasil pencarian gambar per kueri ternormalisasi. Kueri tanpa hasil juga
+    disimpan (negative caching) dengan TTL lebih pendek agar tidak terus memakan kuota CSE.
+    """
+
+    def __init__(self, cache, ttl_negatif):
+        self.cache = cache
+        self.ttl_negatif = ttl_negatif
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.hits_negatif = 0
+        self.misses = 0
+
+    @staticmethod
+    def _kunci(kueri):
+        return buat_kunci(' '.join(kueri.lower().split()))
+
+    def get(self, kueri):
+        """List URL jika ada di cache (bisa list kosong untuk hasil negatif), None jika miss."""
+        nilai = self.cache.get(self._kunci(kueri))
+        with self._lock:
+            if nilai is None:
+                self.misses += 1
+                return None
+            urls = json.loads(nilai)
+            if urls:
+                self.hits += 1
+            else:
+                self.hits_negatif += 1
+            return urls
+
+    def set(self, kueri, urls):
+        ttl = None if urls else self.ttl_negatif
+        self.cache.set(self._kunci(kueri), json.dumps(urls), ttl=ttl)
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'hits_negatif': self.hits_negatif, 'misses': self.misses}
+
+
+_image_cache = None
+_image_cache_lock = threading.Lock()
+
+
+def get_image_cache():
+    global _image_cache
+    if _image_cache is None:
+        with _image_cache_lock:
+            if _image_cache is None:
+                _image_cache = ImageSearchCache(
+                    PersistentCache(
+                        os.path.join(current_app.config['CACHE_DIR'], 'gambar_cse.sqlite'),
+                        nama_tabel='gambar_cse',
+                        ttl=current_app.config['IMAGE_CACHE_TTL'],
+                        max_items=current_app.config['IMAGE_CACHE_MAX_ITEMS'],
+                        max_items_disk=current_app.config['IMAGE_CACHE_MAX_ITEMS_DISK']
+                    ),
+                    ttl_negatif=current_app.config['IMAGE_CACHE_NEGATIVE_TTL']
+                )
+    return _image_cache
+
+
+class ExtractedTextCache:
+    """
+    Cache teks hasil ekstraksi file referensi, dikunci dengan SHA-256 isi file plus
+    versi ekstraktor. Teks disimpan terkompresi zlib dengan batas total ukuran di disk.
+    """
+
+    def __init__(self, cache, versi_ekstraktor):
+        self.cache = cache
+        self.versi_ekstraktor = versi_ekstraktor
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_dihemat = 0 # Total ukuran file yang tidak perlu diekstrak ulang
+
+    def _kunci(self, hash_file):
+        return f"{self.versi_ekstraktor}:{hash_file}"
+
+    def get(self, hash_file, ukuran_file=0):
+        nilai = self.cache.get(self._kunci(hash_file))
+        with self._lock:
+            if nilai is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.bytes_dihemat += ukuran_file
+        return zlib.decompress(nilai).decode('utf-8')
+
+    def set(self, hash_file, teks):
+        self.cache.set(self._kunci(hash_file), zlib.compress(teks.encode('utf-8')))
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0,
+                'bytes_dihemat': self.bytes_dihemat
+            }
+
+
+_extracted_text_cache = None
+_extracted_text_cache_lock = threading.Lock()
+
+
+def get_extracted_text_cache(versi_ekstraktor):
+    global _extracted_text_cache
+    if _extracted_text_cache is None:
+        with _extracted_text_cache_lock:
+            if _extracted_text_cache is None:
+                _extracted_text_cache = ExtractedTextCache(
+                    PersistentCache(
+                        os.path.join(current_app.config['CACHE_DIR'], 'teks_referensi.sqlite'),
+                        nama_tabel='teks_referensi',
+                        ttl=current_app.config['EXTRACTION_CACHE_TTL'],
+                        max_items=current_app.config['EXTRACTION_CACHE_MAX_ITEMS'],
+                        max_bytes_disk=current_app.config['EXTRACTION_CACHE_MAX_BYTES']
+                    ),
+                    versi_ekstraktor
+                )
+    return _extracted_text_cache
+
+
+class CacheRendisi:
+    """
+    Cache file hasil render (mis. PDF RPP) di disk, satu file per (jenis, id, sidik isi).
+    Sidik isi juga dipakai sebagai ETag. File ditulis atomik sehingga aman dibaca proses
+    worker lain; jika total ukuran melebihi batas, file yang paling lama tidak diakses dihapus.
+    """
+
+    def __init__(self, folder, max_bytes):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(folder, exist_ok=True)
+
+    def path(self, jenis, id_objek, sidik):
+        return os.path.join(self.folder, f"{jenis}-{id_objek}-{sidik}.pdf")
+
+    def ambil(self, jenis, id_objek, sidik):
+        """Path file jika rendisi ada di cache, None jika miss."""
+        path = self.path(jenis, id_objek, sidik)
+        try:
+            # Waktu modifikasi dipakai sebagai waktu akses terakhir untuk eviksi
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return path
+
+    def simpan(self, jenis, id_objek, sidik, data):
+        path = self.path(jenis, id_objek, sidik)
+        # Rendisi lama objek yang sama tidak akan diminta lagi karena sidiknya berbeda
+        self.hapus(jenis, id_objek, kecuali=path)
+        sementara = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(sementara, 'wb') as f:
+            f.write(data)
+        os.replace(sementara, path)
+        self._evict()
+        return path
+
+    def hapus(self, jenis, id_objek, kecuali=None):
+        """Menghapus semua rendisi satu objek (dipanggil saat objek diubah atau dihapus)."""
+        awalan = f"{jenis}-{id_objek}-"
+        for nama in os.listdir(self.folder):
+            if nama.startswith(awalan) and nama.endswith('.pdf') and os.path.join(self.folder, nama) != kecuali:
+                try:
+                    os.remove(os.path.join(self.folder, nama))
+                except OSError:
+                    pass
+
+    def _evict(self):
+        berkas = []
+        for entri in os.scandir(self.folder):
+            if entri.name.endswith('.pdf'):
+                try:
+                    info = entri.stat()
+                except OSError:
+                    continue
+                berkas.append((info.st_mtime, info.st_size, entri.path))
+        total = sum(ukuran for _, ukuran, _ in berkas)
+        for _, ukuran, path in sorted(berkas):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= ukuran
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+
+_rendition_cache = None
+_rendition_cache_lock = threading.Lock()
+
+
+def get_rendition_cache():
+    global _rendition_cache
+    if _rendition_cache is None:
+        with _rendition_cache_lock:
+            if _rendition_cache is None:
+                _rendition_cache = CacheRendisi(
+                    os.path.join(current_app.config['CACHE_DIR'], 'rendisi'),
+                    max_bytes=current_app.config['RENDITION_CACHE_MAX_BYTES']
+                )
+    return _rendition_cache
+
+
+def stats_cache():
+    """Statistik semua cache yang sudah dibangun di proses ini, per nama cache."""
+    hasil = {}
+    if _response_cache is not None:
+        hasil['respons_ai'] = _response_cache.stats()
+    if _image_cache is not None:
+        hasil['gambar'] = _image_cache.stats()
+    if _extracted_text_cache is not None:
+        hasil['teks_referensi'] = _extracted_text_cache.stats()
+    if _idempotency_cache is not None:
+        hasil['idempotensi'] = _idempotency_cache.stats()
+    if _rendition_cache is not None:
+        hasil['rendisi'] = _rendition_cache.stats()
+    return hasil
+
+
+# --- Pelaporan status cache per request (disimpan di flask.g) ---
+def lewati_cache_ai():
+    """Paksa panggilan AI berikutnya di request ini untuk tidak membaca cache."""
+    g.ai_cache_bypass = True
+
+
+def cache_ai_dilewati():
+    return g.get('ai_cache_bypass', False)
+
+
+def catat_cache_ai(hit):
+    if 'ai_cache_status' not in g:
+        g.ai_cache_status = []
+    g.ai_cache_status.append(hit)
+
+
+def status_cache_ai():
+    """True jika semua panggilan AI di request ini dilayani dari cache."""
+    status = g.get('ai_cache_status', [])
+    return bool(status) and all(status)
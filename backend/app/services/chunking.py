@@ -0,0 +1,49 @@
+import re
+
+# Perkiraan kasar untuk teks Indonesia/Inggris: rata-rata ~4 karakter per token
+KARAKTER_PER_TOKEN = 4
+
+
+def perkiraan_token(teks):
+    return len(teks) // KARAKTER_PER_TOKEN + 1
+
+
+def bagi_teks(teks, max_token):
+    """
+    Membagi teks menjadi potongan yang masing-masing kira-kira tidak melebihi max_token.
+    Pemotongan mengikuti batas paragraf, lalu batas kalimat untuk paragraf yang terlalu
+    panjang, dan baru dipotong paksa per karakter jika satu kalimat pun masih kebesaran.
+    """
+    max_karakter = max(1, max_token) * KARAKTER_PER_TOKEN
+    potongan = []
+    buffer = []
+    panjang_buffer = 0
+
+    def kosongkan():
+        nonlocal buffer, panjang_buffer
+        if buffer:
+            potongan.append("\n\n".join(buffer))
+        buffer = []
+        panjang_buffer = 0
+
+    for paragraf in _pecah(teks, max_karakter):
+        if panjang_buffer + len(paragraf) > max_karakter:
+            kosongkan()
+        buffer.append(paragraf)
+        panjang_buffer += len(paragraf) + 2
+    kosongkan()
+    return potongan
+
+
+def _pecah(teks, max_karakter):
+    # Hasilkan satuan teks (paragraf/kalimat/potongan) yang masing-masing muat dalam max_karakter
+    for paragraf in re.split(r'\n\s*\n', teks):
+        paragraf = paragraf.strip()
+        if not paragraf:
+            continue
+        if len(paragraf) <= max_karakter:
+            yield paragraf
+            continue
+        for kalimat in re.split(r'(?<=[.!?])\s+', paragraf):
+            for mulai in range(0, len(kalimat), max_karakter):
+                yield kalimat[mulai:mulai + max_karakter]
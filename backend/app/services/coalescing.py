@@ -0,0 +1,134 @@
+import contextvars
+import threading
+from collections import defaultdict
+from concurrent.futures import Future
+
+
+class PenggabungPanggilan:
+    """
+    Single-flight: panggilan bersamaan dengan kunci yang sama berbagi satu eksekusi.
+    Pemanggil pertama (pemimpin) menjalankan fungsi; pemanggil lain yang datang selama
+    eksekusi itu berjalan menunggu dan menerima hasil atau error yang sama. Setelah
+    selesai kunci dilepas, sehingga panggilan berikutnya dieksekusi ulang (hasil yang
+    sudah selesai disimpan oleh cache, bukan oleh kelas ini). Berlaku per proses.
+    """
+
+    def __init__(self, aktif=True):
+        self.aktif = aktif
+        self._lock = threading.Lock()
+        self._berjalan = {} # kunci -> Future milik pemimpin
+        self._metrik = defaultdict(int)
+
+    def jalankan(self, kunci, fungsi):
+        """Mengembalikan (hasil, digabung); digabung True jika hasil diambil dari panggilan pemimpin."""
+        if not self.aktif:
+            return fungsi(), False
+
+        with self._lock:
+            future = self._berjalan.get(kunci)
+            pemimpin = future is None
+            if pemimpin:
+                future = Future()
+                self._berjalan[kunci] = future
+                self._metrik['pemimpin'] += 1
+            else:
+                self._metrik['digabung'] += 1
+
+        if not pemimpin:
+            # Lama tunggu dibatasi oleh pemimpin sendiri (timeout antrean, retry, breaker)
+            return future.result(), True
+
+        try:
+            hasil = fungsi()
+        except BaseException as e:
+            self._lepas(kunci)
+            future.set_exception(e)
+            raise
+        self._lepas(kunci)
+        future.set_result(hasil)
+        return hasil, False
+
+    def siarkan(self, kunci, produsen):
+        """
+        Versi stream dari jalankan(). Generator `produsen()` dibaca sampai habis oleh satu
+        thread pompa dan setiap itemnya disiarkan ke semua pelanggan, termasuk pemimpin.
+        Pelanggan yang terputus tidak menghentikan stream bagi pelanggan lain.
+        Kunci stream harus berbeda dari kunci jalankan(). Mengembalikan (SiaranStream, digabung).
+        """
+        siaran = SiaranStream()
+        if not self.aktif:
+            self._pompa(None, produsen, siaran)
+            return siaran, False
+
+        with self._lock:
+            lama = self._berjalan.get(kunci)
+            if lama is not None:
+                self._metrik['digabung'] += 1
+                return lama, True
+            self._berjalan[kunci] = siaran
+            self._metrik['pemimpin'] += 1
+        self._pompa(kunci, produsen, siaran)
+        return siaran, False
+
+    def _pompa(self, kunci, produsen, siaran):
+        def jalankan():
+            try:
+                for item in produsen():
+                    siaran.tambah(item)
+            except BaseException as e:
+                if kunci is not None:
+                    self._lepas(kunci)
+                siaran.tutup(e)
+                return
+            if kunci is not None:
+                self._lepas(kunci)
+            siaran.tutup()
+
+        # Salinan contextvars agar app context Flask tetap tersedia di thread pompa
+        ctx = contextvars.copy_context()
+        threading.Thread(target=ctx.run, args=(jalankan,), name='siaran-ai', daemon=True).start()
+
+    def _lepas(self, kunci):
+        with self._lock:
+            self._berjalan.pop(kunci, None)
+
+    def stats(self):
+        with self._lock:
+            return {**self._metrik, 'sedang_berjalan': len(self._berjalan)}
+
+
+class SiaranStream:
+    """Buffer item stream yang dapat dibaca dari awal oleh banyak pelanggan secara bersamaan."""
+
+    def __init__(self):
+        self._kondisi = threading.Condition()
+        self._item = []
+        self._selesai = False
+        self._error = None
+
+    def tambah(self, item):
+        with self._kondisi:
+            self._item.append(item)
+            self._kondisi.notify_all()
+
+    def tutup(self, error=None):
+        with self._kondisi:
+            self._selesai = True
+            self._error = error
+            self._kondisi.notify_all()
+
+    def __iter__(self):
+        posisi = 0
+        while True:
+            with self._kondisi:
+                while posisi >= len(self._item) and not self._selesai:
+                    self._kondisi.wait()
+                baru = self._item[posisi:]
+                posisi = len(self._item)
+                selesai, error = self._selesai, self._error
+            # Item dikirim di luar lock agar pelanggan yang lambat tidak menahan pompa
+            yield from baru
+            if selesai:
+                if error is not None:
+                    raise error
+                return
@@ -0,0 +1,354 @@
+import hashlib
+import io
+import math
+import mmap
+import os
+import signal
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+
+import PyPDF2
+from flask import current_app
+
+from app.core.metrics import DURASI_EKSTRAKSI_HALAMAN
+from app.services.ocr import PengaturanOCR, inisialisasi_worker_ocr, ocr_gambar
+
+EKSTENSI_GAMBAR = ['.png', '.jpg', '.jpeg', '.bmp', '.tiff']
+
+# Naikkan setiap kali logika ekstraksi berubah agar cache teks lama tidak terpakai
+VERSI_EKSTRAKTOR = '2'
+
+# Upload sampai ukuran ini dibaca ke memori (batas spool Werkzeug); di atasnya di-mmap dari file sementara
+UKURAN_BACA_UPLOAD = 500 * 1024
+# PDF di atas ukuran ini dibagikan ke worker lewat shared memory, bukan disalin per tugas
+UKURAN_KIRIM_LANGSUNG = 1024 * 1024
+# Kelonggaran batas waktu di proses induk; batas sebenarnya dijaga oleh worker
+MARGIN_BATAS_WAKTU = 5
+
+
+class BerkasReferensi:
+    """
+    File referensi yang diekstrak langsung dari memori, tanpa disalin ke folder sementara.
+    `data` adalah objek buffer: bytes, memoryview (upload kecil) atau mmap (upload/file besar).
+    """
+
+    def __init__(self, nama, data, penutup=None, path=None):
+        self.nama = nama
+        self.data = data
+        self.path = path # Path file asli jika ada, agar worker dapat membukanya sendiri
+        self._penutup = penutup
+
+    @property
+    def extension(self):
+        return os.path.splitext(self.nama)[1].lower()
+
+    @property
+    def ukuran(self):
+        return len(self.data)
+
+    def buka(self):
+        """Objek file-like (read/seek/tell) di atas data, untuk PyPDF2 dan PIL."""
+        if isinstance(self.data, mmap.mmap):
+            self.data.seek(0)
+            return self.data
+        return io.BytesIO(self.data)
+
+    def tutup(self):
+        if isinstance(self.data, memoryview):
+            self.data.release()
+        if self._penutup:
+            self._penutup()
+        self._penutup = None
+
+    @classmethod
+    def dari_upload(cls, file_storage):
+        """
+        Werkzeug menampung upload di SpooledTemporaryFile: upload kecil tetap di memori dan
+        cukup dibaca sekali, sedangkan upload besar sudah berada di file sementara anonim
+        sehingga cukup di-mmap lewat fileno(), tanpa menulis salinan baru ke disk.
+        """
+        stream = file_storage.stream
+        stream.seek(0, os.SEEK_END)
+        ukuran = stream.tell()
+        stream.seek(0)
+        if ukuran <= UKURAN_BACA_UPLOAD:
+            return cls(file_storage.filename, stream.read())
+        try:
+            # Upload di atas batas spool Werkzeug sudah di disk, jadi fileno() tidak menyalin apa pun
+            peta = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+        except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+            return cls(file_storage.filename, stream.read())
+        return cls(file_storage.filename, peta, penutup=peta.close)
+
+    @classmethod
+    def dari_path(cls, file_path):
+        with open(file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return cls(os.path.basename(file_path), b"", path=file_path)
+            peta = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(os.path.basename(file_path), peta, penutup=peta.close, path=file_path)
+
+
+def hash_berkas(berkas):
+    return hashlib.sha256(berkas.data).hexdigest()
+
+
+# --- Fungsi worker: dijalankan di proses terpisah, jadi tidak boleh memakai Flask ---
+# Sumber PDF untuk worker berupa tuple kecil yang murah di-pickle:
+#   ('path', path), ('shm', nama shared memory, ukuran), atau ('bytes', data) untuk file kecil.
+@contextmanager
+def _buka_sumber(sumber):
+    jenis = sumber[0]
+    if jenis == 'path':
+        with open(sumber[1], 'rb') as f:
+            yield f
+    elif jenis == 'shm':
+        # Segmen dibuat dan di-unlink oleh proses induk; resource tracker dipakai bersama (lihat _get_pool)
+        shm = shared_memory.SharedMemory(name=sumber[1])
+        try:
+            data = bytes(shm.buf[:sumber[2]])
+        finally:
+            shm.close()
+        yield io.BytesIO(data)
+    else:
+        yield io.BytesIO(sumber[1])
+
+
+def _hitung_halaman_pdf(sumber):
+    with _buka_sumber(sumber) as f:
+        return len(PyPDF2.PdfReader(f).pages)
+
+
+def _ekstrak_halaman_pdf(sumber, mulai, akhir):
+    with _buka_sumber(sumber) as f:
+        reader = PyPDF2.PdfReader(f)
+        return [reader.pages[i].extract_text() or "" for i in range(mulai, akhir)]
+
+
+def _ocr_gambar(data, timeout):
+    return [ocr_gambar(data, timeout)]
+
+
+@contextmanager
+def _batas_waktu_worker(detik):
+    """
+    Membatasi lama satu tugas sejak tugas itu mulai berjalan di worker (bukan sejak diajukan).
+    Memakai SIGALRM, jadi hanya berlaku di POSIX dan di thread utama proses worker.
+    """
+    if not detik or not hasattr(signal, 'setitimer') or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def habis(signum, frame):
+        raise TimeoutError(f"Tugas ekstraksi melewati batas waktu {detik} detik.")
+
+    lama = signal.signal(signal.SIGALRM, habis)
+    signal.setitimer(signal.ITIMER_REAL, detik)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, lama)
+
+
+def _jalankan_terukur(fungsi, batas_detik, *argumen):
+    """Menjalankan fungsi worker dan mengembalikan (hasil, durasi detik) agar waktunya tercatat di proses induk."""
+    mulai = time.perf_counter()
+    with _batas_waktu_worker(batas_detik):
+        hasil = fungsi(*argumen)
+    return hasil, time.perf_counter() - mulai
+
+
+def _sumber_lokal(berkas):
+    return ('path', berkas.path) if berkas.path else ('bytes', bytes(berkas.data))
+
+
+def ekstrak_teks_langsung(berkas, timeout=None):
+    """
+    Ekstraksi berurutan di proses pemanggil, tanpa pool dan tanpa Flask (dipakai CLI impor
+    referensi). Pengaturan OCR diambil dari inisialisasi_worker_ocr di proses tersebut.
+    """
+    if berkas.extension == '.pdf':
+        sumber = _sumber_lokal(berkas)
+        return "".join(_ekstrak_halaman_pdf(sumber, 0, _hitung_halaman_pdf(sumber)))
+    if berkas.extension in EKSTENSI_GAMBAR:
+        return _ocr_gambar(berkas.data, timeout or 0)[0]
+    return ""
+
+
+class ExtractionPipeline:
+    """
+    Ekstraksi teks paralel: halaman PDF dibagi per rentang ke process pool seukuran
+    jumlah core, sedangkan gambar di-OCR di pool terpisah yang lebih kecil agar OCR
+    yang lambat tidak menahan ekstraksi PDF. Urutan halaman dipertahankan dan hasil
+    setiap file digabung sekali di akhir.
+    """
+
+    def __init__(self, max_workers=None, timeout_per_halaman=30, halaman_per_tugas=8,
+                 max_workers_ocr=None, timeout_ocr=60, pengaturan_ocr=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.timeout_per_halaman = timeout_per_halaman
+        self.halaman_per_tugas = halaman_per_tugas
+        self.max_workers_ocr = max_workers_ocr or max(1, self.max_workers // 2)
+        self.timeout_ocr = timeout_ocr
+        self.pengaturan_ocr = pengaturan_ocr or PengaturanOCR()
+        self._pools = {} # 'pdf' / 'ocr' -> ProcessPoolExecutor
+        self._lock = threading.Lock()
+
+    def _get_pool(self, jenis='pdf'):
+        with self._lock:
+            pool = self._pools.get(jenis)
+            if pool is None:
+                if os.name == 'posix':
+                    # Resource tracker dijalankan sebelum worker dibuat agar worker memakai tracker
+                    # yang sama dengan proses induk: shared memory yang dibuka worker tidak dianggap bocor
+                    resource_tracker.ensure_running()
+                if jenis == 'ocr':
+                    pool = ProcessPoolExecutor(
+                        max_workers=self.max_workers_ocr,
+                        initializer=inisialisasi_worker_ocr,
+                        initargs=(self.pengaturan_ocr,)
+                    )
+                else:
+                    pool = ProcessPoolExecutor(max_workers=self.max_workers)
+                self._pools[jenis] = pool
+            return pool
+
+    def _reset_pool(self, jenis=None):
+        """Membuang pool yang rusak (atau semua pool jika jenis tidak diberikan)."""
+        with self._lock:
+            for nama in ([jenis] if jenis else list(self._pools)):
+                pool = self._pools.pop(nama, None)
+                if pool is not None:
+                    pool.shutdown(wait=False, cancel_futures=True)
+
+    def _sumber_pdf(self, berkas, memori):
+        """
+        Sumber PDF untuk worker: path file jika ada; file besar disalin sekali ke shared memory
+        (dicatat di `memori` untuk di-unlink setelah selesai); file kecil dikirim langsung.
+        """
+        if berkas.path:
+            return ('path', berkas.path)
+        if berkas.ukuran <= UKURAN_KIRIM_LANGSUNG:
+            return ('bytes', bytes(berkas.data))
+        shm = shared_memory.SharedMemory(create=True, size=berkas.ukuran)
+        memori.append(shm)
+        shm.buf[:berkas.ukuran] = berkas.data
+        return ('shm', shm.name, berkas.ukuran)
+
+    def _ajukan(self, antrean, jenis, batas_detik, fungsi, *argumen):
+        """
+        Mengajukan satu tugas. Batas waktu tugas dijaga worker sejak tugas mulai berjalan;
+        batas di proses induk hanya pengaman jika worker macet, jadi ikut menghitung lama
+        antrean tugas sebelumnya (`antrean`: jenis -> total batas detik yang sudah diajukan).
+        OCR dibatasi oleh engine OCR sendiri (lihat services/ocr.py).
+        """
+        workers = self.max_workers_ocr if jenis == 'ocr' else self.max_workers
+        batas_induk = time.monotonic() + antrean[jenis] / workers + batas_detik + MARGIN_BATAS_WAKTU
+        antrean[jenis] += batas_detik
+        future = self._get_pool(jenis).submit(
+            _jalankan_terukur, fungsi, None if jenis == 'ocr' else batas_detik, *argumen
+        )
+        return future, batas_induk
+
+    def ekstrak_banyak(self, berkas_list):
+        """Mengembalikan list teks, satu per file, dengan urutan yang sama dengan berkas_list."""
+        return [teks for teks, _ in self.ekstrak_banyak_dengan_status(berkas_list)]
+
+    def ekstrak_banyak_dengan_status(self, berkas_list):
+        """Seperti ekstrak_banyak, tetapi tiap item berupa (teks, lengkap); lengkap=False jika ada bagian yang gagal."""
+        memori = []
+        try:
+            return self._ekstrak(berkas_list, memori)
+        finally:
+            for shm in memori:
+                shm.close()
+                shm.unlink()
+
+    def _tunggu(self, future, batas_induk, berkas, jenis):
+        """Hasil satu tugas, atau None (dengan log) jika gagal atau melewati batas waktu."""
+        try:
+            return future.result(timeout=max(0, batas_induk - time.monotonic()))
+        except (FuturesTimeoutError, TimeoutError):
+            future.cancel()
+            current_app.logger.warning(f"Ekstraksi sebagian halaman {berkas.nama} melewati batas waktu; dilewati.")
+        except BrokenProcessPool as e:
+            self._reset_pool(jenis)
+            current_app.logger.error(f"Process pool ekstraksi rusak saat memproses {berkas.nama}: {e}")
+        except Exception as e:
+            current_app.logger.error(f"Gagal mengekstrak teks dari {berkas.nama}: {e}")
+        return None
+
+    def _ekstrak(self, berkas_list, memori):
+        antrean = defaultdict(float)
+        try:
+            # Tahap 1: jumlah halaman PDF dihitung di worker, bukan di thread request;
+            # gambar langsung diajukan ke pool OCR
+            awal = []
+            for berkas in berkas_list:
+                try:
+                    if berkas.extension == '.pdf':
+                        sumber = self._sumber_pdf(berkas, memori)
+                        awal.append(('pdf', sumber, self._ajukan(antrean, 'pdf', self.timeout_per_halaman, _hitung_halaman_pdf, sumber)))
+                    elif berkas.extension in EKSTENSI_GAMBAR:
+                        awal.append(('ocr', None, self._ajukan(antrean, 'ocr', self.timeout_ocr, _ocr_gambar, bytes(berkas.data), self.timeout_ocr)))
+                    else:
+                        awal.append(('lain', None, None))
+                except BrokenProcessPool:
+                    raise
+                except Exception as e:
+                    current_app.logger.error(f"Gagal mengekstrak teks dari {berkas.nama}: {e}")
+                    awal.append(('gagal', None, None))
+
+            # Tahap 2: halaman PDF dibagi per rentang ke worker
+            antrean['pdf'] = 0
+            rencana = []
+            for berkas, (jenis, sumber, diajukan) in zip(berkas_list, awal):
+                if jenis == 'ocr':
+                    rencana.append([(diajukan, 'ocr', 1)])
+                elif jenis == 'lain':
+                    rencana.append([])
+                elif jenis == 'gagal':
+                    rencana.append(None)
+                else:
+                    hasil_hitung = self._tunggu(*diajukan, berkas, 'pdf')
+                    if hasil_hitung is None:
+                        rencana.append(None)
+                        continue
+                    jumlah_halaman = hasil_hitung[0]
+                    # Setiap tugas mem-parse PDF sendiri, jadi jumlah tugas per file dibatasi ukuran pool
+                    ukuran_tugas = max(self.halaman_per_tugas, math.ceil(jumlah_halaman / self.max_workers)) if jumlah_halaman else 1
+                    tugas_file = []
+                    for mulai in range(0, jumlah_halaman, ukuran_tugas):
+                        jumlah = min(ukuran_tugas, jumlah_halaman - mulai)
+                        tugas_file.append((
+                            self._ajukan(antrean, 'pdf', self.timeout_per_halaman * jumlah,
+                                         _ekstrak_halaman_pdf, sumber, mulai, mulai + jumlah),
+                            'pdf', jumlah
+                        ))
+                    rencana.append(tugas_file)
+        except BrokenProcessPool:
+            self._reset_pool()
+            raise
+
+        hasil = []
+        for berkas, tugas_file in zip(berkas_list, rencana):
+            bagian = []
+            lengkap = tugas_file is not None
+            for (future, batas_induk), jenis, jumlah in (tugas_file or []):
+                hasil_tugas = self._tunggu(future, batas_induk, berkas, jenis)
+                if hasil_tugas is None:
+                    lengkap = False
+                    continue
+                teks_bagian, durasi = hasil_tugas
+                bagian.extend(teks_bagian)
+                for _ in range(jumlah):
+                    DURASI_EKSTRAKSI_HALAMAN.observe(durasi / jumlah, jenis=jenis)
+            hasil.append(("".join(bagian), lengkap))
+        return hasil
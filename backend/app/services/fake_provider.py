@@ -0,0 +1,75 @@
+import json
+import random
+import re
+import time
+from types import SimpleNamespace
+
+
+class FakeProviderError(Exception):
+    """Error tiruan dengan status HTTP, diperlakukan seperti error dari SDK Together."""
+
+    def __init__(self, status_code, message=None):
+        super().__init__(message or f"Fake provider error {status_code}")
+        self.status_code = status_code
+
+
+class FakeTogetherClient:
+    """
+    Pengganti client Together untuk pengembangan lokal dan uji beban tanpa API key
+    (AI_PROVIDER=fake). Meniru `client.chat.completions.create`, termasuk mode stream
+    dan usage di chunk terakhir, dengan latensi dan tingkat error yang bisa diatur.
+    """
+
+    def __init__(self, latensi=0.5, tingkat_error=0.0, kode_error=(429, 500, 503), seed=None):
+        self.latensi = latensi
+        self.tingkat_error = tingkat_error
+        self.kode_error = kode_error
+        self._random = random.Random(seed)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model, messages, stream=False, **kwargs):
+        time.sleep(self.latensi * self._random.uniform(0.5, 1.5))
+        if self._random.random() < self.tingkat_error:
+            raise FakeProviderError(self._random.choice(self.kode_error))
+
+        prompt = messages[-1]['content']
+        teks = self._jawaban(prompt)
+        usage = SimpleNamespace(
+            prompt_tokens=len(prompt) // 4,
+            completion_tokens=len(teks) // 4,
+            total_tokens=(len(prompt) + len(teks)) // 4
+        )
+        if stream:
+            return self._stream(teks, usage)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=teks))],
+            usage=usage
+        )
+
+    def _stream(self, teks, usage):
+        for i in range(0, len(teks), 16):
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=teks[i:i + 16]))], usage=None)
+        yield SimpleNamespace(choices=[], usage=usage)
+
+    @staticmethod
+    def _jawaban(prompt):
+        # Bentuk jawaban ditebak dari template prompt yang dipakai AIService
+        jumlah = re.search(r'membuat (\d+) soal', prompt)
+        if jumlah:
+            return json.dumps([
+                {
+                    "pertanyaan": f"Soal latihan nomor {i + 1}?",
+                    "kategori_topik": "Umum",
+                    "pilihan": {"A": "Pilihan A", "B": "Pilihan B", "C": "Pilihan C"},
+                    "jawaban_benar": "A",
+                    **({"deskripsi_gambar": f"ilustrasi soal {i + 1}"} if i % 2 == 0 else {})
+                }
+                for i in range(int(jumlah.group(1)))
+            ], ensure_ascii=False)
+        if '"cp"' in prompt:
+            return json.dumps({
+                "cp": "Capaian pembelajaran contoh.", "tp": "Tujuan pembelajaran contoh.",
+                "materi_pokok": "Materi pokok contoh.", "pertanyaan_pemantik": "",
+                "model_pembelajaran": "", "media_sumber": ""
+            })
+        return "# RPP Contoh\n\n## A. Informasi Umum\n\n* Dibuat oleh fake provider.\n"
@@ -0,0 +1,172 @@
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from flask import current_app
+
+from app.core.concurrency import submit_dengan_konteks
+
+# Provider yang dikenali sebagai awalan di AI_FALLBACK_MODELS ("fake:nama-model")
+PROVIDER_DIKENAL = ('together', 'fake', 'replay')
+
+
+def parse_daftar_backend(teks, provider_bawaan='together'):
+    """
+    Mengubah daftar backend berformat "model-a,fake:model-b" menjadi list (provider, model).
+    Model tanpa awalan provider memakai provider_bawaan.
+    """
+    hasil = []
+    for item in (teks or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        provider, _, model = item.partition(':')
+        if provider in PROVIDER_DIKENAL and model:
+            hasil.append((provider, model))
+        else:
+            hasil.append((provider_bawaan, item))
+    return hasil
+
+
+class BackendLLM:
+    """Satu tujuan panggilan LLM: client provider + nama model, dengan circuit breaker sendiri."""
+
+    def __init__(self, nama, client, model_name, breaker=None):
+        self.nama = nama
+        self.client = client
+        self.model_name = model_name
+        # Breaker per backend: backend yang terganggu ditolak cepat tanpa memblokir backend lain
+        self.breaker = breaker
+
+
+def _persentil(data, p):
+    if not data:
+        return None
+    urut = sorted(data)
+    return urut[min(len(urut) - 1, int(p * len(urut)))]
+
+
+class PenjadwalHedging:
+    """
+    Menjalankan satu panggilan LLM terhadap daftar backend berurutan. Backend pertama
+    dipanggil lebih dulu; jika belum selesai setelah `tunda_hedge` detik, duplikat
+    permintaan dikirim ke backend berikutnya (maksimal `maks_hedge` kali) dan jawaban
+    sukses pertama yang dipakai. Jika sebuah backend gagal, backend berikutnya langsung
+    dicoba. Hasil panggilan yang kalah dibuang lewat `buang` begitu selesai, karena
+    request HTTP yang sudah berjalan tidak dapat dihentikan dari luar.
+    """
+
+    def __init__(self, backends, tunda_hedge=8.0, maks_hedge=1, max_workers=16):
+        if not backends:
+            raise ValueError("Minimal satu backend LLM harus disediakan.")
+        self.backends = list(backends)
+        self.tunda_hedge = tunda_hedge
+        self.maks_hedge = maks_hedge
+        # Executor hanya dipakai jika ada lebih dari satu backend
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='hedge') \
+            if len(self.backends) > 1 else None
+
+        self._lock = threading.Lock()
+        self._metrik = defaultdict(lambda: defaultdict(int)) # nama backend -> metrik
+        self._latensi = defaultdict(lambda: deque(maxlen=500)) # nama backend -> latensi sukses terakhir (detik)
+
+    def _catat(self, backend, nama, jumlah=1):
+        with self._lock:
+            self._metrik[backend.nama][nama] += jumlah
+
+    def _catat_menang(self, backend, latensi):
+        with self._lock:
+            self._metrik[backend.nama]['menang'] += 1
+            self._latensi[backend.nama].append(latensi)
+
+    def jalankan(self, fungsi, buang=None):
+        """
+        Memanggil fungsi(backend) dan mengembalikan hasil sukses pertama. `buang(hasil)`
+        dipanggil untuk hasil backend yang kalah (mis. untuk menutup stream).
+        Jika semua backend gagal, error terakhir dilempar ulang.
+        """
+        if self._executor is None:
+            backend = self.backends[0]
+            self._catat(backend, 'dipanggil')
+            mulai = time.monotonic()
+            try:
+                hasil = fungsi(backend)
+            except Exception:
+                self._catat(backend, 'gagal')
+                raise
+            self._catat_menang(backend, time.monotonic() - mulai)
+            return hasil
+
+        antrean = list(self.backends)
+        berjalan = {} # future -> (backend, waktu mulai)
+        hedge_terkirim = 0
+        error_terakhir = None
+
+        def luncurkan():
+            backend = antrean.pop(0)
+            self._catat(backend, 'dipanggil')
+            berjalan[submit_dengan_konteks(self._executor, fungsi, backend)] = (backend, time.monotonic())
+            return backend
+
+        luncurkan()
+        while berjalan:
+            boleh_hedge = antrean and hedge_terkirim < self.maks_hedge
+            selesai, _ = wait(list(berjalan), timeout=self.tunda_hedge if boleh_hedge else None,
+                              return_when=FIRST_COMPLETED)
+            if not selesai:
+                hedge_terkirim += 1
+                backend = luncurkan()
+                self._catat(backend, 'hedge')
+                current_app.logger.info(
+                    f"Panggilan AI belum selesai setelah {self.tunda_hedge} detik; hedge dikirim ke '{backend.nama}'."
+                )
+                continue
+
+            for future in selesai:
+                backend, mulai = berjalan.pop(future)
+                try:
+                    hasil = future.result()
+                except Exception as e:
+                    self._catat(backend, 'gagal')
+                    error_terakhir = e
+                    current_app.logger.warning(f"Backend AI '{backend.nama}' gagal: {e}")
+                    continue
+                self._catat_menang(backend, time.monotonic() - mulai)
+                self._batalkan(berjalan, buang)
+                return hasil
+
+            # Fallback: semua panggilan yang berjalan gagal, coba backend berikutnya
+            if not berjalan and antrean:
+                backend = luncurkan()
+                self._catat(backend, 'fallback')
+                current_app.logger.warning(f"Fallback panggilan AI ke backend '{backend.nama}'.")
+
+        raise error_terakhir
+
+    def _batalkan(self, berjalan, buang):
+        for future, (backend, _) in berjalan.items():
+            self._catat(backend, 'dibatalkan')
+            if future.cancel() or buang is None:
+                continue
+            future.add_done_callback(lambda f: f.exception() is None and buang(f.result()))
+
+    def stats(self):
+        with self._lock:
+            per_backend = {}
+            for backend in self.backends:
+                metrik = dict(self._metrik[backend.nama])
+                latensi = list(self._latensi[backend.nama])
+                dipanggil = metrik.get('dipanggil', 0)
+                per_backend[backend.nama] = {
+                    **metrik,
+                    'win_rate': round(metrik.get('menang', 0) / dipanggil, 4) if dipanggil else None,
+                    'latensi_p50': _persentil(latensi, 0.5),
+                    'latensi_p95': _persentil(latensi, 0.95),
+                    'status_breaker': backend.breaker.status if backend.breaker else None,
+                }
+        return {
+            'tunda_hedge_detik': self.tunda_hedge,
+            'maks_hedge': self.maks_hedge,
+            'backend': per_backend,
+        }
@@ -0,0 +1,201 @@
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import deque, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import AIJob
+from app.core.metrics import tetapkan_sumber_panggilan
+from app.services.resilience import tetapkan_sekolah_ai
+
+STATUS_SELESAI = ('selesai', 'gagal')
+STATUS_AKTIF = ('antri', 'berjalan')
+PESAN_JOB_HILANG = 'Job terhenti karena server dimulai ulang. Silakan ajukan ulang.'
+
+
+class JobQueue:
+    """
+    Antrean job AI in-process: job disimpan di database, dijalankan oleh pool
+    thread latar belakang, dengan batas job berjalan bersamaan per sekolah. Setiap job
+    dicatat atas nama instance ini (`pemilik`), yang memperbarui heartbeat job aktifnya
+    secara berkala agar proses lain dapat mengenali job yang pemiliknya sudah mati.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._executor = None
+        self._lock = threading.Lock()
+        self._menunggu = defaultdict(deque) # sekolah_id -> deque of (job_id, handler, kwargs)
+        self._berjalan = defaultdict(int) # sekolah_id -> jumlah job yang sedang berjalan
+        self._urutan_sekolah = deque() # Round-robin antar sekolah agar adil
+        self._heartbeat = None
+
+    def init_app(self, app):
+        self.app = app
+        self.max_per_sekolah = app.config['AI_JOB_MAX_PER_SEKOLAH']
+        self._executor = ThreadPoolExecutor(
+            max_workers=app.config['AI_JOB_WORKERS'],
+            thread_name_prefix='ai-job'
+        )
+        self.stale_after = app.config['AI_JOB_STALE_AFTER']
+        self.heartbeat_interval = app.config['AI_JOB_HEARTBEAT_INTERVAL']
+        self.pemilik = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        # Antrean hanya ada di memori proses: job aktif sisa proses sebelumnya tidak akan pernah dijalankan
+        with app.app_context():
+            try:
+                jumlah = self.tandai_job_hilang()
+                if jumlah:
+                    app.logger.warning(f"{jumlah} job AI tertinggal dari proses sebelumnya ditandai gagal.")
+            except Exception as e:
+                # Mis. tabel belum dibuat saat menjalankan migrasi
+                db.session.rollback()
+                app.logger.warning(f"Gagal memeriksa job AI tertinggal: {e}")
+
+    def tandai_job_hilang(self, job_id=None):
+        """
+        Menandai gagal job 'antri'/'berjalan' milik instance lain yang heartbeat-nya tidak
+        diperbarui lebih dari AI_JOB_STALE_AFTER detik. Job milik instance ini tidak pernah
+        ditandai karena masih dipegang di memori. Mengembalikan jumlah job yang ditandai.
+        """
+        batas = datetime.utcnow() - timedelta(seconds=self.stale_after)
+        query = AIJob.query.filter(
+            AIJob.status.in_(STATUS_AKTIF),
+            db.or_(AIJob.pemilik.is_(None), AIJob.pemilik != self.pemilik),
+            db.func.coalesce(AIJob.diperbarui_pada, AIJob.tanggal_mulai, AIJob.tanggal_dibuat) < batas
+        )
+        if job_id is not None:
+            query = query.filter(AIJob.id == job_id)
+        jumlah = query.update({
+            AIJob.status: 'gagal',
+            AIJob.pesan_error: PESAN_JOB_HILANG,
+            AIJob.tanggal_selesai: datetime.utcnow()
+        }, synchronize_session=False)
+        db.session.commit()
+        return jumlah
+
+    def perbarui_heartbeat(self):
+        """Memperbarui heartbeat semua job aktif milik instance ini. Mengembalikan jumlah job."""
+        jumlah = AIJob.query.filter(
+            AIJob.pemilik == self.pemilik,
+            AIJob.status.in_(STATUS_AKTIF)
+        ).update({AIJob.diperbarui_pada: datetime.utcnow()}, synchronize_session=False)
+        db.session.commit()
+        return jumlah
+
+    def _mulai_heartbeat(self):
+        with self._lock:
+            if self._heartbeat is not None:
+                return
+            self._heartbeat = threading.Thread(target=self._loop_heartbeat, name='ai-job-heartbeat', daemon=True)
+        self._heartbeat.start()
+
+    def _loop_heartbeat(self):
+        while True:
+            time.sleep(self.heartbeat_interval)
+            stats = self.stats()
+            if not stats['menunggu'] and not stats['berjalan']:
+                continue
+            with self.app.app_context():
+                try:
+                    self.perbarui_heartbeat()
+                except Exception as e:
+                    db.session.rollback()
+                    self.app.logger.warning(f"Gagal memperbarui heartbeat job AI: {e}")
+
+    def _perbarui_jika_aktif(self, job_id, **kolom):
+        """
+        UPDATE bersyarat: baris hanya diubah selama job masih 'antri'/'berjalan', sehingga
+        job yang sudah selesai atau ditandai gagal tidak ditimpa. True jika baris berubah.
+        """
+        kolom['diperbarui_pada'] = datetime.utcnow()
+        jumlah = AIJob.query.filter(AIJob.id == job_id, AIJob.status.in_(STATUS_AKTIF)).update(
+            {getattr(AIJob, nama): nilai for nama, nilai in kolom.items()}, synchronize_session=False
+        )
+        db.session.commit()
+        return jumlah == 1
+
+    def submit(self, jenis, handler, user_id, sekolah_id=None, payload=None, **kwargs):
+        """
+        Mencatat job baru lalu menjadwalkannya. `handler(**kwargs)` dijalankan di
+        dalam app context dan harus mengembalikan data yang bisa di-serialisasi ke JSON.
+        """
+        job = AIJob(
+            id=str(uuid.uuid4()),
+            jenis=jenis,
+            status='antri',
+            payload=json.dumps(payload or {}),
+            user_id=user_id,
+            sekolah_id=sekolah_id,
+            pemilik=self.pemilik,
+            diperbarui_pada=datetime.utcnow()
+        )
+        db.session.add(job)
+        db.session.commit()
+        self._mulai_heartbeat()
+
+        with self._lock:
+            if not self._menunggu[sekolah_id]:
+                self._urutan_sekolah.append(sekolah_id)
+            self._menunggu[sekolah_id].append((job.id, handler, kwargs))
+        self._jadwalkan()
+        return job.id
+
+    def _jadwalkan(self):
+        # Kirim job ke executor selama sekolahnya belum mencapai batas
+        with self._lock:
+            for _ in range(len(self._urutan_sekolah)):
+                sekolah_id = self._urutan_sekolah.popleft()
+                antrean = self._menunggu[sekolah_id]
+                while antrean and self._berjalan[sekolah_id] < self.max_per_sekolah:
+                    job_id, handler, kwargs = antrean.popleft()
+                    self._berjalan[sekolah_id] += 1
+                    self._executor.submit(self._jalankan, job_id, sekolah_id, handler, kwargs)
+                if antrean:
+                    self._urutan_sekolah.append(sekolah_id)
+                else:
+                    del self._menunggu[sekolah_id]
+
+    def _jalankan(self, job_id, sekolah_id, handler, kwargs):
+        try:
+            with self.app.app_context():
+                if not self._perbarui_jika_aktif(job_id, status='berjalan', tanggal_mulai=datetime.utcnow()):
+                    self.app.logger.warning(f"Job AI {job_id} sudah tidak aktif saat akan dijalankan; dilewati.")
+                    return
+                jenis = db.session.get(AIJob, job_id).jenis
+                tetapkan_sekolah_ai(sekolah_id)
+                tetapkan_sumber_panggilan(f"job:{jenis}")
+
+                try:
+                    perubahan = {'status': 'selesai', 'hasil': json.dumps(handler(**kwargs))}
+                except Exception as e:
+                    self.app.logger.error(f"Job AI {job_id} ({jenis}) gagal: {e}", exc_info=True)
+                    db.session.rollback()
+                    perubahan = {'status': 'gagal', 'pesan_error': str(e)}
+                if not self._perbarui_jika_aktif(job_id, tanggal_selesai=datetime.utcnow(), **perubahan):
+                    self.app.logger.warning(f"Job AI {job_id} sudah ditandai selesai/gagal; hasil akhirnya tidak disimpan.")
+        except Exception as e:
+            self.app.logger.error(f"Gagal memperbarui status job AI {job_id}: {e}", exc_info=True)
+        finally:
+            with self._lock:
+                self._berjalan[sekolah_id] -= 1
+                if self._berjalan[sekolah_id] <= 0:
+                    del self._berjalan[sekolah_id]
+            self._jadwalkan()
+
+    def get(self, job_id):
+        return AIJob.query.get(job_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'menunggu': sum(len(antrean) for antrean in self._menunggu.values()),
+                'berjalan': sum(self._berjalan.values()),
+            }
+
+
+job_queue = JobQueue()
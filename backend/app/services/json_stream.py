@@ -0,0 +1,73 @@
+import json
+
+
+class PenguraiArrayBertahap:
+    """
+    Parser inkremental untuk array JSON berisi objek, mis. output soal dari model yang
+    di-stream. Setiap potongan teks dimasukkan lewat `tambah`, yang mengembalikan objek
+    yang kurung kurawal penutupnya sudah diterima. Teks di luar array (pembuka ```json,
+    penjelasan model) diabaikan, dan objek yang sudah lengkap tetap didapat meskipun
+    respons terpotong sebelum array ditutup.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._posisi = 0 # Posisi karakter berikutnya yang belum diperiksa
+        self._kedalaman = 0
+        self._dalam_string = False
+        self._escape = False
+        self._mulai_objek = None
+        self.array_dimulai = False
+        self.array_selesai = False
+        self.jumlah_gagal = 0
+
+    def tambah(self, teks):
+        if self.array_selesai:
+            return []
+        self._buffer += teks
+        hasil = []
+        buffer = self._buffer
+        i = self._posisi
+        while i < len(buffer):
+            c = buffer[i]
+            if self._dalam_string:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._dalam_string = False
+            elif not self.array_dimulai:
+                if c == '[':
+                    self.array_dimulai = True
+                    self._kedalaman = 1
+            elif c == '"':
+                self._dalam_string = True
+            elif c in '[{':
+                if c == '{' and self._kedalaman == 1:
+                    self._mulai_objek = i
+                self._kedalaman += 1
+            elif c in ']}':
+                self._kedalaman -= 1
+                if c == '}' and self._kedalaman == 1 and self._mulai_objek is not None:
+                    self._keluarkan(buffer[self._mulai_objek:i + 1], hasil)
+                    self._mulai_objek = None
+                elif self._kedalaman == 0:
+                    self.array_selesai = True
+                    break
+            i += 1
+
+        # Buang teks yang sudah selesai diproses agar buffer tidak terus membesar
+        potong = self._mulai_objek if self._mulai_objek is not None else i
+        self._buffer = buffer[potong:]
+        self._posisi = i - potong
+        if self._mulai_objek is not None:
+            self._mulai_objek = 0
+        return hasil
+
+    def _keluarkan(self, teks_objek, hasil):
+        try:
+            hasil.append(json.loads(teks_objek))
+        except json.JSONDecodeError:
+            # Satu objek rusak tidak menggagalkan objek lain di array yang sama
+            self.jumlah_gagal += 1
@@ -0,0 +1,152 @@
+# OCR gambar referensi dengan Tesseract. Modul ini dijalankan di proses worker
+# ekstraksi, jadi tidak boleh memakai Flask; pengaturan dikirim lewat initializer pool.
+
+import io
+import os
+
+import pytesseract
+from PIL import Image, ImageOps
+
+try:
+    # Binding C API Tesseract: satu engine per proses dipakai ulang, tanpa spawn proses per gambar
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+# Metadata DPI di bawah ini dianggap tidak valid (foto ponsel umumnya tercatat 72 dpi)
+DPI_MINIMUM_VALID = 100
+
+
+class PengaturanOCR:
+    """Pengaturan OCR yang dapat di-pickle untuk dikirim ke proses worker."""
+
+    def __init__(self, tesseract_cmd='tesseract', bahasa='', psm=4, dpi=300, maks_sisi=3000,
+                 binarisasi=True, pakai_tesserocr=True):
+        self.tesseract_cmd = tesseract_cmd
+        self.bahasa = bahasa
+        self.psm = psm
+        self.dpi = dpi
+        self.maks_sisi = maks_sisi
+        self.binarisasi = binarisasi
+        self.pakai_tesserocr = pakai_tesserocr
+
+    @classmethod
+    def dari_config(cls, config):
+        return cls(
+            tesseract_cmd=config['TESSERACT_CMD'],
+            bahasa=config['OCR_LANG'],
+            psm=config['OCR_PSM'],
+            dpi=config['OCR_DPI'],
+            maks_sisi=config['OCR_MAX_SIDE'],
+            binarisasi=config['OCR_BINARIZE'],
+            pakai_tesserocr=config['OCR_USE_TESSEROCR']
+        )
+
+
+def ambang_otsu(gambar):
+    """Ambang binarisasi Otsu dari histogram gambar grayscale (mode 'L')."""
+    histogram = gambar.histogram()
+    total = sum(histogram)
+    jumlah_total = sum(i * h for i, h in enumerate(histogram))
+    jumlah_latar, bobot_latar = 0.0, 0
+    ambang, varians_maks = 127, -1.0
+    for i, h in enumerate(histogram):
+        bobot_latar += h
+        if not bobot_latar:
+            continue
+        bobot_depan = total - bobot_latar
+        if not bobot_depan:
+            break
+        jumlah_latar += i * h
+        selisih = jumlah_latar / bobot_latar - (jumlah_total - jumlah_latar) / bobot_depan
+        varians = bobot_latar * bobot_depan * selisih * selisih
+        if varians > varians_maks:
+            ambang, varians_maks = i, varians
+    return ambang
+
+
+def praproses_gambar(gambar, pengaturan):
+    """
+    Menyiapkan gambar untuk Tesseract: orientasi EXIF diterapkan, diubah ke grayscale,
+    diperkecil ke resolusi target (`dpi`, dan sisi terpanjang maksimal `maks_sisi` piksel),
+    lalu dibinarisasi dengan ambang Otsu. Mengembalikan (gambar, dpi efektif).
+    """
+    dpi_asli = gambar.info.get('dpi', (0, 0))[0] or 0
+    gambar = ImageOps.exif_transpose(gambar)
+
+    if gambar.mode in ('RGBA', 'LA', 'P'):
+        # Latar transparan dijadikan putih, bukan hitam
+        gambar = gambar.convert('RGBA')
+        latar = Image.new('RGBA', gambar.size, (255, 255, 255, 255))
+        gambar = Image.alpha_composite(latar, gambar)
+    gambar = gambar.convert('L')
+
+    dpi = dpi_asli if dpi_asli >= DPI_MINIMUM_VALID else pengaturan.dpi
+    skala = min(1.0, pengaturan.dpi / dpi, pengaturan.maks_sisi / max(gambar.size))
+    if skala < 1.0:
+        ukuran = (max(1, round(gambar.width * skala)), max(1, round(gambar.height * skala)))
+        gambar = gambar.resize(ukuran, Image.Resampling.LANCZOS, reducing_gap=3.0)
+        dpi = dpi * skala
+
+    if pengaturan.binarisasi:
+        ambang = ambang_otsu(gambar)
+        gambar = gambar.point([0 if i <= ambang else 255 for i in range(256)])
+    return gambar, round(dpi)
+
+
+# --- State per proses worker ---
+_pengaturan_worker = PengaturanOCR()
+_engine_tesserocr = None
+
+
+def inisialisasi_worker_ocr(pengaturan):
+    """Initializer process pool OCR."""
+    global _pengaturan_worker
+    _pengaturan_worker = pengaturan
+    # Beberapa proses OCR paralel lebih cepat jika tiap Tesseract tidak ikut membuat thread OpenMP sendiri
+    os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+    pytesseract.pytesseract.tesseract_cmd = pengaturan.tesseract_cmd
+
+
+def _ocr_tesserocr(gambar, dpi, pengaturan, timeout=0):
+    """
+    OCR dengan engine tesserocr milik proses ini. Dengan `timeout` (detik), pengenalan
+    dihentikan oleh Tesseract sendiri dan TimeoutError dilempar; engine tetap dapat dipakai.
+    """
+    global _engine_tesserocr
+    if _engine_tesserocr is None:
+        _engine_tesserocr = tesserocr.PyTessBaseAPI(
+            lang=pengaturan.bahasa or 'eng', psm=tesserocr.PSM(pengaturan.psm)
+        )
+    _engine_tesserocr.SetImage(gambar)
+    _engine_tesserocr.SetSourceResolution(dpi)
+    if timeout and not _engine_tesserocr.Recognize(timeout=int(timeout * 1000)):
+        _engine_tesserocr.Clear()
+        raise TimeoutError(f"OCR melewati batas waktu {timeout} detik.")
+    return _engine_tesserocr.GetUTF8Text()
+
+
+def ocr_gambar(data, timeout=0, pengaturan=None):
+    """
+    OCR satu gambar (bytes) menjadi teks. `timeout` (detik, 0 = tanpa batas) dijaga oleh
+    engine: tesserocr menghentikan pengenalan, pytesseract menghentikan proses tesseract.
+    tesserocr lama yang Recognize-nya belum menerima timeout diganti pytesseract jika ada batas waktu.
+    """
+    pengaturan = pengaturan or _pengaturan_worker
+    with Image.open(io.BytesIO(data)) as gambar:
+        gambar, dpi = praproses_gambar(gambar, pengaturan)
+
+    if tesserocr is not None and pengaturan.pakai_tesserocr:
+        try:
+            return _ocr_tesserocr(gambar, dpi, pengaturan, timeout)
+        except TypeError:
+            if not timeout:
+                raise
+
+    pytesseract.pytesseract.tesseract_cmd = pengaturan.tesseract_cmd
+    return pytesseract.image_to_string(
+        gambar,
+        lang=pengaturan.bahasa or None,
+        config=f"--psm {pengaturan.psm} --dpi {dpi}",
+        timeout=timeout or 0
+    )
@@ -0,0 +1,234 @@
+# Mesin render markdown -> flowable reportlab untuk ekspor PDF (RPP dan ujian).
+# Markdown dibaca sekali per baris dengan pola yang sudah dikompilasi, lalu setiap blok
+# (judul, paragraf, daftar bertingkat, tabel, garis) langsung diubah menjadi flowable.
+
+import re
+from functools import lru_cache
+from xml.sax.saxutils import escape
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY, TA_LEFT, TA_RIGHT
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import HRFlowable, Paragraph, Spacer, Table, TableStyle
+
+# Lebar area isi A4 dengan margin 1 inci, dipakai untuk membagi lebar kolom tabel
+LEBAR_ISI = A4[0] - 2 * inch
+KEDALAMAN_DAFTAR_MAKS = 4
+
+# --- Pola baris dan inline (dikompilasi sekali per proses) ---
+_JUDUL = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+_DAFTAR = re.compile(r'^([ \t]*)([-*+•]|\d+[.)])\s+(.*)$')
+_PEMISAH_TABEL = re.compile(r'^\s*\|?\s*:?-{3,}:?\s*(\|\s*:?-{3,}:?\s*)*\|?\s*$')
+_GARIS = re.compile(r'^\s*([-*_])(\s*\1){2,}\s*$')
+_SEL_TABEL = re.compile(r'(?<!\\)\|')
+_INLINE = re.compile(
+    r'\*\*(?P<tebal>.+?)\*\*'
+    r'|__(?P<tebal2>.+?)__'
+    r'|(?<![\w*])\*(?!\s)(?P<miring>.+?)(?<!\s)\*(?![\w*])'
+    r'|(?<!\w)_(?!\s)(?P<miring2>.+?)(?<!\s)_(?!\w)'
+    r'|`(?P<kode>[^`]+)`'
+)
+
+
+@lru_cache(maxsize=1)
+def gaya_pdf():
+    """Stylesheet bersama untuk semua ekspor PDF, dibangun sekali per proses."""
+    styles = getSampleStyleSheet()
+    # Gaya RPP
+    styles.add(ParagraphStyle(name='H1', parent=styles['h1'], fontSize=14, leading=18, spaceBefore=12, spaceAfter=6, alignment=TA_LEFT))
+    styles.add(ParagraphStyle(name='H2', parent=styles['h2'], fontSize=12, leading=16, spaceBefore=10, spaceAfter=5, alignment=TA_LEFT))
+    styles.add(ParagraphStyle(name='H3', parent=styles['h3'], fontSize=11, leading=14, spaceBefore=8, spaceAfter=4, alignment=TA_LEFT))
+    styles.add(ParagraphStyle(name='Body', parent=styles['Normal'], alignment=TA_JUSTIFY, spaceAfter=10, leading=14))
+    styles.add(ParagraphStyle(name='ListItem', parent=styles['Normal'], leftIndent=20, spaceAfter=2, leading=14, bulletIndent=0))
+    for kedalaman in range(KEDALAMAN_DAFTAR_MAKS):
+        styles.add(ParagraphStyle(
+            name=f'ListItem{kedalaman}', parent=styles['ListItem'],
+            leftIndent=20 * (kedalaman + 1), bulletIndent=20 * kedalaman
+        ))
+    styles.add(ParagraphStyle(name='TabelSel', parent=styles['Normal'], fontSize=9, leading=11))
+    styles.add(ParagraphStyle(name='TabelSelTengah', parent=styles['TabelSel'], alignment=TA_CENTER))
+    styles.add(ParagraphStyle(name='TabelSelKanan', parent=styles['TabelSel'], alignment=TA_RIGHT))
+    # Gaya ujian
+    styles.add(ParagraphStyle(name='TitleStyle', parent=styles['h1'],
+                              fontSize=18, leading=22, spaceAfter=18, alignment=TA_CENTER))
+    styles.add(ParagraphStyle(name='InfoFieldStyle', parent=styles['Normal'],
+                              fontSize=10, leading=12, spaceAfter=6, alignment=TA_LEFT))
+    styles.add(ParagraphStyle(name='QuestionStyle', parent=styles['Normal'],
+                              fontSize=11, leading=13, spaceAfter=8, alignment=TA_JUSTIFY))
+    styles.add(ParagraphStyle(name='OptionStyle', parent=styles['Normal'],
+                              fontSize=10, leading=12, spaceAfter=2, leftIndent=20))
+    styles.add(ParagraphStyle(name='SectionTitleStyle', parent=styles['h2'],
+                              fontSize=14, leading=16, spaceBefore=18, spaceAfter=8, alignment=TA_LEFT))
+    return styles
+
+
+def inline_ke_markup(teks):
+    """Markdown inline (tebal, miring, kode) -> markup Paragraph reportlab; karakter lain di-escape."""
+    return _ubah_inline(escape(teks))
+
+
+def _ubah_inline(teks):
+    def ganti(m):
+        if m.group('tebal') is not None or m.group('tebal2') is not None:
+            return f"<b>{_ubah_inline(m.group('tebal') or m.group('tebal2'))}</b>"
+        if m.group('miring') is not None or m.group('miring2') is not None:
+            return f"<i>{m.group('miring') or m.group('miring2')}</i>"
+        return f"<font face=\"Courier\">{m.group('kode')}</font>"
+    return _INLINE.sub(ganti, teks)
+
+
+def _sel_baris(baris):
+    baris = baris.strip()
+    if baris.startswith('|'):
+        baris = baris[1:]
+    if baris.endswith('|') and not baris.endswith('\\|'):
+        baris = baris[:-1]
+    return [sel.strip().replace('\\|', '|') for sel in _SEL_TABEL.split(baris)]
+
+
+def _perataan(pemisah):
+    hasil = []
+    for sel in _sel_baris(pemisah):
+        if sel.startswith(':') and sel.endswith(':'):
+            hasil.append('TabelSelTengah')
+        elif sel.endswith(':'):
+            hasil.append('TabelSelKanan')
+        else:
+            hasil.append('TabelSel')
+    return hasil
+
+
+def _tabel(baris_tabel, styles, lebar):
+    # Baris kedua berupa pemisah (|---|:---:|) menandakan baris pertama adalah kepala tabel
+    punya_kepala = len(baris_tabel) > 1 and _PEMISAH_TABEL.match(baris_tabel[1])
+    perataan = _perataan(baris_tabel[1]) if punya_kepala else []
+    baris_data = [_sel_baris(b) for i, b in enumerate(baris_tabel) if not (punya_kepala and i == 1)]
+    jumlah_kolom = max(len(b) for b in baris_data)
+
+    data = []
+    for nomor, sel_list in enumerate(baris_data):
+        sel_list = sel_list + [''] * (jumlah_kolom - len(sel_list))
+        baris = []
+        for k, sel in enumerate(sel_list):
+            markup = inline_ke_markup(sel)
+            if punya_kepala and nomor == 0:
+                markup = f"<b>{markup}</b>"
+            gaya = perataan[k] if k < len(perataan) else 'TabelSel'
+            baris.append(Paragraph(markup, styles[gaya]))
+        data.append(baris)
+
+    tabel = Table(data, colWidths=[lebar / jumlah_kolom] * jumlah_kolom, repeatRows=1 if punya_kepala else 0, hAlign='LEFT')
+    perintah = [
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('TOPPADDING', (0, 0), (-1, -1), 3),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
+    ]
+    if punya_kepala:
+        perintah.append(('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e8e8e8')))
+    tabel.setStyle(TableStyle(perintah))
+    return tabel
+
+
+def markdown_ke_flowables(teks, styles=None, gaya_paragraf='Body', awalan='', lebar=LEBAR_ISI):
+    """
+    Mengubah markdown menjadi list flowable dalam satu kali baca: judul (#, ##, ###),
+    paragraf, daftar berbutir/bernomor bertingkat, tabel markdown, dan garis horizontal.
+    `awalan` (mis. nomor soal) disisipkan di depan blok teks pertama.
+    """
+    styles = styles or gaya_pdf()
+    story = []
+    paragraf = [] # Baris paragraf yang sedang dikumpulkan
+    tabel = [] # Baris tabel yang sedang dikumpulkan
+    daftar = None # [kedalaman, penanda, list teks] butir daftar yang sedang dikumpulkan
+    indentasi_daftar = [] # Tumpukan indentasi untuk menentukan kedalaman daftar bertingkat
+    awalan = [awalan] # Dibungkus list agar dapat dikosongkan dari fungsi dalam
+
+    def ambil_awalan():
+        nilai, awalan[0] = awalan[0], ''
+        return escape(nilai)
+
+    def tutup_paragraf():
+        if paragraf:
+            story.append(Paragraph(ambil_awalan() + inline_ke_markup(" ".join(paragraf)), styles[gaya_paragraf]))
+            paragraf.clear()
+
+    def tutup_daftar():
+        nonlocal daftar
+        if daftar:
+            kedalaman, penanda, isi = daftar
+            butir = '•' if not penanda[0].isdigit() else escape(penanda)
+            if awalan[0]:
+                story.append(Paragraph(ambil_awalan(), styles[gaya_paragraf]))
+            story.append(Paragraph(inline_ke_markup(" ".join(isi)), styles[f'ListItem{kedalaman}'], bulletText=butir))
+            daftar = None
+
+    def tutup_tabel():
+        if tabel:
+            if awalan[0]:
+                story.append(Paragraph(ambil_awalan(), styles[gaya_paragraf]))
+            story.append(_tabel(tabel, styles, lebar))
+            story.append(Spacer(1, 6))
+            tabel.clear()
+
+    def tutup_semua():
+        tutup_paragraf()
+        tutup_daftar()
+        tutup_tabel()
+        indentasi_daftar.clear()
+
+    for baris in teks.strip().split('\n'):
+        bersih = baris.strip()
+
+        if not bersih:
+            tutup_paragraf()
+            tutup_daftar()
+            tutup_tabel()
+            continue
+
+        if bersih.startswith('|') and bersih.count('|') >= 2:
+            tutup_paragraf()
+            tutup_daftar()
+            indentasi_daftar.clear()
+            tabel.append(bersih)
+            continue
+        tutup_tabel()
+
+        m = _JUDUL.match(bersih)
+        if m:
+            tutup_semua()
+            tingkat = min(len(m.group(1)), 3)
+            story.append(Paragraph(ambil_awalan() + inline_ke_markup(m.group(2)), styles[f'H{tingkat}']))
+            continue
+
+        if _GARIS.match(bersih):
+            tutup_semua()
+            story.append(HRFlowable(width='100%', thickness=0.5, color=colors.grey, spaceBefore=4, spaceAfter=4))
+            continue
+
+        m = _DAFTAR.match(baris)
+        if m:
+            tutup_paragraf()
+            tutup_daftar()
+            indentasi = len(m.group(1).expandtabs(4))
+            while indentasi_daftar and indentasi < indentasi_daftar[-1]:
+                indentasi_daftar.pop()
+            if not indentasi_daftar or indentasi > indentasi_daftar[-1]:
+                indentasi_daftar.append(indentasi)
+            kedalaman = min(len(indentasi_daftar) - 1, KEDALAMAN_DAFTAR_MAKS - 1)
+            daftar = [kedalaman, m.group(2), [m.group(3)]]
+            continue
+
+        if daftar and baris[:1] in (' ', '\t'):
+            # Baris lanjutan butir daftar (berindentasi)
+            daftar[2].append(bersih)
+            continue
+
+        tutup_daftar()
+        indentasi_daftar.clear()
+        paragraf.append(bersih)
+
+    tutup_semua()
+    return story
@@ -0,0 +1,194 @@
+# Render PDF di process pool. Dokumen dikirim ke worker sebagai deskripsi berupa dict
+# biasa (dapat di-pickle), lalu story reportlab dibangun dan di-build di proses worker
+# sehingga doc.build yang berat tidak menahan GIL thread request. Fungsi tingkat modul
+# di sini tidak boleh memakai Flask karena dijalankan di proses worker.
+
+import io
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from xml.sax.saxutils import escape
+
+from flask import current_app
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import inch
+from reportlab.lib import colors
+from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from app.core.metrics import DURASI_RENDER_PDF
+from app.services.pdf_markdown import LEBAR_ISI, gaya_pdf, inline_ke_markup, markdown_ke_flowables
+
+LABEL_PILIHAN = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H']
+
+
+class RenderPDFError(RuntimeError):
+    pass
+
+
+class RenderPDFTimeout(RenderPDFError):
+    """Render melewati batas waktu; biasanya karena semua worker PDF sedang sibuk."""
+
+
+# --- Pembangun story per jenis dokumen (dijalankan di proses worker) ---
+def _story_rpp(deskripsi, styles):
+    """Deskripsi: {'jenis': 'rpp', 'judul', 'konten_markdown'}."""
+    story = [Paragraph(inline_ke_markup(deskripsi['judul']), styles['Title']), Spacer(1, 0.2 * inch)]
+    story += markdown_ke_flowables(deskripsi['konten_markdown'], styles)
+    return story
+
+
+def _story_ujian(deskripsi, styles):
+    """
+    Deskripsi: {'jenis': 'ujian', 'kepala': [teks], 'info_siswa': [label], 'soal_pg': [{'pertanyaan', 'pilihan': [teks]}],
+    'soal_esai': [{'pertanyaan'}]}. Urutan soal dan pilihan sudah final (pengacakan dilakukan pemanggil);
+    'kepala' opsional, mis. kode varian dan nama siswa.
+    """
+    story = []
+    for teks in deskripsi.get('kepala', []):
+        story.append(Paragraph(f"<b>{escape(teks)}</b>", styles['InfoFieldStyle']))
+    for field_label in deskripsi.get('info_siswa', []):
+        story.append(Paragraph(f"{escape(field_label)}: ___________________________________________", styles['InfoFieldStyle']))
+    story.append(Spacer(1, 0.3 * inch))
+
+    soal_pg = deskripsi.get('soal_pg', [])
+    soal_esai = deskripsi.get('soal_esai', [])
+    if soal_pg:
+        story.append(Paragraph("Bagian I: Pilihan Ganda", styles['SectionTitleStyle']))
+        for i, soal in enumerate(soal_pg):
+            # Pertanyaan boleh berisi markdown, termasuk tabel yang diminta prompt soal
+            story += markdown_ke_flowables(soal.get('pertanyaan', ''), styles, 'QuestionStyle', awalan=f"{i+1}. ")
+            for j, teks in enumerate(soal.get('pilihan', [])):
+                label = LABEL_PILIHAN[j] if j < len(LABEL_PILIHAN) else chr(65 + j)
+                story.append(Paragraph(f"   {label}. {inline_ke_markup(str(teks))}", styles['OptionStyle']))
+            story.append(Spacer(1, 0.1 * inch))
+
+    if soal_esai:
+        if soal_pg:
+            story.append(PageBreak())
+        story.append(Paragraph("Bagian II: Esai", styles['SectionTitleStyle']))
+        for i, soal in enumerate(soal_esai):
+            story += markdown_ke_flowables(soal.get('pertanyaan', ''), styles, 'QuestionStyle', awalan=f"{i+1}. ")
+            story.append(Paragraph("   Jawaban: ____________________________________________________________________", styles['OptionStyle']))
+            story.append(Spacer(1, 0.5 * inch))
+        story.append(Spacer(1, 0.1 * inch))
+    return story
+
+
+def _story_kunci_jawaban(deskripsi, styles):
+    """Deskripsi: {'jenis': 'kunci_jawaban', 'judul', 'baris': [[kode varian, nama siswa, kunci ringkas]]}."""
+    story = [Paragraph(escape(deskripsi['judul']), styles['TitleStyle'])]
+    data = [[Paragraph(f"<b>{kolom}</b>", styles['TabelSel']) for kolom in ('Varian', 'Siswa', 'Kunci')]]
+    for baris in deskripsi.get('baris', []):
+        data.append([Paragraph(escape(str(sel)), styles['TabelSel']) for sel in baris])
+    tabel = Table(data, colWidths=[0.14 * LEBAR_ISI, 0.26 * LEBAR_ISI, 0.60 * LEBAR_ISI], repeatRows=1, hAlign='LEFT')
+    tabel.setStyle(TableStyle([
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e8e8e8')),
+    ]))
+    story.append(tabel)
+    return story
+
+
+PEMBANGUN_STORY = {
+    'rpp': _story_rpp,
+    'ujian': _story_ujian,
+    'kunci_jawaban': _story_kunci_jawaban,
+}
+
+
+def render_dokumen(deskripsi):
+    """Merender satu deskripsi dokumen menjadi bytes PDF (A4, margin 1 inci)."""
+    pembangun = PEMBANGUN_STORY.get(deskripsi.get('jenis'))
+    if pembangun is None:
+        raise RenderPDFError(f"Jenis dokumen PDF tidak dikenal: {deskripsi.get('jenis')!r}")
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4,
+                            leftMargin=inch, rightMargin=inch,
+                            topMargin=inch, bottomMargin=inch)
+    doc.build(pembangun(deskripsi, gaya_pdf()))
+    return buffer.getvalue()
+
+
+def _render_terukur(deskripsi):
+    mulai = time.perf_counter()
+    data = render_dokumen(deskripsi)
+    return data, time.perf_counter() - mulai
+
+
+class LayananRenderPDF:
+    """
+    Render PDF di process pool terbatas (sejumlah `max_workers` proses), sehingga
+    throughput PDF bertambah sesuai jumlah core dan request lain di worker web tetap
+    responsif. Setiap render dibatasi `timeout` detik terhitung sejak diajukan.
+    """
+
+    def __init__(self, max_workers=None, timeout=60):
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) // 2)
+        self.timeout = timeout
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._pool
+
+    def _reset_pool(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def submit(self, deskripsi, timeout=None):
+        """Mengajukan render tanpa menunggu; hasilnya diambil dengan hasil(future)."""
+        try:
+            future = self._get_pool().submit(_render_terukur, deskripsi)
+        except BrokenProcessPool:
+            self._reset_pool()
+            future = self._get_pool().submit(_render_terukur, deskripsi)
+        future.batas_waktu = time.monotonic() + (timeout or self.timeout)
+        future.jenis = deskripsi.get('jenis')
+        return future
+
+    def hasil(self, future):
+        """Bytes PDF dari future submit(); RenderPDFTimeout jika melewati batas waktu."""
+        try:
+            data, durasi = future.result(timeout=max(0, future.batas_waktu - time.monotonic()))
+        except FuturesTimeoutError:
+            future.cancel()
+            current_app.logger.warning(f"Render PDF {future.jenis} melewati batas waktu {self.timeout} detik.")
+            raise RenderPDFTimeout("Pembuatan PDF terlalu lama. Silakan coba beberapa saat lagi.")
+        except BrokenProcessPool as e:
+            self._reset_pool()
+            raise RenderPDFError(f"Process pool render PDF rusak: {e}")
+        DURASI_RENDER_PDF.observe(durasi, jenis=future.jenis)
+        return data
+
+    def render(self, deskripsi):
+        return self.hasil(self.submit(deskripsi))
+
+    def submit_banyak(self, deskripsi_list):
+        """
+        Mengajukan banyak render sekaligus. Dokumen yang mengantre di belakang worker lain
+        mendapat batas waktu sebanding dengan jumlah gelombang render di depannya.
+        """
+        return [self.submit(d, timeout=self.timeout * (i // self.max_workers + 1))
+                for i, d in enumerate(deskripsi_list)]
+
+    def batalkan(self, futures):
+        for f in futures:
+            f.cancel()
+
+    def render_banyak(self, deskripsi_list):
+        """Merender banyak dokumen paralel; urutan hasil sama dengan urutan deskripsi."""
+        futures = self.submit_banyak(deskripsi_list)
+        try:
+            return [self.hasil(f) for f in futures]
+        except Exception:
+            self.batalkan(futures)
+            raise
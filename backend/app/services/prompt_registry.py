@@ -0,0 +1,105 @@
+import os
+import string
+import threading
+import time
+
+from flask import current_app
+
+FOLDER_TEMPLATE_BAWAAN = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'prompts'))
+
+PEDOMAN_CADANGAN = "Pedoman tidak ditemukan. Buat soal berdasarkan praktik terbaik umum."
+
+
+class TemplatePrompt:
+    """
+    Template prompt dengan placeholder gaya str.format ({nama}). Template di-parse sekali
+    menjadi potongan literal dan nama field, sehingga render hanya berupa penggabungan string.
+    """
+
+    def __init__(self, teks):
+        self.bagian = []
+        self.field = set()
+        for literal, nama_field, _, _ in string.Formatter().parse(teks):
+            self.bagian.append((literal, nama_field))
+            if nama_field:
+                self.field.add(nama_field)
+
+    def render(self, **nilai):
+        kurang = self.field - nilai.keys()
+        if kurang:
+            raise KeyError(f"Nilai untuk placeholder {sorted(kurang)} tidak diberikan.")
+        return "".join(
+            literal + (str(nilai[nama_field]) if nama_field else "")
+            for literal, nama_field in self.bagian
+        )
+
+
+class _BerkasTerpantau:
+    """Isi file yang dimuat sekali lalu dimuat ulang hanya jika mtime-nya berubah."""
+
+    def __init__(self, path, pemuat):
+        self.path = path
+        self.pemuat = pemuat
+        self.mtime = None
+        self.nilai = None
+
+    def muat_jika_berubah(self):
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime != self.mtime:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.nilai = self.pemuat(f.read())
+            self.mtime = mtime
+            return True
+        return False
+
+
+class PromptRegistry:
+    """
+    Registry template prompt dan pedoman soal (rules.txt) per proses. File dibaca
+    sekali, lalu mtime-nya diperiksa paling sering setiap `interval_cek` detik
+    sehingga perubahan file tetap terbaca tanpa restart dan tanpa I/O di setiap request.
+    """
+
+    def __init__(self, folder_template=FOLDER_TEMPLATE_BAWAAN, path_rules=None, interval_cek=2.0):
+        self.folder_template = folder_template
+        self.path_rules = path_rules
+        self.interval_cek = interval_cek
+        self._lock = threading.Lock()
+        self._berkas = {} # nama -> _BerkasTerpantau
+        self._cek_terakhir = {} # nama -> waktu monotonic pemeriksaan mtime terakhir
+
+    def _ambil(self, nama, path, pemuat):
+        sekarang = time.monotonic()
+        with self._lock:
+            berkas = self._berkas.get(nama)
+            if berkas is not None and sekarang - self._cek_terakhir[nama] < self.interval_cek:
+                return berkas.nilai
+            if berkas is None:
+                berkas = _BerkasTerpantau(path, pemuat)
+            self._cek_terakhir[nama] = sekarang
+            try:
+                if berkas.muat_jika_berubah():
+                    if nama in self._berkas:
+                        current_app.logger.info(f"File prompt '{path}' berubah, dimuat ulang.")
+                    self._berkas[nama] = berkas
+            except OSError:
+                if nama not in self._berkas:
+                    raise
+                # File sempat hilang/terkunci saat diedit: tetap pakai versi terakhir yang berhasil dimuat
+                current_app.logger.warning(f"Gagal memuat ulang '{path}', memakai versi sebelumnya.")
+            return berkas.nilai
+
+    def template(self, nama):
+        return self._ambil(nama, os.path.join(self.folder_template, f"{nama}.txt"), TemplatePrompt)
+
+    def render(self, nama, **nilai):
+        return self.template(nama).render(**nilai)
+
+    def pedoman_soal(self):
+        if not self.path_rules:
+            return PEDOMAN_CADANGAN
+        try:
+            return self._ambil('__rules__', self.path_rules, str)
+        except OSError as e:
+            current_app.logger.error(f"Pedoman soal tidak dapat dibaca dari RULES_PATH '{self.path_rules}': {e}")
+            return PEDOMAN_CADANGAN
@@ -0,0 +1,235 @@
+import threading
+
+from flask import current_app
+from together import Together
+
+from app.services.ai_service import AIService
+from app.services.extraction import ExtractionPipeline
+from app.services.ocr import PengaturanOCR
+from app.services.pdf_render import LayananRenderPDF
+from app.services.prompt_registry import PromptRegistry
+from app.services.resilience import PelindungLLM
+from app.services.fake_provider import FakeTogetherClient
+from app.services.hedging import BackendLLM, parse_daftar_backend
+from app.services.replay_provider import PerekamClient, PerekamCse, RekamanAI, ReplayCseService, ReplayTogetherClient
+from app.services.retrieval import RetrievalService
+
+# Provider yang tidak membutuhkan TOGETHER_API_KEY
+PROVIDER_LOKAL = ('fake', 'replay')
+
+
+class ServiceRegistry:
+    """
+    Registry tingkat proses untuk service yang mahal dibangun (client Together,
+    service Google Custom Search). Dibangun sekali per worker lalu dipakai bersama
+    oleh semua request dan thread.
+    """
+
+    def __init__(self):
+        # RLock karena pembuatan AIService juga mengambil pipeline ekstraksi dari registry
+        self._lock = threading.RLock()
+        self._ai_services = {}
+        self._extraction = None
+        self._pdf_renderer = None
+        self._retrieval = None
+        self._prompts = None
+        self._pelindung = None
+        self._client_provider = {} # provider -> client, dipakai bersama backend cadangan
+        self._rekaman = None
+
+    def init_app(self, app):
+        # Pemanasan saat startup agar request AI pertama tidak menanggung biaya setup
+        with app.app_context():
+            # Pedoman soal dimuat di awal agar RULES_PATH yang salah langsung terlihat di log
+            self.get_prompt_registry().pedoman_soal()
+            kunci_ada = app.config.get('TOGETHER_API_KEY') or app.config.get('AI_PROVIDER') in PROVIDER_LOKAL
+            if not kunci_ada or not app.config.get('TOGETHER_MODEL'):
+                app.logger.warning("Konfigurasi Together AI tidak lengkap. AIService tidak dipanaskan saat startup.")
+                return
+            try:
+                self.get_ai_service()
+            except Exception as e:
+                app.logger.error(f"Gagal memanaskan AIService saat startup: {e}", exc_info=True)
+
+    def get_ai_service(self, model_name=None):
+        api_key = current_app.config.get('TOGETHER_API_KEY')
+        model_name = model_name or current_app.config.get('TOGETHER_MODEL')
+        provider = current_app.config.get('AI_PROVIDER') or 'together'
+        if provider in PROVIDER_LOKAL:
+            api_key = api_key or provider
+
+        if not api_key or not model_name:
+            current_app.logger.error("Together AI API key atau model name tidak ditemukan dalam konfigurasi aplikasi.")
+            raise RuntimeError("Konfigurasi Together AI tidak lengkap. Pastikan TOGETHER_API_KEY dan TOGETHER_MODEL diatur.")
+
+        kunci = (api_key, model_name)
+        service = self._ai_services.get(kunci)
+        if service is None:
+            with self._lock:
+                service = self._ai_services.get(kunci)
+                if service is None:
+                    service = AIService(
+                        api_key=api_key,
+                        model_name=model_name,
+                        google_api_key=current_app.config.get('GOOGLE_API_KEY'),
+                        google_cse_id=current_app.config.get('GOOGLE_CSE_ID'),
+                        image_search_workers=current_app.config['IMAGE_SEARCH_WORKERS'],
+                        image_search_timeout=current_app.config['IMAGE_SEARCH_TIMEOUT'],
+                        extraction=self.get_extraction_pipeline(),
+                        analysis_chunk_tokens=current_app.config['ANALYSIS_CHUNK_TOKENS'],
+                        analysis_max_parallel=current_app.config['ANALYSIS_MAX_PARALLEL'],
+                        retrieval=self.get_retrieval_service(),
+                        prompts=self.get_prompt_registry(),
+                        soal_shard_size=current_app.config['SOAL_SHARD_SIZE'],
+                        soal_shard_workers=current_app.config['SOAL_SHARD_WORKERS'],
+                        soal_dedup_threshold=current_app.config['SOAL_DEDUP_THRESHOLD'],
+                        client=self._get_client(provider),
+                        pelindung=self.get_pelindung_llm(),
+                        backends_cadangan=self._buat_backends_cadangan(model_name),
+                        hedge_delay=current_app.config['AI_HEDGE_DELAY'],
+                        hedge_max=current_app.config['AI_HEDGE_MAX'],
+                        hedge_workers=current_app.config['AI_HEDGE_WORKERS'],
+                        search_service=self._buat_replay_cse() if provider == 'replay' else None,
+                        gabung_panggilan=current_app.config['AI_COALESCE_ENABLED']
+                    )
+                    if current_app.config['AI_RECORD'] and provider != 'replay' and service.search_service:
+                        service.search_service = PerekamCse(service.search_service, self.get_rekaman_ai())
+                    self._ai_services[kunci] = service
+        return service
+
+    def get_extraction_pipeline(self):
+        # Satu process pool ekstraksi per proses worker, dipakai bersama semua AIService
+        if self._extraction is None:
+            with self._lock:
+                if self._extraction is None:
+                    self._extraction = ExtractionPipeline(
+                        max_workers=current_app.config['EXTRACTION_WORKERS'],
+                        timeout_per_halaman=current_app.config['EXTRACTION_PAGE_TIMEOUT'],
+                        halaman_per_tugas=current_app.config['EXTRACTION_PAGES_PER_TASK'],
+                        max_workers_ocr=current_app.config['OCR_WORKERS'],
+                        timeout_ocr=current_app.config['OCR_TIMEOUT'],
+                        pengaturan_ocr=PengaturanOCR.dari_config(current_app.config)
+                    )
+        return self._extraction
+
+    def get_pdf_renderer(self):
+        # Satu process pool render PDF per proses worker
+        if self._pdf_renderer is None:
+            with self._lock:
+                if self._pdf_renderer is None:
+                    self._pdf_renderer = LayananRenderPDF(
+                        max_workers=current_app.config['PDF_RENDER_WORKERS'],
+                        timeout=current_app.config['PDF_RENDER_TIMEOUT']
+                    )
+        return self._pdf_renderer
+
+    def get_retrieval_service(self):
+        # Indeks BM25 per sekolah disimpan di memori proses, jadi cukup satu instance
+        if self._retrieval is None:
+            with self._lock:
+                if self._retrieval is None:
+                    self._retrieval = RetrievalService(
+                        ukuran_passage=current_app.config['RETRIEVAL_PASSAGE_TOKENS'],
+                        top_k=current_app.config['RETRIEVAL_TOP_K']
+                    )
+        return self._retrieval
+
+    def get_prompt_registry(self):
+        if self._prompts is None:
+            with self._lock:
+                if self._prompts is None:
+                    self._prompts = PromptRegistry(
+                        folder_template=current_app.config['PROMPT_TEMPLATE_DIR'],
+                        path_rules=current_app.config['RULES_PATH'],
+                        interval_cek=current_app.config['PROMPT_RELOAD_INTERVAL']
+                    )
+        return self._prompts
+
+    def get_pelindung_llm(self):
+        # Batas bersamaan dan circuit breaker berlaku untuk semua panggilan LLM di proses ini
+        if self._pelindung is None:
+            with self._lock:
+                if self._pelindung is None:
+                    config = current_app.config
+                    self._pelindung = PelindungLLM(
+                        maks_bersamaan=config['AI_MAX_CONCURRENT'],
+                        maks_per_sekolah=config['AI_MAX_CONCURRENT_PER_SEKOLAH'],
+                        timeout_antrean=config['AI_QUEUE_TIMEOUT'],
+                        laju_per_menit=config['AI_RATE_LIMIT_PER_MINUTE'],
+                        burst=config['AI_RATE_LIMIT_BURST'],
+                        maks_retry=config['AI_RETRY_MAX'],
+                        jeda_dasar=config['AI_RETRY_BASE_DELAY'],
+                        jeda_maks=config['AI_RETRY_MAX_DELAY'],
+                        ambang_breaker=config['AI_BREAKER_THRESHOLD'],
+                        cooldown_breaker=config['AI_BREAKER_COOLDOWN']
+                    )
+        return self._pelindung
+
+    def stats(self):
+        """Statistik pelindung LLM dan hedging per AIService yang sudah dibangun di proses ini."""
+        with self._lock:
+            services = list(self._ai_services.values())
+            pelindung = self._pelindung
+        return {
+            'pelindung': pelindung.stats() if pelindung else None,
+            'hedging': [service.hedging.stats() for service in services],
+            'penggabung': [service.penggabung.stats() for service in services],
+        }
+
+    def _buat_backends_cadangan(self, model_name):
+        provider_bawaan = current_app.config.get('AI_PROVIDER') or 'together'
+        backends = []
+        for provider, model in parse_daftar_backend(current_app.config.get('AI_FALLBACK_MODELS'), provider_bawaan):
+            if (provider, model) == (provider_bawaan, model_name):
+                continue
+            if provider not in PROVIDER_LOKAL and not current_app.config.get('TOGETHER_API_KEY'):
+                current_app.logger.warning(f"Backend cadangan '{model}' dilewati: TOGETHER_API_KEY tidak diatur.")
+                continue
+            client = self._get_client(provider)
+            backends.append(BackendLLM(f"{provider}:{model}", client, model, self.get_pelindung_llm().buat_breaker()))
+        return backends
+
+    def get_rekaman_ai(self):
+        if self._rekaman is None:
+            with self._lock:
+                if self._rekaman is None:
+                    self._rekaman = RekamanAI(current_app.config['AI_RECORDING_PATH'])
+        return self._rekaman
+
+    def _get_client(self, provider):
+        """Client per provider, dibangun sekali dan dipakai bersama backend utama maupun cadangan."""
+        client = self._client_provider.get(provider)
+        if client is not None:
+            return client
+        if provider == 'fake':
+            client = self._buat_fake_client()
+        elif provider == 'replay':
+            rekaman = self.get_rekaman_ai()
+            current_app.logger.warning(
+                f"AI_PROVIDER=replay: panggilan AI diputar ulang dari {rekaman.path} ({rekaman.jumlah['llm']} respons terekam)."
+            )
+            client = ReplayTogetherClient(
+                rekaman,
+                latensi=current_app.config['REPLAY_LATENCY'],
+                token_per_detik=current_app.config['REPLAY_TOKENS_PER_SECOND']
+            )
+        else:
+            client = Together(api_key=current_app.config.get('TOGETHER_API_KEY'))
+            if current_app.config['AI_RECORD']:
+                current_app.logger.warning(f"AI_RECORD=1: respons Together direkam ke {current_app.config['AI_RECORDING_PATH']}.")
+                client = PerekamClient(client, self.get_rekaman_ai())
+        self._client_provider[provider] = client
+        return client
+
+    def _buat_replay_cse(self):
+        return ReplayCseService(self.get_rekaman_ai(), latensi=current_app.config['REPLAY_CSE_LATENCY'])
+
+    def _buat_fake_client(self):
+        current_app.logger.warning("AI_PROVIDER=fake: panggilan AI dijawab oleh fake provider lokal.")
+        return FakeTogetherClient(
+            latensi=current_app.config['FAKE_AI_LATENCY'],
+            tingkat_error=current_app.config['FAKE_AI_ERROR_RATE']
+        )
+
+
+registry = ServiceRegistry()
@@ -0,0 +1,221 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+from app.services.ai_service import _usage_ke_dict
+from app.services.cache_service import buat_kunci, normalisasi_prompt
+from app.services.fake_provider import FakeTogetherClient
+
+# Panjang awal prompt yang disimpan di rekaman, cukup untuk mencari rekaman termirip
+PANJANG_PROMPT_DISIMPAN = 4000
+
+
+def _kata(teks):
+    return set(re.findall(r'\w+', teks[:PANJANG_PROMPT_DISIMPAN].lower()))
+
+
+class RekamanAI:
+    """
+    Rekaman respons LLM dan hasil Google CSE dalam satu file JSONL, untuk diputar
+    ulang saat uji beban (AI_PROVIDER=replay). Respons LLM dicari berdasarkan prompt
+    ternormalisasi; jika prompt persis tidak ada, dipakai rekaman dengan kata prompt
+    paling mirip, sehingga permintaan dengan topik berbeda tetap mendapat respons realistis.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._llm = {} # kunci prompt -> entri
+        self._kata_llm = [] # list (set kata prompt, kunci)
+        self._cse = {} # kueri -> hasil respons CSE
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for baris in f:
+                    if baris.strip():
+                        self._muat(json.loads(baris))
+
+    @staticmethod
+    def kunci_prompt(prompt):
+        return buat_kunci(normalisasi_prompt(prompt))
+
+    def _muat(self, entri):
+        if entri.get('jenis') == 'llm':
+            if entri['kunci'] not in self._llm:
+                self._kata_llm.append((_kata(entri.get('prompt', '')), entri['kunci']))
+            self._llm[entri['kunci']] = entri
+        elif entri.get('jenis') == 'cse':
+            self._cse[entri['kueri']] = entri['hasil']
+
+    def _tulis(self, entri):
+        with self._lock:
+            self._muat(entri)
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entri, ensure_ascii=False) + "\n")
+
+    def simpan_llm(self, prompt, model, teks, usage):
+        self._tulis({
+            'jenis': 'llm',
+            'kunci': self.kunci_prompt(prompt),
+            'model': model,
+            'prompt': prompt[:PANJANG_PROMPT_DISIMPAN],
+            'teks': teks,
+            'usage': usage,
+        })
+
+    def simpan_cse(self, kueri, hasil):
+        self._tulis({'jenis': 'cse', 'kueri': kueri, 'hasil': hasil})
+
+    def cari_llm(self, prompt):
+        entri = self._llm.get(self.kunci_prompt(prompt))
+        if entri is not None or not self._kata_llm:
+            return entri
+        kata = _kata(prompt)
+        _, kunci = max(
+            self._kata_llm,
+            key=lambda item: len(kata & item[0]) / (len(kata | item[0]) or 1)
+        )
+        return self._llm[kunci]
+
+    def cari_cse(self, kueri):
+        return self._cse.get(kueri)
+
+    @property
+    def jumlah(self):
+        return {'llm': len(self._llm), 'cse': len(self._cse)}
+
+
+class ReplayTogetherClient:
+    """
+    Pengganti client Together yang memutar ulang RekamanAI. Latensi dibuat sintetis:
+    `latensi` detik sampai token pertama, lalu token completion keluar dengan laju
+    `token_per_detik` (juga dipakai untuk jeda antar chunk pada mode stream). Tanpa
+    rekaman yang cocok, jawaban tiruan fake provider yang dipakai.
+    """
+
+    def __init__(self, rekaman, latensi=0.5, token_per_detik=40.0):
+        self.rekaman = rekaman
+        self.latensi = latensi
+        self.token_per_detik = token_per_detik
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model, messages, stream=False, **kwargs):
+        prompt = messages[-1]['content']
+        entri = self.rekaman.cari_llm(prompt)
+        if entri is not None:
+            teks = entri['teks']
+            usage = dict(entri.get('usage') or {})
+        else:
+            teks = FakeTogetherClient._jawaban(prompt)
+            usage = {}
+        usage.setdefault('prompt_tokens', len(prompt) // 4)
+        usage.setdefault('completion_tokens', len(teks) // 4)
+        usage['total_tokens'] = (usage['prompt_tokens'] or 0) + (usage['completion_tokens'] or 0)
+        usage = SimpleNamespace(**usage)
+
+        time.sleep(self.latensi)
+        if stream:
+            return self._stream(teks, usage)
+        time.sleep((usage.completion_tokens or 0) / self.token_per_detik)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=teks))],
+            usage=usage
+        )
+
+    def _stream(self, teks, usage):
+        ukuran_chunk = 16 # Sekitar 4 token per chunk
+        jeda = (ukuran_chunk / 4) / self.token_per_detik
+        for i in range(0, len(teks), ukuran_chunk):
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=teks[i:i + ukuran_chunk]))], usage=None)
+            time.sleep(jeda)
+        yield SimpleNamespace(choices=[], usage=usage)
+
+
+class _PermintaanCse:
+    def __init__(self, eksekusi):
+        self._eksekusi = eksekusi
+
+    def execute(self, http=None, **kwargs):
+        return self._eksekusi(http=http, **kwargs)
+
+
+class ReplayCseService:
+    """
+    Pengganti service Google Custom Search (`cse().list(...).execute()`) yang memutar
+    ulang hasil dari RekamanAI dengan latensi sintetis. Kueri tanpa rekaman mendapat
+    satu URL gambar tiruan yang stabil.
+    """
+
+    def __init__(self, rekaman, latensi=0.3):
+        self.rekaman = rekaman
+        self.latensi = latensi
+
+    def cse(self):
+        return self
+
+    def list(self, q, **kwargs):
+        def eksekusi(**_):
+            time.sleep(self.latensi)
+            hasil = self.rekaman.cari_cse(q)
+            if hasil is None:
+                nama = hashlib.sha1(q.encode('utf-8')).hexdigest()[:12]
+                hasil = {"items": [{"link": f"https://gambar.invalid/replay/{nama}.jpg"}]}
+            return hasil
+        return _PermintaanCse(eksekusi)
+
+
+class PerekamClient:
+    """Membungkus client Together asli dan menyimpan setiap respons (termasuk stream) ke RekamanAI."""
+
+    def __init__(self, client, rekaman):
+        self.client = client
+        self.rekaman = rekaman
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model, messages, stream=False, **kwargs):
+        prompt = messages[-1]['content']
+        respons = self.client.chat.completions.create(model=model, messages=messages, stream=stream, **kwargs)
+        if stream:
+            return self._rekam_stream(respons, prompt, model)
+        self.rekaman.simpan_llm(prompt, model, respons.choices[0].message.content, _usage_ke_dict(respons.usage))
+        return respons
+
+    def _rekam_stream(self, stream, prompt, model):
+        potongan = []
+        usage = None
+        for chunk in stream:
+            if getattr(chunk, "usage", None):
+                usage = _usage_ke_dict(chunk.usage)
+            if chunk.choices:
+                teks = getattr(chunk.choices[0].delta, "content", None)
+                if teks:
+                    potongan.append(teks)
+            yield chunk
+        # Stream yang berhenti di tengah tidak direkam karena teksnya tidak lengkap
+        self.rekaman.simpan_llm(prompt, model, "".join(potongan), usage)
+
+
+class PerekamCse:
+    """Membungkus service Google Custom Search asli dan menyimpan setiap hasil ke RekamanAI."""
+
+    def __init__(self, service, rekaman):
+        self.service = service
+        self.rekaman = rekaman
+
+    def cse(self):
+        return self
+
+    def list(self, q, **kwargs):
+        permintaan = self.service.cse().list(q=q, **kwargs)
+
+        def eksekusi(**argumen):
+            hasil = permintaan.execute(**argumen)
+            self.rekaman.simpan_cse(q, hasil)
+            return hasil
+        return _PermintaanCse(eksekusi)
@@ -0,0 +1,252 @@
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from flask import current_app, g
+
+# Status HTTP dari provider yang layak dicoba ulang (rate limit, timeout, gangguan server)
+KODE_STATUS_RETRY = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+class LayananAISibukError(RuntimeError):
+    """Panggilan AI ditolak cepat: provider sedang terganggu atau antrean lokal penuh."""
+
+
+def error_bisa_diulang(e):
+    status = getattr(e, 'status_code', None) or getattr(e, 'http_status', None)
+    if status is not None:
+        return status in KODE_STATUS_RETRY
+    # Error jaringan dari SDK (APIConnectionError, APITimeoutError, ...) tidak membawa status
+    nama = type(e).__name__
+    return any(kata in nama for kata in ('Timeout', 'Connection', 'RateLimit', 'ServiceUnavailable'))
+
+
+def _retry_after(e):
+    """Nilai header Retry-After (detik) dari respons error, jika ada."""
+    headers = getattr(getattr(e, 'response', None), 'headers', None)
+    try:
+        return float(headers.get('retry-after')) if headers else None
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Rate limiter token bucket: `laju` token per detik, maksimal `kapasitas` token tersimpan."""
+
+    def __init__(self, laju, kapasitas):
+        self.laju = laju
+        self.kapasitas = kapasitas
+        self._token = float(kapasitas)
+        self._terakhir = time.monotonic()
+        self._lock = threading.Lock()
+
+    def ambil(self, timeout):
+        """Ambil satu token, menunggu paling lama `timeout` detik. False jika tidak kebagian."""
+        batas_waktu = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                sekarang = time.monotonic()
+                self._token = min(self.kapasitas, self._token + (sekarang - self._terakhir) * self.laju)
+                self._terakhir = sekarang
+                if self._token >= 1:
+                    self._token -= 1
+                    return True
+                tunggu = (1 - self._token) / self.laju
+            if sekarang + tunggu > batas_waktu:
+                return False
+            time.sleep(tunggu)
+
+
+class CircuitBreaker:
+    """
+    Setelah `ambang_gagal` kegagalan berturut-turut, breaker terbuka dan semua panggilan
+    langsung ditolak selama `cooldown` detik. Setelah itu satu panggilan percobaan
+    diizinkan (setengah terbuka); berhasil menutup breaker, gagal membukanya lagi.
+    """
+
+    TERTUTUP = 'tertutup'
+    TERBUKA = 'terbuka'
+    SETENGAH_TERBUKA = 'setengah_terbuka'
+
+    def __init__(self, ambang_gagal=5, cooldown=30):
+        self.ambang_gagal = ambang_gagal
+        self.cooldown = cooldown
+        self.status = self.TERTUTUP
+        self._gagal_berturut = 0
+        self._dibuka_pada = 0.0
+        self._percobaan_berjalan = False
+        self._lock = threading.Lock()
+
+    def izinkan(self):
+        with self._lock:
+            if self.status == self.TERTUTUP:
+                return True
+            if self.status == self.TERBUKA and time.monotonic() - self._dibuka_pada >= self.cooldown:
+                self.status = self.SETENGAH_TERBUKA
+                self._percobaan_berjalan = False
+            if self.status == self.SETENGAH_TERBUKA and not self._percobaan_berjalan:
+                self._percobaan_berjalan = True
+                return True
+            return False
+
+    def catat_sukses(self):
+        with self._lock:
+            self.status = self.TERTUTUP
+            self._gagal_berturut = 0
+            self._percobaan_berjalan = False
+
+    def lepas_percobaan(self):
+        """
+        Panggilan selesai tanpa menunjukkan kondisi provider (mis. error 400): jumlah gagal
+        dan status tidak berubah, hanya slot percobaan setengah terbuka yang dilepas.
+        """
+        with self._lock:
+            self._percobaan_berjalan = False
+
+    def catat_gagal(self):
+        """Mengembalikan True jika kegagalan ini membuat breaker terbuka."""
+        with self._lock:
+            self._gagal_berturut += 1
+            if self.status == self.SETENGAH_TERBUKA or self._gagal_berturut >= self.ambang_gagal:
+                baru_terbuka = self.status != self.TERBUKA
+                self.status = self.TERBUKA
+                self._dibuka_pada = time.monotonic()
+                self._percobaan_berjalan = False
+                return baru_terbuka
+            return False
+
+
+class PelindungLLM:
+    """
+    Lapisan pelindung untuk panggilan ke provider LLM: batas panggilan bersamaan global
+    dan per sekolah, rate limit token bucket, retry dengan exponential backoff + jitter
+    untuk error sementara, dan circuit breaker. Semua batas berlaku per proses worker.
+    """
+
+    def __init__(self, maks_bersamaan=8, maks_per_sekolah=3, timeout_antrean=30,
+                 laju_per_menit=60, burst=10, maks_retry=3, jeda_dasar=1.0, jeda_maks=20.0,
+                 ambang_breaker=5, cooldown_breaker=30):
+        self.maks_per_sekolah = maks_per_sekolah
+        self.timeout_antrean = timeout_antrean
+        self.maks_retry = maks_retry
+        self.jeda_dasar = jeda_dasar
+        self.jeda_maks = jeda_maks
+
+        self._semaphore_global = threading.BoundedSemaphore(maks_bersamaan)
+        self._semaphore_sekolah = defaultdict(lambda: threading.BoundedSemaphore(self.maks_per_sekolah))
+        self._bucket = TokenBucket(laju_per_menit / 60.0, burst)
+        self.ambang_breaker = ambang_breaker
+        self.cooldown_breaker = cooldown_breaker
+        self.breaker = self.buat_breaker()
+
+        self._lock = threading.Lock()
+        self._metrik = defaultdict(int)
+        self._metrik_per_sekolah = defaultdict(int) # sekolah_id -> jumlah panggilan
+
+    def buat_breaker(self):
+        """Circuit breaker baru dengan pengaturan yang sama, untuk backend LLM tambahan."""
+        return CircuitBreaker(self.ambang_breaker, self.cooldown_breaker)
+
+    def _tambah(self, nama, jumlah=1):
+        with self._lock:
+            self._metrik[nama] += jumlah
+
+    @contextmanager
+    def slot(self, sekolah_id=None):
+        """Menahan satu slot panggilan (global dan per sekolah) selama blok berjalan."""
+        with self._lock:
+            semaphore_sekolah = self._semaphore_sekolah[sekolah_id] if sekolah_id is not None else None
+            self._metrik['menunggu_slot'] += 1
+
+        mulai = time.monotonic()
+        diperoleh = []
+        try:
+            for semaphore in filter(None, (semaphore_sekolah, self._semaphore_global)):
+                sisa = self.timeout_antrean - (time.monotonic() - mulai)
+                if not semaphore.acquire(timeout=max(0, sisa)):
+                    self._tambah('timeout_antrean')
+                    raise LayananAISibukError("Layanan AI sedang penuh. Silakan coba beberapa saat lagi.")
+                diperoleh.append(semaphore)
+        except BaseException:
+            for semaphore in diperoleh:
+                semaphore.release()
+            self._tambah('menunggu_slot', -1)
+            raise
+
+        with self._lock:
+            self._metrik['menunggu_slot'] -= 1
+            self._metrik['sedang_berjalan'] += 1
+            self._metrik['detik_menunggu_slot'] += time.monotonic() - mulai
+            self._metrik_per_sekolah[sekolah_id] += 1
+        try:
+            yield
+        finally:
+            for semaphore in diperoleh:
+                semaphore.release()
+            self._tambah('sedang_berjalan', -1)
+
+    def dengan_retry(self, fungsi, breaker=None):
+        """
+        Menjalankan fungsi() dengan rate limit, circuit breaker, dan retry untuk error sementara.
+        `breaker` menggantikan breaker bawaan, mis. breaker milik backend LLM tertentu.
+        """
+        breaker = breaker or self.breaker
+        percobaan = 0
+        while True:
+            if not breaker.izinkan():
+                self._tambah('ditolak_breaker')
+                raise LayananAISibukError("Layanan AI sedang mengalami gangguan. Silakan coba beberapa saat lagi.")
+            if not self._bucket.ambil(self.timeout_antrean):
+                self._tambah('ditolak_rate_limit')
+                raise LayananAISibukError("Batas laju permintaan AI tercapai. Silakan coba beberapa saat lagi.")
+
+            self._tambah('panggilan')
+            try:
+                hasil = fungsi()
+            except Exception as e:
+                if not error_bisa_diulang(e):
+                    # Error permintaan (mis. 400) bukan tanda provider terganggu, tapi juga bukan
+                    # bukti provider pulih: breaker tidak direset
+                    breaker.lepas_percobaan()
+                    self._tambah('gagal')
+                    raise
+                if breaker.catat_gagal():
+                    self._tambah('breaker_dibuka')
+                    current_app.logger.error(f"Circuit breaker AI terbuka setelah error berulang: {e}")
+                if percobaan >= self.maks_retry or breaker.status == CircuitBreaker.TERBUKA:
+                    self._tambah('gagal')
+                    raise
+                jeda = min(self.jeda_maks, self.jeda_dasar * 2 ** percobaan)
+                # Full jitter agar retry dari banyak request tidak datang serempak
+                jeda = max(_retry_after(e) or 0, random.uniform(0, jeda))
+                percobaan += 1
+                self._tambah('retry')
+                current_app.logger.warning(f"Panggilan AI gagal ({e}); percobaan ulang ke-{percobaan} dalam {jeda:.1f} detik.")
+                time.sleep(jeda)
+                continue
+
+            breaker.catat_sukses()
+            self._tambah('sukses')
+            return hasil
+
+    def panggil(self, fungsi, sekolah_id=None, breaker=None):
+        with self.slot(sekolah_id):
+            return self.dengan_retry(fungsi, breaker)
+
+    def stats(self):
+        with self._lock:
+            hasil = dict(self._metrik)
+            hasil['panggilan_per_sekolah'] = dict(self._metrik_per_sekolah)
+        hasil['status_breaker'] = self.breaker.status
+        return hasil
+
+
+# --- Sekolah pemilik panggilan AI di request/job ini (disimpan di flask.g) ---
+def tetapkan_sekolah_ai(sekolah_id):
+    g.ai_sekolah_id = sekolah_id
+
+
+def sekolah_ai_saat_ini():
+    return g.get('ai_sekolah_id')
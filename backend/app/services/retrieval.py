@@ -0,0 +1,192 @@
+import heapq
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+
+from flask import current_app
+from sqlalchemy import func, or_
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import DokumenReferensi, PassageReferensi
+from app.services.chunking import bagi_teks
+
+# Kata fungsi bahasa Indonesia yang terlalu umum untuk membedakan passage
+STOPWORDS = frozenset("""
+    yang dan di ke dari ini itu dengan untuk pada adalah dalam tidak akan juga atau oleh
+    sebagai karena ada dapat bisa lebih telah sudah saat serta maka jika kita kami mereka
+    ia dia anda apa bagaimana mengapa tersebut antara secara yaitu yakni para setiap
+""".split())
+
+
+def tokenisasi(teks):
+    return [t for t in re.findall(r'\w+', teks.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+def siapkan_passage(teks, ukuran_token):
+    """
+    Memecah teks dokumen menjadi list (teks_passage, token) siap disimpan.
+    Tidak memakai Flask, sehingga bisa dijalankan di proses worker CLI.
+    """
+    hasil = []
+    for passage in bagi_teks(teks, ukuran_token):
+        token = tokenisasi(passage)
+        if token:
+            hasil.append((passage, " ".join(token)))
+    return hasil
+
+
+class IndeksBM25:
+    """
+    Indeks BM25 di memori berbentuk inverted index: setiap term menyimpan daftar
+    (posisi passage, frekuensi), sehingga skor hanya dihitung untuk passage yang
+    memuat term kueri.
+    """
+
+    def __init__(self, token_passage, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.jumlah = len(token_passage)
+        panjang = [len(token) for token in token_passage]
+        rata_rata = (sum(panjang) / self.jumlah) if self.jumlah else 1.0
+
+        self._postings = defaultdict(list)
+        for i, token in enumerate(token_passage):
+            for term, tf in Counter(token).items():
+                self._postings[term].append((i, tf))
+
+        # Bagian penyebut BM25 yang hanya bergantung pada panjang passage dihitung sekali
+        self._norma = [k1 * (1 - b + b * p / rata_rata) for p in panjang]
+        self._idf = {
+            term: math.log(1 + (self.jumlah - len(daftar) + 0.5) / (len(daftar) + 0.5))
+            for term, daftar in self._postings.items()
+        }
+
+    def cari(self, token_kueri, k, izinkan=None):
+        """List (posisi passage, skor) dengan skor tertinggi, maksimal k; `izinkan(posisi)` menyaring passage."""
+        skor = defaultdict(float)
+        for term in set(token_kueri):
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for i, tf in self._postings[term]:
+                skor[i] += idf * tf * (self.k1 + 1) / (tf + self._norma[i])
+        kandidat = skor.items() if izinkan is None else ((i, nilai) for i, nilai in skor.items() if izinkan(i))
+        return heapq.nlargest(k, kandidat, key=lambda item: item[1])
+
+
+class RetrievalService:
+    """
+    Indeks passage referensi per sekolah. Passage disimpan di database (dibagi semua
+    proses worker), sedangkan indeks BM25 dibangun di memori per sekolah dan dibangun
+    ulang hanya jika isi passage di database berubah.
+    """
+
+    def __init__(self, ukuran_passage=300, top_k=6):
+        self.ukuran_passage = ukuran_passage
+        self.top_k = top_k
+        self._lock = threading.Lock()
+        self._indeks = {} # sekolah_id -> (versi, IndeksBM25, list id passage, list id dokumen per passage)
+
+    @staticmethod
+    def _filter_sekolah(sekolah_id):
+        # Pustaka bersama (sekolah_id NULL) ikut dicari oleh setiap sekolah
+        return or_(PassageReferensi.sekolah_id == sekolah_id, PassageReferensi.sekolah_id.is_(None))
+
+    @staticmethod
+    def filter_dokumen_sekolah(sekolah_id):
+        """Filter DokumenReferensi milik satu sekolah, atau pustaka bersama (IS NULL) jika sekolah_id None."""
+        if sekolah_id is None:
+            return DokumenReferensi.sekolah_id.is_(None)
+        return DokumenReferensi.sekolah_id == sekolah_id
+
+    def _cari_dokumen(self, sekolah_id, hash_isi):
+        return DokumenReferensi.query.filter(
+            self.filter_dokumen_sekolah(sekolah_id), DokumenReferensi.hash_isi == hash_isi
+        ).first()
+
+    def simpan_dokumen(self, sekolah_id, nama_file, hash_isi, passages, user_id=None):
+        """
+        Menyimpan passage (hasil siapkan_passage) satu dokumen. Dokumen yang isinya sudah
+        pernah diindeks untuk sekolah yang sama dilewati. Mengembalikan DokumenReferensi.
+        """
+        dokumen = self._cari_dokumen(sekolah_id, hash_isi)
+        if dokumen is not None:
+            return dokumen
+
+        dokumen = DokumenReferensi(
+            nama_file=nama_file,
+            hash_isi=hash_isi,
+            jumlah_passage=len(passages),
+            sekolah_id=sekolah_id,
+            user_id=user_id
+        )
+        dokumen.passages = [
+            PassageReferensi(sekolah_id=sekolah_id, urutan=i, teks=teks, token=token)
+            for i, (teks, token) in enumerate(passages)
+        ]
+        db.session.add(dokumen)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Proses worker lain mengindeks file yang sama pada saat bersamaan
+            db.session.rollback()
+            dokumen = self._cari_dokumen(sekolah_id, hash_isi)
+        return dokumen
+
+    def indeks_teks(self, sekolah_id, nama_file, hash_isi, teks, user_id=None):
+        if not teks or not teks.strip():
+            return None
+        return self.simpan_dokumen(sekolah_id, nama_file, hash_isi, siapkan_passage(teks, self.ukuran_passage), user_id)
+
+    def _versi(self, sekolah_id):
+        return db.session.query(
+            func.count(PassageReferensi.id), func.max(PassageReferensi.id)
+        ).filter(self._filter_sekolah(sekolah_id)).one()
+
+    def _get_indeks(self, sekolah_id):
+        versi = tuple(self._versi(sekolah_id))
+        entri = self._indeks.get(sekolah_id)
+        if entri is not None and entri[0] == versi:
+            return entri
+
+        baris = db.session.query(PassageReferensi.id, PassageReferensi.dokumen_id, PassageReferensi.token).filter(
+            self._filter_sekolah(sekolah_id)
+        ).order_by(PassageReferensi.id).all()
+        entri = (
+            versi,
+            IndeksBM25([token.split() for _, _, token in baris]),
+            [id_passage for id_passage, _, _ in baris],
+            [id_dokumen for _, id_dokumen, _ in baris]
+        )
+        with self._lock:
+            self._indeks[sekolah_id] = entri
+        current_app.logger.info(f"Indeks referensi sekolah {sekolah_id} dibangun ulang ({len(baris)} passage).")
+        return entri
+
+    def cari(self, sekolah_id, kueri, k=None, dokumen=None, kecuali_dokumen=None):
+        """
+        Teks passage paling relevan untuk kueri, diurutkan dari skor tertinggi. Pencarian
+        dapat dibatasi ke id dokumen tertentu (`dokumen`) atau mengecualikan sebagian (`kecuali_dokumen`).
+        """
+        token_kueri = tokenisasi(kueri)
+        if not token_kueri:
+            return []
+        _, indeks, id_passage, id_dokumen = self._get_indeks(sekolah_id)
+        if not indeks.jumlah:
+            return []
+
+        izinkan = None
+        if dokumen is not None:
+            dokumen = set(dokumen)
+            izinkan = lambda i: id_dokumen[i] in dokumen
+        elif kecuali_dokumen:
+            kecuali_dokumen = set(kecuali_dokumen)
+            izinkan = lambda i: id_dokumen[i] not in kecuali_dokumen
+        teratas = [id_passage[i] for i, _ in indeks.cari(token_kueri, k or self.top_k, izinkan)]
+        if not teratas:
+            return []
+        teks_per_id = dict(
+            db.session.query(PassageReferensi.id, PassageReferensi.teks).filter(PassageReferensi.id.in_(teratas)).all()
+        )
+        return [teks_per_id[i] for i in teratas if i in teks_per_id]
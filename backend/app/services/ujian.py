@@ -0,0 +1,147 @@
+import csv
+import hashlib
+import io
+import json
+import random
+import zipfile
+
+from flask import current_app
+from PyPDF2 import PdfReader, PdfWriter
+
+from app.services.pdf_render import LABEL_PILIHAN
+
+
+def pisahkan_soal(questions_data):
+    """Memisahkan soal pilihan ganda dan esai; soal dengan tipe ambigu dilewati."""
+    mcq_questions = []
+    essay_questions = []
+    for q in questions_data:
+        if q.get('pilihan') and isinstance(q['pilihan'], dict) and q['pilihan']:
+            mcq_questions.append(q)
+        elif q.get('jawaban_ideal') and (not q.get('pilihan') or (isinstance(q.get('pilihan'), dict) and not q['pilihan'])):
+            essay_questions.append(q)
+        else:
+            current_app.logger.warning(f"Soal dengan tipe ambigu atau tidak teridentifikasi dilewati: {q}")
+    return mcq_questions, essay_questions
+
+
+def _label(posisi):
+    return LABEL_PILIHAN[posisi] if posisi < len(LABEL_PILIHAN) else chr(65 + posisi)
+
+
+def susun_ujian(mcq_questions, essay_questions, layout_settings, rng=random, kepala=None):
+    """
+    Menyusun deskripsi PDF ujian (lihat services/pdf_render.py) dengan urutan soal dan
+    pilihan diacak memakai `rng` sesuai layout. Mengembalikan (deskripsi, kunci); kunci
+    berisi {'nomor_asli', 'jawaban'} per soal pilihan ganda sesuai urutan di PDF, dengan
+    jawaban berupa label pilihan setelah diacak (None jika jawaban_benar tidak diketahui).
+    """
+    urutan_pg = list(range(len(mcq_questions)))
+    urutan_esai = list(range(len(essay_questions)))
+    if layout_settings.get('shuffle_questions', False):
+        rng.shuffle(urutan_pg)
+        rng.shuffle(urutan_esai)
+
+    soal_pg = []
+    kunci = []
+    for indeks in urutan_pg:
+        q_data = mcq_questions[indeks]
+        pilihan = list(q_data['pilihan'].items())
+        if layout_settings.get('shuffle_answers', False):
+            rng.shuffle(pilihan)
+        jawaban = next((_label(posisi) for posisi, (label_asli, _) in enumerate(pilihan)
+                        if label_asli == q_data.get('jawaban_benar')), None)
+        soal_pg.append({'pertanyaan': q_data.get('pertanyaan', ''), 'pilihan': [teks for _, teks in pilihan]})
+        kunci.append({'nomor_asli': indeks + 1, 'jawaban': jawaban})
+
+    deskripsi = {
+        'jenis': 'ujian',
+        'kepala': kepala or [],
+        'info_siswa': layout_settings.get('student_info_fields', []),
+        'soal_pg': soal_pg,
+        'soal_esai': [{'pertanyaan': essay_questions[i].get('pertanyaan', '')} for i in urutan_esai],
+    }
+    return deskripsi, kunci
+
+
+def seed_dasar(exam_title, questions_data, layout_settings):
+    """Seed default yang stabil untuk isi ujian yang sama, sehingga varian dapat dibuat ulang."""
+    isi = json.dumps([exam_title, questions_data, layout_settings], sort_keys=True, ensure_ascii=False)
+    return int(hashlib.sha256(isi.encode('utf-8')).hexdigest()[:12], 16)
+
+
+def seed_varian(seed, penanda):
+    """Seed per varian dari seed dasar dan penanda siswa (mis. 'siswa:12') atau nomor varian."""
+    return int(hashlib.sha256(f"{seed}:{penanda}".encode('utf-8')).hexdigest()[:12], 16)
+
+
+def ringkas_kunci(kunci):
+    """Kunci satu varian dalam satu baris, mis. '1.C 2.A 3.D'."""
+    return " ".join(f"{nomor}.{k['jawaban'] or '?'}" for nomor, k in enumerate(kunci, start=1))
+
+
+def kunci_csv(varian_list):
+    """Tabel kunci jawaban semua varian: satu baris per varian, satu kolom per nomor soal di varian itu."""
+    jumlah_soal = max((len(v['kunci']) for v in varian_list), default=0)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['kode', 'nama_siswa', 'seed', 'urutan_soal_asli']
+                    + [f'no_{nomor}' for nomor in range(1, jumlah_soal + 1)])
+    for v in varian_list:
+        writer.writerow([v['kode'], v['nama'] or '', v['seed'], " ".join(str(k['nomor_asli']) for k in v['kunci'])]
+                        + [k['jawaban'] or '' for k in v['kunci']])
+    return buffer.getvalue()
+
+
+def deskripsi_kunci(exam_title, varian_list):
+    """Deskripsi PDF tabel kunci jawaban semua varian."""
+    return {
+        'jenis': 'kunci_jawaban',
+        'judul': f"Kunci Jawaban: {exam_title}",
+        'baris': [[v['kode'], v['nama'] or '-', ringkas_kunci(v['kunci'])] for v in varian_list],
+    }
+
+
+def gabung_pdf(data_list):
+    """Menggabungkan beberapa PDF (bytes) menjadi satu PDF."""
+    writer = PdfWriter()
+    for data in data_list:
+        for halaman in PdfReader(io.BytesIO(data)).pages:
+            writer.add_page(halaman)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+class _BufferAlir:
+    """Objek tulis tanpa seek untuk zipfile; isi yang sudah ditulis diambil bertahap untuk di-stream."""
+
+    def __init__(self):
+        self._potongan = []
+
+    def write(self, data):
+        self._potongan.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def ambil(self):
+        data = b"".join(self._potongan)
+        self._potongan.clear()
+        return data
+
+
+def alirkan_zip(berkas_iter):
+    """
+    Generator bytes ZIP dari iterator (nama, bytes). Setiap file dikirim begitu
+    tersedia, tanpa menahan seluruh arsip di memori. PDF sudah terkompresi, jadi disimpan apa adanya.
+    """
+    buffer = _BufferAlir()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as arsip:
+        for nama, data in berkas_iter:
+            arsip.writestr(nama, data)
+            potongan = buffer.ambil()
+            if potongan:
+                yield potongan
+    yield buffer.ambil()
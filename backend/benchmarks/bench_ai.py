@@ -0,0 +1,258 @@
+# backend/benchmarks/bench_ai.py
+"""
+Benchmark endpoint AI (/api/generate-rpp, /api/generate-soal, /api/analyze-referensi)
+dengan beban bersamaan. Melaporkan throughput dan latensi p50/p95/p99 per endpoint.
+
+Secara bawaan app dijalankan di proses ini dengan AI_PROVIDER=replay, sehingga respons
+Together dan Google CSE diputar ulang dari file rekaman (AI_RECORDING_PATH) tanpa memakai
+kuota; database dan cache memakai folder sementara. Rekaman dibuat dengan menjalankan app
+biasa dengan AI_RECORD=1.
+
+Contoh:
+    python benchmarks/bench_ai.py --requests 60 --concurrency 8
+    python benchmarks/bench_ai.py --endpoint soal --latensi 1.5 --token-per-detik 30
+    python benchmarks/bench_ai.py --url http://localhost:5000 --token <JWT guru> --rpp-id 12
+"""
+
+import argparse
+import io
+import itertools
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+ENDPOINT = {
+    'rpp': '/api/generate-rpp',
+    'soal': '/api/generate-soal',
+    'analisis': '/api/analyze-referensi',
+}
+
+TOPIK = ["Sel hewan dan tumbuhan", "Sistem pencernaan", "Fotosintesis", "Gaya dan gerak", "Ekosistem", "Energi listrik"]
+
+
+def persentil(data, p):
+    if not data:
+        return None
+    urut = sorted(data)
+    return urut[min(len(urut) - 1, int(p * len(urut)))]
+
+
+def buat_pdf_referensi(jumlah_halaman=3):
+    """PDF referensi kecil berisi teks, dipakai jika --referensi tidak diberikan."""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    buffer = io.BytesIO()
+    kanvas = canvas.Canvas(buffer, pagesize=A4)
+    for halaman in range(jumlah_halaman):
+        for baris in range(40):
+            kanvas.drawString(50, 800 - baris * 18, f"Halaman {halaman + 1}: sel adalah unit terkecil makhluk hidup ({baris}).")
+        kanvas.showPage()
+    kanvas.save()
+    return buffer.getvalue()
+
+
+def _multipart(field, nama_file, isi):
+    batas = uuid.uuid4().hex
+    badan = (
+        f"--{batas}\r\nContent-Disposition: form-data; name=\"{field}\"; filename=\"{nama_file}\"\r\n"
+        f"Content-Type: application/octet-stream\r\n\r\n"
+    ).encode('utf-8') + isi + f"\r\n--{batas}--\r\n".encode('utf-8')
+    return badan, f"multipart/form-data; boundary={batas}"
+
+
+class KlienHTTP:
+    """Mengirim request ke server yang sedang berjalan (--url)."""
+
+    def __init__(self, url, token):
+        self.url = url.rstrip('/')
+        self.headers = {'Authorization': f'Bearer {token}'}
+
+    def post(self, path, json_data=None, form=None, berkas=None):
+        headers = dict(self.headers)
+        if json_data is not None:
+            badan = json.dumps(json_data).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        elif berkas is not None:
+            badan, headers['Content-Type'] = _multipart('file', *berkas)
+        else:
+            badan = urllib.parse.urlencode(form or {}).encode('utf-8')
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        permintaan = urllib.request.Request(self.url + path, data=badan, headers=headers, method='POST')
+        try:
+            with urllib.request.urlopen(permintaan, timeout=600) as respons:
+                respons.read()
+                return respons.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+
+class KlienLokal:
+    """Mengirim request ke app di proses ini lewat Flask test client."""
+
+    def __init__(self, app, token):
+        self.app = app
+        self.headers = {'Authorization': f'Bearer {token}'}
+
+    def post(self, path, json_data=None, form=None, berkas=None):
+        klien = self.app.test_client()
+        if json_data is not None:
+            respons = klien.post(path, json=json_data, headers=self.headers)
+        elif berkas is not None:
+            nama_file, isi = berkas
+            respons = klien.post(path, data={'file': (io.BytesIO(isi), nama_file)}, headers=self.headers,
+                                 content_type='multipart/form-data')
+        else:
+            respons = klien.post(path, data=form, headers=self.headers)
+        respons.get_data()
+        return respons.status_code
+
+
+def siapkan_app_lokal(args):
+    """Membuat app dengan provider replay, database sementara, dan satu guru beserta RPP-nya."""
+    folder = tempfile.mkdtemp(prefix='bench_ai_')
+    os.environ.setdefault('AI_PROVIDER', 'replay')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(folder, 'bench.db')
+    os.environ['CACHE_DIR'] = os.path.join(folder, 'cache')
+    os.environ['AI_RECORD'] = '0'
+    if args.rekaman:
+        os.environ['AI_RECORDING_PATH'] = os.path.abspath(args.rekaman)
+    if args.latensi is not None:
+        os.environ['REPLAY_LATENCY'] = str(args.latensi)
+    if args.token_per_detik is not None:
+        os.environ['REPLAY_TOKENS_PER_SECOND'] = str(args.token_per_detik)
+    if args.latensi_cse is not None:
+        os.environ['REPLAY_CSE_LATENCY'] = str(args.latensi_cse)
+
+    # Import setelah environment diatur, karena Config membaca environment saat di-import
+    from flask_jwt_extended import create_access_token
+    from app import create_app, db
+    from app.models import Kelas, RPP, Sekolah, User, UserRole
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        sekolah = Sekolah(nama_sekolah='Sekolah Benchmark')
+        db.session.add(sekolah)
+        db.session.commit()
+        guru = User(nama_lengkap='Guru Benchmark', email='guru@bench.local', role=UserRole.GURU, sekolah_id=sekolah.id)
+        guru.set_password(uuid.uuid4().hex)
+        db.session.add(guru)
+        db.session.commit()
+        kelas = Kelas(nama_kelas='7A', jenjang='SMP Kelas 7', mata_pelajaran='IPA', tahun_ajaran='2025/2026',
+                      sekolah_id=sekolah.id, user_id=guru.id)
+        db.session.add(kelas)
+        db.session.commit()
+        rpp = RPP(judul='RPP Sel', konten_markdown='# Sel\n\nSel adalah unit terkecil makhluk hidup.',
+                  kelas_id=kelas.id, sekolah_id=sekolah.id, user_id=guru.id)
+        db.session.add(rpp)
+        db.session.commit()
+        token = create_access_token(identity=str(guru.id), additional_claims={'role': guru.role.value})
+        return KlienLokal(app, token), rpp.id
+
+
+def buat_pemanggil(klien, nama, args, rpp_id, referensi):
+    kueri = '' if args.pakai_cache else '?segarkan=1'
+    path = ENDPOINT[nama] + kueri
+    urutan = itertools.count()
+
+    def panggil():
+        topik = TOPIK[next(urutan) % len(TOPIK)]
+        if nama == 'rpp':
+            return klien.post(path, form={'mapel': 'IPA', 'jenjang': 'SMP Kelas 7', 'topik': topik, 'alokasi_waktu': '2 x 40 menit'})
+        if nama == 'soal':
+            return klien.post(path, json_data={'rpp_id': rpp_id, 'jenis_soal': 'Pilihan Ganda', 'jumlah_soal': args.jumlah_soal})
+        return klien.post(path, berkas=referensi)
+    return panggil
+
+
+def jalankan(args):
+    if args.url:
+        if not args.token or ('soal' in args.endpoint and not args.rpp_id):
+            sys.exit("--url membutuhkan --token, dan --rpp-id jika endpoint soal diuji.")
+        klien, rpp_id = KlienHTTP(args.url, args.token), args.rpp_id
+    else:
+        klien, rpp_id = siapkan_app_lokal(args)
+
+    if args.referensi:
+        with open(args.referensi, 'rb') as f:
+            referensi = (os.path.basename(args.referensi), f.read())
+    else:
+        referensi = ('referensi_benchmark.pdf', buat_pdf_referensi())
+
+    pemanggil = {nama: buat_pemanggil(klien, nama, args, rpp_id, referensi) for nama in args.endpoint}
+    hasil = {nama: {'latensi': [], 'status': {}} for nama in args.endpoint}
+    lock = threading.Lock()
+
+    def satu_request(nama):
+        mulai = time.perf_counter()
+        try:
+            status = pemanggil[nama]()
+        except Exception as e:
+            status = type(e).__name__
+        durasi = time.perf_counter() - mulai
+        with lock:
+            hasil[nama]['latensi'].append(durasi)
+            hasil[nama]['status'][status] = hasil[nama]['status'].get(status, 0) + 1
+
+    urutan_endpoint = list(itertools.islice(itertools.cycle(args.endpoint), args.requests))
+    print(f"--- {args.requests} request ke {', '.join(args.endpoint)} dengan {args.concurrency} klien bersamaan ---")
+    mulai = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(satu_request, urutan_endpoint))
+    total_detik = time.perf_counter() - mulai
+
+    laporan = {'total_detik': round(total_detik, 3), 'throughput_rps': round(args.requests / total_detik, 3), 'endpoint': {}}
+    print(f"\n{'endpoint':<10}{'n':>6}{'ok':>6}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}  status")
+    for nama, data in hasil.items():
+        latensi = data['latensi']
+        ok = sum(jumlah for status, jumlah in data['status'].items() if status == 200)
+        ringkasan = {
+            'n': len(latensi),
+            'ok': ok,
+            'throughput_rps': round(len(latensi) / total_detik, 3),
+            'p50_ms': round(persentil(latensi, 0.50) * 1000, 1),
+            'p95_ms': round(persentil(latensi, 0.95) * 1000, 1),
+            'p99_ms': round(persentil(latensi, 0.99) * 1000, 1),
+            'status': {str(k): v for k, v in data['status'].items()},
+        }
+        laporan['endpoint'][nama] = ringkasan
+        print(f"{nama:<10}{ringkasan['n']:>6}{ok:>6}{ringkasan['throughput_rps']:>9}{ringkasan['p50_ms']:>10}"
+              f"{ringkasan['p95_ms']:>10}{ringkasan['p99_ms']:>10}  {ringkasan['status']}")
+    print(f"\nTotal {laporan['total_detik']} detik, {laporan['throughput_rps']} request/detik.")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(laporan, f, indent=2)
+    return laporan
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark endpoint AI dengan provider replay atau server yang berjalan.")
+    parser.add_argument('--endpoint', default='rpp,soal,analisis',
+                        type=lambda s: [e.strip() for e in s.split(',') if e.strip() in ENDPOINT],
+                        help="Daftar endpoint dipisah koma: rpp, soal, analisis (default: semua).")
+    parser.add_argument('--requests', type=int, default=30, help="Jumlah total request (dibagi rata antar endpoint).")
+    parser.add_argument('--concurrency', type=int, default=4, help="Jumlah klien bersamaan.")
+    parser.add_argument('--jumlah-soal', type=int, default=10, help="jumlah_soal per request /generate-soal.")
+    parser.add_argument('--pakai-cache', action='store_true', help="Izinkan cache respons AI (default: dilewati dengan ?segarkan=1).")
+    parser.add_argument('--referensi', help="File yang diunggah ke /analyze-referensi (default: PDF contoh 3 halaman).")
+    parser.add_argument('--rekaman', help="File rekaman JSONL untuk mode replay (default: AI_RECORDING_PATH).")
+    parser.add_argument('--latensi', type=float, help="REPLAY_LATENCY: detik sampai token pertama.")
+    parser.add_argument('--token-per-detik', type=float, help="REPLAY_TOKENS_PER_SECOND: laju token completion.")
+    parser.add_argument('--latensi-cse', type=float, help="REPLAY_CSE_LATENCY: detik per panggilan Google CSE.")
+    parser.add_argument('--url', help="Uji server yang sedang berjalan, bukan app di proses ini.")
+    parser.add_argument('--token', help="JWT guru untuk --url.")
+    parser.add_argument('--rpp-id', type=int, help="ID RPP milik guru untuk /generate-soal pada --url.")
+    parser.add_argument('--json', help="Simpan laporan ke file JSON.")
+    jalankan(parser.parse_args())
@@ -0,0 +1,151 @@
+# backend/benchmarks/bench_pdf.py
+"""
+Benchmark render PDF RPP: waktu ubah markdown -> flowable dan waktu doc.build untuk
+RPP sintetis berukuran besar (judul bertingkat, paragraf, daftar bertingkat, tabel).
+Tidak membutuhkan database maupun app Flask.
+
+Dengan --proses, throughput LayananRenderPDF (process pool) juga diukur untuk beberapa
+jumlah worker, untuk melihat skala render PDF terhadap jumlah core.
+
+Contoh:
+    python benchmarks/bench_pdf.py --bagian 20 40 80 --ulang 5
+    python benchmarks/bench_pdf.py --bagian 40 --proses 1 2 4 --dokumen 16
+    python benchmarks/bench_pdf.py --file rpp_contoh.md --json hasil_pdf.json
+"""
+
+import argparse
+import io
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate
+
+from app.services.pdf_markdown import gaya_pdf, markdown_ke_flowables
+from app.services.pdf_render import LayananRenderPDF
+
+
+def buat_rpp_sintetis(jumlah_bagian):
+    """Markdown RPP panjang dengan semua jenis blok yang didukung mesin render."""
+    bagian = ["# Modul Ajar IPA Kelas 7: Sel dan Organisasi Kehidupan", ""]
+    for i in range(1, jumlah_bagian + 1):
+        bagian += [
+            f"## {i}. Kegiatan Pembelajaran Pertemuan {i}",
+            "",
+            f"Peserta didik mengamati **struktur sel** hewan dan tumbuhan menggunakan mikroskop, lalu "
+            f"membandingkan *fungsi organel* yang ditemukan. Guru memandu diskusi dengan pertanyaan pemantik "
+            f"tentang `membran sel` dan dinding sel pada pertemuan ke-{i}.",
+            "",
+            "### Langkah Kegiatan",
+            "",
+            "1. Pendahuluan (10 menit)",
+            "    * Salam, doa, dan presensi",
+            "    * Apersepsi: **mengapa** tubuh kita tersusun atas sel?",
+            "2. Kegiatan inti (60 menit)",
+            "    * Pengamatan preparat bawang merah",
+            "        - Mengatur fokus mikroskop",
+            "        - Menggambar hasil pengamatan",
+            "    * Diskusi kelompok",
+            "3. Penutup (10 menit)",
+            "",
+            "| Organel | Sel Hewan | Sel Tumbuhan | Fungsi |",
+            "|---|:---:|:---:|---|",
+            "| Dinding sel | Tidak | Ya | Memberi bentuk & melindungi sel |",
+            "| Kloroplas | Tidak | Ya | Tempat fotosintesis |",
+            "| Sentriol | Ya | Tidak | Berperan dalam pembelahan sel |",
+            "| Vakuola | Kecil | Besar | Menyimpan cadangan makanan < 5% volume |",
+            "",
+            "---",
+            "",
+        ]
+    return "\n".join(bagian)
+
+
+def render(markdown):
+    styles = gaya_pdf()
+    mulai = time.perf_counter()
+    story = markdown_ke_flowables(markdown, styles)
+    durasi_parse = time.perf_counter() - mulai
+    jumlah_flowable = len(story)
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=inch, leftMargin=inch, topMargin=inch, bottomMargin=inch)
+    mulai = time.perf_counter()
+    doc.build(story)
+    durasi_build = time.perf_counter() - mulai
+    return durasi_parse, durasi_build, doc.page, len(buffer.getvalue()), jumlah_flowable
+
+
+def ukur(nama, markdown, ulang):
+    hasil = [render(markdown) for _ in range(ulang)]
+    parse = [h[0] for h in hasil]
+    build = [h[1] for h in hasil]
+    ringkasan = {
+        'nama': nama,
+        'ukuran_markdown_kb': round(len(markdown.encode('utf-8')) / 1024, 1),
+        'flowable': hasil[0][4],
+        'halaman': hasil[0][2],
+        'ukuran_pdf_kb': round(hasil[0][3] / 1024, 1),
+        'parse_ms': round(statistics.median(parse) * 1000, 2),
+        'build_ms': round(statistics.median(build) * 1000, 2),
+        'total_ms': round(statistics.median(p + b for p, b in zip(parse, build)) * 1000, 2),
+    }
+    print(f"{nama:<14}{ringkasan['ukuran_markdown_kb']:>8} KB{ringkasan['halaman']:>7}{ringkasan['flowable']:>10}"
+          f"{ringkasan['parse_ms']:>11}{ringkasan['build_ms']:>11}{ringkasan['total_ms']:>11}")
+    return ringkasan
+
+
+def ukur_pool(markdown, jumlah_proses, jumlah_dokumen):
+    renderer = LayananRenderPDF(max_workers=jumlah_proses, timeout=600)
+    deskripsi = {'jenis': 'rpp', 'judul': 'Benchmark', 'konten_markdown': markdown}
+    # Pemanasan: proses worker dibuat dan stylesheet dibangun sebelum pengukuran
+    renderer.render_banyak([deskripsi] * jumlah_proses)
+    mulai = time.perf_counter()
+    renderer.render_banyak([deskripsi] * jumlah_dokumen)
+    durasi = time.perf_counter() - mulai
+    renderer._reset_pool()
+    ringkasan = {'proses': jumlah_proses, 'dokumen': jumlah_dokumen, 'detik': round(durasi, 3),
+                 'dokumen_per_detik': round(jumlah_dokumen / durasi, 2)}
+    print(f"{jumlah_proses:>7}{jumlah_dokumen:>9}{ringkasan['detik']:>10}{ringkasan['dokumen_per_detik']:>14}")
+    return ringkasan
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark render PDF RPP dari markdown.")
+    parser.add_argument('--bagian', type=int, nargs='+', default=[10, 40, 160],
+                        help="Jumlah bagian RPP sintetis (tiap bagian ~1 halaman).")
+    parser.add_argument('--file', help="Pakai file markdown RPP nyata, bukan RPP sintetis.")
+    parser.add_argument('--ulang', type=int, default=3, help="Jumlah pengulangan per ukuran (median dilaporkan).")
+    parser.add_argument('--proses', type=int, nargs='*', default=[],
+                        help="Ukur throughput process pool untuk jumlah worker ini (memakai RPP terakhir).")
+    parser.add_argument('--dokumen', type=int, default=16, help="Jumlah dokumen per pengukuran --proses.")
+    parser.add_argument('--json', help="Simpan hasil ke file JSON.")
+    args = parser.parse_args()
+
+    # Stylesheet dibangun sekali di luar pengukuran, seperti pada proses server yang sudah berjalan
+    gaya_pdf()
+    print(f"{'rpp':<14}{'markdown':>11}{'hlm':>7}{'flowable':>10}{'parse ms':>11}{'build ms':>11}{'total ms':>11}")
+    laporan = {'render': [], 'pool': []}
+    if args.file:
+        with open(args.file, 'r', encoding='utf-8') as f:
+            markdown = f.read()
+        laporan['render'].append(ukur(os.path.basename(args.file), markdown, args.ulang))
+    else:
+        for jumlah in args.bagian:
+            markdown = buat_rpp_sintetis(jumlah)
+            laporan['render'].append(ukur(f"{jumlah} bagian", markdown, args.ulang))
+
+    if args.proses:
+        print(f"\n{'proses':>7}{'dokumen':>9}{'detik':>10}{'dokumen/dtk':>14}")
+        for jumlah_proses in args.proses:
+            laporan['pool'].append(ukur_pool(markdown, jumlah_proses, args.dokumen))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(laporan, f, indent=2)
@@ -0,0 +1,100 @@
+# backend/ingest_referensi.py
+"""
+Impor massal file referensi (PDF/gambar) dari sebuah folder ke indeks passage sekolah.
+Ekstraksi teks dijalankan paralel di beberapa proses; penyimpanan ke database dilakukan
+di proses utama. File yang isinya sudah pernah diindeks otomatis dilewati.
+
+Contoh:
+    python ingest_referensi.py D:\\Referensi\\IPA --sekolah 3
+    python ingest_referensi.py ./pustaka --workers 4   (tanpa --sekolah: pustaka bersama semua sekolah)
+"""
+
+import argparse
+import os
+from multiprocessing import Pool
+from dotenv import load_dotenv
+
+load_dotenv() # Sebelum import app, karena Config membaca environment saat di-import
+
+from app import create_app, db
+from app.models import DokumenReferensi
+from app.services.extraction import BerkasReferensi, EKSTENSI_GAMBAR, ekstrak_teks_langsung, hash_berkas
+from app.services.ocr import PengaturanOCR, inisialisasi_worker_ocr
+from app.services.registry import registry
+from app.services.retrieval import siapkan_passage
+
+
+def hash_file(path):
+    berkas = BerkasReferensi.dari_path(path)
+    try:
+        return hash_berkas(berkas)
+    finally:
+        berkas.tutup()
+
+
+def proses_file(argumen):
+    """Dijalankan di proses worker: ekstrak teks lalu pecah menjadi passage."""
+    path, hash_isi, ukuran_passage = argumen
+    berkas = BerkasReferensi.dari_path(path)
+    try:
+        teks = ekstrak_teks_langsung(berkas)
+        return path, hash_isi, siapkan_passage(teks, ukuran_passage), None
+    except Exception as e:
+        return path, hash_isi, None, str(e)
+    finally:
+        berkas.tutup()
+
+
+def cari_file(folder):
+    ekstensi = ['.pdf'] + EKSTENSI_GAMBAR
+    for akar, _, nama_file in os.walk(folder):
+        for nama in sorted(nama_file):
+            if os.path.splitext(nama)[1].lower() in ekstensi:
+                yield os.path.join(akar, nama)
+
+
+def impor_referensi(folder, sekolah_id=None, workers=None):
+    # App dibuat di sini, bukan saat import, agar proses worker (spawn di Windows) tidak ikut membuatnya
+    app = create_app()
+    with app.app_context():
+        retrieval = registry.get_retrieval_service()
+        sudah_ada = {
+            hash_isi for (hash_isi,) in
+            db.session.query(DokumenReferensi.hash_isi).filter(retrieval.filter_dokumen_sekolah(sekolah_id))
+        }
+
+        tugas = []
+        for path in cari_file(folder):
+            hash_isi = hash_file(path)
+            if hash_isi in sudah_ada:
+                print(f"  - {path}: sudah diindeks, dilewati.")
+                continue
+            sudah_ada.add(hash_isi) # File kembar di dalam folder cukup diproses sekali
+            tugas.append((path, hash_isi, retrieval.ukuran_passage))
+
+        print(f"--- Mengindeks {len(tugas)} file ke {'sekolah ' + str(sekolah_id) if sekolah_id else 'pustaka bersama'} ---")
+        berhasil = 0
+        # Pengaturan OCR (path Tesseract, praproses) dikirim ke setiap proses worker
+        with Pool(processes=workers or os.cpu_count(), initializer=inisialisasi_worker_ocr,
+                  initargs=(PengaturanOCR.dari_config(app.config),)) as pool:
+            for path, hash_isi, passages, error in pool.imap_unordered(proses_file, tugas):
+                if error:
+                    print(f"  ✗ {path}: {error}")
+                    continue
+                if not passages:
+                    print(f"  ✗ {path}: tidak ada teks yang terbaca.")
+                    continue
+                retrieval.simpan_dokumen(sekolah_id, os.path.basename(path), hash_isi, passages)
+                berhasil += 1
+                print(f"  ✓ {path}: {len(passages)} passage.")
+
+        print(f"\n✅ Selesai: {berhasil} dari {len(tugas)} file berhasil diindeks.")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Impor massal file referensi ke indeks passage sekolah.")
+    parser.add_argument('folder', help="Folder berisi file PDF/gambar (dibaca rekursif).")
+    parser.add_argument('--sekolah', type=int, default=None, help="ID sekolah tujuan. Kosongkan untuk pustaka bersama.")
+    parser.add_argument('--workers', type=int, default=None, help="Jumlah proses ekstraksi (default: jumlah core).")
+    args = parser.parse_args()
+    impor_referensi(args.folder, args.sekolah, args.workers)
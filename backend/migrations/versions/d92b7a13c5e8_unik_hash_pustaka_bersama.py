@@ -0,0 +1,38 @@
+"""Index unik hash_isi untuk dokumen pustaka bersama (sekolah_id NULL)
+
+Revision ID: d92b7a13c5e8
+Revises: c81d4e9f2a60
+Create Date: 2026-10-19 00:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd92b7a13c5e8'
+down_revision = 'c81d4e9f2a60'
+branch_labels = None
+depends_on = None
+
+# Dokumen pustaka bersama ganda (hasil impor ulang) kecuali yang pertama untuk tiap hash
+DOKUMEN_GANDA = """
+    SELECT id FROM dokumen_referensi
+    WHERE sekolah_id IS NULL AND id NOT IN (
+        SELECT MIN(id) FROM dokumen_referensi WHERE sekolah_id IS NULL GROUP BY hash_isi
+    )
+"""
+
+
+def upgrade():
+    op.execute(f"DELETE FROM passage_referensi WHERE dokumen_id IN ({DOKUMEN_GANDA})")
+    op.execute(f"DELETE FROM dokumen_referensi WHERE id IN ({DOKUMEN_GANDA})")
+    with op.batch_alter_table('dokumen_referensi', schema=None) as batch_op:
+        batch_op.create_index('uq_dokumen_referensi_bersama_hash', ['hash_isi'], unique=True,
+                              sqlite_where=sa.text('sekolah_id IS NULL'),
+                              postgresql_where=sa.text('sekolah_id IS NULL'))
+
+
+def downgrade():
+    with op.batch_alter_table('dokumen_referensi', schema=None) as batch_op:
+        batch_op.drop_index('uq_dokumen_referensi_bersama_hash')
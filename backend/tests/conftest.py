@@ -0,0 +1,59 @@
+# backend/tests/conftest.py
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Konfigurasi dibaca saat app.config diimpor, jadi environment disiapkan lebih dulu
+_TMP = tempfile.mkdtemp(prefix='belajar-test-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_TMP, 'test.db')}"
+os.environ['CACHE_DIR'] = os.path.join(_TMP, 'cache')
+os.environ.setdefault('TOGETHER_API_KEY', 'test')
+os.environ.setdefault('JWT_SECRET_KEY', 'kunci-rahasia-pengujian-minimal-32-byte')
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app, db  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def app():
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+@pytest.fixture
+def app_context(app):
+    with app.app_context():
+        yield app
+        db.session.rollback()
+
+
+@pytest.fixture
+def client(app_context):
+    return app_context.test_client()
+
+
+@pytest.fixture
+def buat_pengguna(app_context):
+    """Factory: membuat sekolah + pengguna, mengembalikan (user, header Authorization)."""
+    import uuid
+    from flask_jwt_extended import create_access_token
+    from app.models import Sekolah, User, UserRole
+
+    def buat(role=UserRole.GURU, sekolah=None):
+        if sekolah is None:
+            sekolah = Sekolah(nama_sekolah=f'Sekolah {uuid.uuid4().hex[:8]}')
+            db.session.add(sekolah)
+            db.session.flush()
+        user = User(nama_lengkap='Pengguna Uji', email=f'{uuid.uuid4().hex[:10]}@uji.id',
+                    role=role, sekolah_id=sekolah.id)
+        user.set_password('rahasia')
+        db.session.add(user)
+        db.session.commit()
+        token = create_access_token(identity=str(user.id), additional_claims={'role': role.value})
+        return user, {'Authorization': f'Bearer {token}'}
+    return buat
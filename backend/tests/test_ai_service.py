@@ -0,0 +1,60 @@
+# backend/tests/test_ai_service.py
+import uuid
+
+import pytest
+
+from app.services.ai_service import AIService
+from app.services.cache_service import get_response_cache, buat_kunci, normalisasi_prompt
+from app.services.fake_provider import FakeTogetherClient
+from app.services.hedging import BackendLLM
+from app.services.resilience import PelindungLLM
+
+
+def buat_service(utama_gagal):
+    # Error 400 tidak dicoba ulang, sehingga backend cadangan langsung dipakai
+    utama = FakeTogetherClient(latensi=0, tingkat_error=1.0 if utama_gagal else 0.0, kode_error=(400,))
+    pelindung = PelindungLLM(jeda_dasar=0, jeda_maks=0)
+    cadangan = BackendLLM('cadangan', FakeTogetherClient(latensi=0), 'model-cadangan', pelindung.buat_breaker())
+    return AIService(api_key='test', model_name='model-utama', client=utama, pelindung=pelindung,
+                     backends_cadangan=[cadangan])
+
+
+@pytest.fixture
+def prompt():
+    return f"Buat RPP singkat {uuid.uuid4().hex}."
+
+
+def _tersimpan(prompt):
+    return get_response_cache().get(buat_kunci('model-utama', normalisasi_prompt(prompt)))
+
+
+def test_jawaban_backend_utama_disimpan(app_context, prompt):
+    content = buat_service(utama_gagal=False)._generate_content(prompt)
+    assert _tersimpan(prompt) == content
+
+
+def test_jawaban_fallback_tidak_disimpan_atas_nama_model_utama(app_context, prompt):
+    content = buat_service(utama_gagal=True)._generate_content(prompt)
+    assert content
+    assert _tersimpan(prompt) is None
+
+
+def test_stream_fallback_tidak_disimpan(app_context, prompt):
+    hasil = list(buat_service(utama_gagal=True).stream_content(prompt))
+    assert "".join(isi for jenis, isi in hasil if jenis == "chunk")
+    assert _tersimpan(prompt) is None
+
+
+def test_stream_backend_utama_disimpan(app_context, prompt):
+    hasil = list(buat_service(utama_gagal=False).stream_content(prompt))
+    assert _tersimpan(prompt) == "".join(isi for jenis, isi in hasil if jenis == "chunk")
+
+
+def test_stream_rpp_memakai_referensi_yang_sudah_disiapkan(app_context, monkeypatch):
+    service = buat_service(utama_gagal=False)
+    monkeypatch.setattr(service, 'ringkas_referensi', lambda teks: pytest.fail('referensi diringkas dua kali'))
+    monkeypatch.setattr(service, 'stream_content', lambda prompt_parts, operasi: prompt_parts)
+    rpp_data = {'mapel': 'IPA', 'jenjang': 'SMP', 'topik': 'Fotosintesis', 'alokasi_waktu': '2 JP',
+                'nama_penyusun': 'Guru'}
+    prompt = "".join(service.stream_rpp_from_ai(rpp_data, "REFERENSI-SIAP"))
+    assert "REFERENSI-SIAP" in prompt
@@ -0,0 +1,106 @@
+# backend/tests/test_ai_tools.py
+import pytest
+from sqlalchemy import event
+
+from app import db
+
+from app.api import ai_tools
+from app.api.ai_tools import baca_jumlah_soal, get_ai_service
+from app.models import Ujian, UserRole
+from app.services.registry import registry
+from app.services.resilience import LayananAISibukError, sekolah_ai_saat_ini
+
+
+def test_baca_jumlah_soal_default_dan_angka_string(app_context):
+    assert baca_jumlah_soal({}) == 5
+    assert baca_jumlah_soal({'jumlah_soal': '12'}) == 12
+
+
+@pytest.mark.parametrize('nilai', ['sepuluh', None, [3], 0, -4])
+def test_baca_jumlah_soal_menolak_nilai_tidak_valid(app_context, nilai):
+    with pytest.raises(ValueError):
+        baca_jumlah_soal({'jumlah_soal': nilai})
+
+
+def test_baca_jumlah_soal_dibatasi_konfigurasi(app_context, monkeypatch):
+    monkeypatch.setitem(app_context.config, 'SOAL_JUMLAH_MAX', 20)
+    assert baca_jumlah_soal({'jumlah_soal': 20}) == 20
+    with pytest.raises(ValueError, match='maksimal 20'):
+        baca_jumlah_soal({'jumlah_soal': 21})
+
+
+class ServiceGagal:
+    def __init__(self, error):
+        self.error = error
+
+    def siapkan_referensi_rpp(self, *args, **kwargs):
+        raise self.error
+
+
+@pytest.mark.parametrize('error, status', [
+    (LayananAISibukError('Layanan AI sedang penuh.'), 503),
+    (RuntimeError('ekstraksi gagal'), 500),
+])
+def test_stream_rpp_mengembalikan_json_jika_persiapan_referensi_gagal(client, buat_pengguna, monkeypatch, error, status):
+    monkeypatch.setattr(registry, 'get_ai_service', lambda *args, **kwargs: ServiceGagal(error))
+    _, header = buat_pengguna()
+    respons = client.post('/api/generate-rpp/stream', headers=header, data={
+        'mapel': 'IPA', 'jenjang': 'SMP', 'topik': 'Fotosintesis', 'alokasi_waktu': '2 JP'
+    })
+    assert respons.status_code == status
+    assert respons.is_json and respons.get_json()['message']
+
+
+def test_stream_rpp_mencatat_sekolah_pengguna(client, buat_pengguna, monkeypatch):
+    user, header = buat_pengguna()
+    sekolah_id = user.sekolah_id
+    tercatat = []
+
+    class ServiceCatat:
+        def siapkan_referensi_rpp(self, *args, **kwargs):
+            tercatat.append(sekolah_ai_saat_ini())
+            raise RuntimeError('berhenti')
+
+    monkeypatch.setattr(registry, 'get_ai_service', lambda *args, **kwargs: ServiceCatat())
+    client.post('/api/generate-rpp/stream', headers=header, data={
+        'mapel': 'IPA', 'jenjang': 'SMP', 'topik': 'Fotosintesis', 'alokasi_waktu': '2 JP'
+    })
+    assert tercatat == [sekolah_id]
+
+
+def test_get_ai_service_tanpa_query_database(app_context, monkeypatch):
+    query = []
+
+    def catat_query(conn, cursor, statement, parameters, context, executemany):
+        query.append(statement)
+
+    monkeypatch.setattr(registry, 'get_ai_service', lambda *args, **kwargs: 'service')
+    event.listen(db.engine, 'before_cursor_execute', catat_query)
+    try:
+        with app_context.test_request_context('/api/generate-rpp'):
+            assert get_ai_service(42) == 'service'
+            assert sekolah_ai_saat_ini() == 42
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', catat_query)
+    assert query == []
+
+
+def test_unduh_pdf_ujian_dibatasi_pemilik_dan_sekolah(client, buat_pengguna, monkeypatch):
+    pemilik, header_pemilik = buat_pengguna()
+    _, header_guru_lain = buat_pengguna(sekolah=pemilik.sekolah)
+    _, header_admin_sekolah = buat_pengguna(role=UserRole.ADMIN, sekolah=pemilik.sekolah)
+    _, header_admin_lain = buat_pengguna(role=UserRole.ADMIN)
+    _, header_super = buat_pengguna(role=UserRole.SUPER_USER)
+    ujian = Ujian(judul='Ujian IPA', konten_json='[]', user_id=pemilik.id, sekolah_id=pemilik.sekolah_id)
+    db.session.add(ujian)
+    db.session.commit()
+    monkeypatch.setattr(ai_tools, 'kirim_rendisi', lambda *args, **kwargs: ('pdf', 200))
+
+    def status(header):
+        return client.get(f'/api/ujian/{ujian.id}/pdf', headers=header).status_code
+
+    assert status(header_pemilik) == 200
+    assert status(header_admin_sekolah) == 200
+    assert status(header_super) == 200
+    assert status(header_guru_lain) == 403
+    assert status(header_admin_lain) == 403
@@ -0,0 +1,113 @@
+# backend/tests/test_cache_service.py
+import base64
+import os
+
+import pytest
+
+from app.api.metrics import kolektor_cache
+from app.services import cache_service
+from app.services.cache_service import ExtractedTextCache, ImageSearchCache, PersistentCache
+
+
+@pytest.fixture
+def buat_cache(tmp_path):
+    def buat(nama='uji', **kwargs):
+        return PersistentCache(str(tmp_path / f'{nama}.sqlite'), nama_tabel=nama, **kwargs)
+    return buat
+
+
+def test_ttl_berlaku_di_memori_dan_disk(app_context, buat_cache, monkeypatch):
+    sekarang = [1000.0]
+    monkeypatch.setattr(cache_service.time, 'time', lambda: sekarang[0])
+    cache = buat_cache(ttl=60)
+    cache.set('a', 'satu')
+    cache.set('b', 'dua', ttl=10)
+
+    assert cache.get('a') == 'satu' and cache.get('b') == 'dua'
+    sekarang[0] += 30
+    assert cache.get('a') == 'satu'
+    assert cache.get('b') is None
+    sekarang[0] += 31
+    assert cache.get('a') is None
+    # Proses lain (instance baru) juga melihat entri kedaluwarsa sebagai miss
+    assert buat_cache(ttl=60).get('a') is None
+
+
+def test_lru_memori_dan_fallback_disk(app_context, buat_cache):
+    cache = buat_cache(max_items=2)
+    for kunci in 'abc':
+        cache.set(kunci, kunci.upper())
+
+    assert list(cache._memori) == ['b', 'c']
+    # 'a' sudah keluar dari memori tetapi masih dibaca dari SQLite, lalu naik lagi ke memori
+    assert cache.get('a') == 'A'
+    assert list(cache._memori) == ['c', 'a']
+    assert cache.stats()['hits'] == 1
+
+
+def test_eviksi_disk_menurut_jumlah_item(app_context, buat_cache, monkeypatch):
+    sekarang = [1000.0]
+    monkeypatch.setattr(cache_service.time, 'time', lambda: sekarang[0])
+    cache = buat_cache(max_items=1, max_items_disk=50)
+    # Pembersihan jumlah item di disk berjalan setiap 100 penulisan
+    for i in range(100):
+        sekarang[0] += 1
+        cache.set(f'k{i}', str(i))
+
+    assert cache.get('k10') is None
+    assert cache.get('k60') == '60'
+    jumlah = cache._koneksi().execute("SELECT COUNT(*) FROM uji").fetchone()[0]
+    assert jumlah == 50
+
+
+def test_data_dibagi_antar_instance(app_context, buat_cache):
+    buat_cache().set('kunci', b'nilai')
+    assert buat_cache().get('kunci') == b'nilai'
+
+
+def test_teks_ekstraksi_dikunci_versi_dan_mencatat_byte_dihemat(app_context, buat_cache):
+    dasar = buat_cache('teks')
+    cache = ExtractedTextCache(dasar, versi_ekstraktor='1')
+    cache.set('abc', 'isi buku')
+
+    assert cache.get('abc', ukuran_file=1000) == 'isi buku'
+    assert cache.get('lain', ukuran_file=500) is None
+    # Versi ekstraktor baru tidak memakai teks lama
+    assert ExtractedTextCache(dasar, versi_ekstraktor='2').get('abc') is None
+
+    stats = cache.stats()
+    assert stats['hits'] == 1 and stats['misses'] == 1
+    assert stats['hit_ratio'] == 0.5
+    assert stats['bytes_dihemat'] == 1000
+
+
+def test_teks_ekstraksi_eviksi_menurut_ukuran_disk(app_context, buat_cache):
+    # Memori hanya menampung 1 entri agar pembacaan jatuh ke SQLite
+    cache = ExtractedTextCache(buat_cache('teks', max_items=1, max_bytes_disk=3000), versi_ekstraktor='1')
+    teks_acak = [base64.b64encode(os.urandom(1500)).decode() for _ in range(3)] # Sulit dikompresi
+    for i, teks in enumerate(teks_acak):
+        cache.set(f'h{i}', teks)
+
+    assert cache.get('h0') is None
+    assert cache.get('h2') == teks_acak[2]
+
+
+def test_metrik_cache(app_context, buat_cache, monkeypatch):
+    teks = ExtractedTextCache(buat_cache('teks'), versi_ekstraktor='1')
+    teks.set('abc', 'isi')
+    teks.get('abc', ukuran_file=2048)
+    gambar = ImageSearchCache(buat_cache('gambar'), ttl_negatif=60)
+    gambar.set('sel hewan', [])
+    gambar.get('sel hewan')
+    gambar.get('sel tumbuhan')
+    monkeypatch.setattr(cache_service, '_extracted_text_cache', teks)
+    monkeypatch.setattr(cache_service, '_image_cache', gambar)
+
+    metrik = {nama: dict((label.get('cache'), nilai) for label, nilai in sampel)
+              for nama, _, _, sampel in kolektor_cache()}
+
+    assert metrik['belajar_cache_bytes_dihemat_total']['teks_referensi'] == 2048
+    assert metrik['belajar_cache_hit_ratio']['teks_referensi'] == 1.0
+    assert metrik['belajar_cache_hits_negatif_total']['gambar'] == 1
+    assert metrik['belajar_cache_hit_ratio']['gambar'] == 0.5
+    assert metrik['belajar_cache_bytes_dihemat_total'].get('gambar') is None
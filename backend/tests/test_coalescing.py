@@ -0,0 +1,106 @@
+# backend/tests/test_coalescing.py
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.services.coalescing import PenggabungPanggilan
+
+
+def _tunggu_digabung(penggabung, jumlah):
+    batas = time.monotonic() + 5
+    while penggabung.stats().get('digabung', 0) < jumlah:
+        assert time.monotonic() < batas, "pemanggil tidak pernah bergabung"
+        time.sleep(0.005)
+
+
+def test_panggilan_bersamaan_berbagi_satu_eksekusi():
+    penggabung = PenggabungPanggilan()
+    lepas = threading.Event()
+    jumlah_eksekusi = []
+
+    def fungsi():
+        jumlah_eksekusi.append(1)
+        lepas.wait(5)
+        return 'hasil'
+
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        pemimpin = executor.submit(penggabung.jalankan, 'kunci', fungsi)
+        while penggabung.stats()['sedang_berjalan'] != 1:
+            time.sleep(0.005)
+        pengikut = [executor.submit(penggabung.jalankan, 'kunci', fungsi) for _ in range(4)]
+        _tunggu_digabung(penggabung, 4)
+        lepas.set()
+
+        assert pemimpin.result() == ('hasil', False)
+        assert [f.result() for f in pengikut] == [('hasil', True)] * 4
+    assert len(jumlah_eksekusi) == 1
+    assert penggabung.stats()['sedang_berjalan'] == 0
+
+
+def test_error_pemimpin_diteruskan_dan_kunci_dilepas():
+    penggabung = PenggabungPanggilan()
+    lepas = threading.Event()
+
+    def gagal():
+        lepas.wait(5)
+        raise ValueError('provider gagal')
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        pemimpin = executor.submit(penggabung.jalankan, 'kunci', gagal)
+        while penggabung.stats()['sedang_berjalan'] != 1:
+            time.sleep(0.005)
+        pengikut = executor.submit(penggabung.jalankan, 'kunci', gagal)
+        _tunggu_digabung(penggabung, 1)
+        lepas.set()
+        for future in (pemimpin, pengikut):
+            with pytest.raises(ValueError):
+                future.result()
+
+    # Setelah selesai, panggilan berikutnya dieksekusi ulang
+    assert penggabung.jalankan('kunci', lambda: 'baru') == ('baru', False)
+
+
+def test_kunci_berbeda_dan_penggabung_nonaktif_tidak_digabung():
+    penggabung = PenggabungPanggilan(aktif=False)
+    assert penggabung.jalankan('kunci', lambda: 1) == (1, False)
+    assert penggabung.stats() == {'sedang_berjalan': 0}
+
+
+def test_siaran_diikuti_dari_awal_oleh_pelanggan_baru():
+    penggabung = PenggabungPanggilan()
+    lanjut = threading.Event()
+    jumlah_produsen = []
+
+    def produsen():
+        jumlah_produsen.append(1)
+        yield 'a'
+        lanjut.wait(5)
+        yield 'b'
+
+    siaran, digabung = penggabung.siarkan('stream', produsen)
+    assert not digabung
+    iterator = iter(siaran)
+    assert next(iterator) == 'a'
+
+    ikut, digabung = penggabung.siarkan('stream', produsen)
+    assert digabung
+    lanjut.set()
+    assert list(ikut) == ['a', 'b']
+    assert list(iterator) == ['b']
+    assert len(jumlah_produsen) == 1
+
+
+def test_error_siaran_diterima_semua_pelanggan():
+    penggabung = PenggabungPanggilan()
+
+    def produsen():
+        yield 'a'
+        raise RuntimeError('stream putus')
+
+    siaran, _ = penggabung.siarkan('stream', produsen)
+    with pytest.raises(RuntimeError):
+        list(siaran)
+    with pytest.raises(RuntimeError):
+        list(siaran)
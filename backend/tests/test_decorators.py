@@ -0,0 +1,69 @@
+# backend/tests/test_decorators.py
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from flask import Flask, jsonify, request
+
+from app.api import decorators
+from app.api.decorators import idempoten
+
+
+class CacheTiruan(dict):
+    def set(self, kunci, nilai):
+        self[kunci] = nilai
+
+
+@pytest.fixture
+def klien(monkeypatch):
+    monkeypatch.setattr(decorators, 'get_jwt_identity', lambda: '1')
+    cache = CacheTiruan()
+    monkeypatch.setattr(decorators, 'get_idempotency_cache', lambda: cache)
+    app = Flask(__name__)
+    app.lepas = threading.Event()
+    app.lepas.set()
+    app.jumlah_dipanggil = 0
+
+    @app.route('/proses', methods=['POST'])
+    @idempoten('uji')
+    def proses():
+        app.jumlah_dipanggil += 1
+        app.lepas.wait(5)
+        return jsonify({'ke': app.jumlah_dipanggil, 'isi': request.get_json()})
+
+    return app.test_client()
+
+
+def test_respons_diputar_ulang(klien):
+    header = {'Idempotency-Key': uuid.uuid4().hex}
+    pertama = klien.post('/proses', json={'a': 1}, headers=header)
+    kedua = klien.post('/proses', json={'a': 1}, headers=header)
+    assert pertama.get_json() == kedua.get_json() == {'ke': 1, 'isi': {'a': 1}}
+    assert kedua.headers.get('Idempotent-Replayed') == 'true'
+    assert klien.application.jumlah_dipanggil == 1
+
+
+def test_kunci_dipakai_ulang_dengan_isi_berbeda_ditolak(klien):
+    header = {'Idempotency-Key': uuid.uuid4().hex}
+    klien.post('/proses', json={'a': 1}, headers=header)
+    assert klien.post('/proses', json={'a': 2}, headers=header).status_code == 422
+
+
+def test_request_bersamaan_dengan_kunci_sama_dijalankan_sekali(klien):
+    app = klien.application
+    app.lepas.clear()
+    header = {'Idempotency-Key': uuid.uuid4().hex}
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = [executor.submit(klien.post, '/proses', json={'a': 1}, headers=header) for _ in range(3)]
+        batas = time.monotonic() + 5
+        while decorators._penggabung_idempotensi.stats().get('sedang_berjalan', 0) < 1 and time.monotonic() < batas:
+            time.sleep(0.005)
+        time.sleep(0.05)
+        app.lepas.set()
+        hasil = [f.result() for f in futures]
+
+    assert [r.get_json() for r in hasil] == [{'ke': 1, 'isi': {'a': 1}}] * 3
+    assert app.jumlah_dipanggil == 1
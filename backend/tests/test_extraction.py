@@ -0,0 +1,94 @@
+# backend/tests/test_extraction.py
+import io
+import mmap
+from tempfile import SpooledTemporaryFile
+
+import pytest
+from reportlab.pdfgen import canvas
+from werkzeug.datastructures import FileStorage
+
+from app.services import extraction
+from app.services.extraction import BerkasReferensi, ExtractionPipeline
+
+
+def buat_pdf(jumlah_halaman):
+    buffer = io.BytesIO()
+    kanvas = canvas.Canvas(buffer)
+    for i in range(jumlah_halaman):
+        kanvas.drawString(100, 700, f"Halaman {i} tentang sel hewan")
+        kanvas.showPage()
+    kanvas.save()
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def pipeline():
+    pipeline = ExtractionPipeline(max_workers=2, halaman_per_tugas=3, timeout_per_halaman=30)
+    yield pipeline
+    pipeline._reset_pool()
+
+
+@pytest.mark.parametrize('ukuran_kirim_langsung', [10 * 1024 * 1024, 0])
+def test_urutan_halaman_dipertahankan(app_context, pipeline, monkeypatch, ukuran_kirim_langsung):
+    # 0: semua PDF dibagikan lewat shared memory
+    monkeypatch.setattr(extraction, 'UKURAN_KIRIM_LANGSUNG', ukuran_kirim_langsung)
+    berkas = [BerkasReferensi('a.pdf', buat_pdf(10)), BerkasReferensi('b.pdf', buat_pdf(2))]
+
+    hasil = pipeline.ekstrak_banyak_dengan_status(berkas)
+
+    teks_a, lengkap_a = hasil[0]
+    assert lengkap_a and hasil[1][1]
+    posisi = [teks_a.index(f"Halaman {i} ") for i in range(10)]
+    assert posisi == sorted(posisi)
+    assert hasil[1][0].count('Halaman') == 2
+
+
+def test_dari_path(app_context, pipeline, tmp_path):
+    path = tmp_path / 'ref.pdf'
+    path.write_bytes(buat_pdf(4))
+    berkas = BerkasReferensi.dari_path(str(path))
+    try:
+        teks, lengkap = pipeline.ekstrak_banyak_dengan_status([berkas])[0]
+    finally:
+        berkas.tutup()
+    assert lengkap and teks.count('Halaman') == 4
+
+
+def test_pdf_rusak_tidak_lengkap(app_context, pipeline):
+    teks, lengkap = pipeline.ekstrak_banyak_dengan_status([BerkasReferensi('rusak.pdf', b'bukan pdf')])[0]
+    assert teks == '' and not lengkap
+
+
+def test_batas_waktu_dihitung_sejak_tugas_berjalan():
+    with pytest.raises(TimeoutError):
+        with extraction._batas_waktu_worker(0.05):
+            while True:
+                pass
+
+
+def upload(data, max_size=500 * 1024):
+    # Sama dengan stream upload Werkzeug (formparser.default_stream_factory)
+    stream = SpooledTemporaryFile(max_size=max_size, mode='rb+')
+    stream.write(data)
+    stream.seek(0)
+    return FileStorage(stream=stream, filename='ref.pdf')
+
+
+def test_upload_kecil_dibaca_ke_memori():
+    berkas = BerkasReferensi.dari_upload(upload(b'%PDF kecil'))
+    assert berkas.data == b'%PDF kecil'
+
+
+def test_upload_besar_di_mmap_dari_file_sementara():
+    data = b'x' * (600 * 1024)
+    berkas = BerkasReferensi.dari_upload(upload(data))
+    try:
+        assert isinstance(berkas.data, mmap.mmap)
+        assert berkas.ukuran == len(data) and berkas.data[:10] == data[:10]
+    finally:
+        berkas.tutup()
+
+
+def test_upload_bytesio():
+    berkas = BerkasReferensi.dari_upload(FileStorage(stream=io.BytesIO(b'x' * (600 * 1024)), filename='ref.pdf'))
+    assert berkas.ukuran == 600 * 1024
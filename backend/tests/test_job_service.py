@@ -0,0 +1,113 @@
+# backend/tests/test_job_service.py
+import uuid
+from datetime import datetime, timedelta
+
+from app import db
+from app.api.jobs import job_generate_soal
+from app.models import AIJob, Sekolah, User, UserRole
+from app.services.job_service import PESAN_JOB_HILANG, job_queue
+
+import pytest
+
+
+def buat_job(status, umur_detik, **kolom):
+    sekolah = Sekolah(nama_sekolah=f'S-{uuid.uuid4().hex[:6]}')
+    db.session.add(sekolah)
+    db.session.flush()
+    user = User(nama_lengkap='Guru', email=f'{uuid.uuid4().hex[:8]}@x', role=UserRole.GURU, sekolah_id=sekolah.id)
+    user.set_password('p')
+    db.session.add(user)
+    db.session.flush()
+    job = AIJob(id=str(uuid.uuid4()), jenis='generate-soal', status=status, user_id=user.id,
+                sekolah_id=sekolah.id, tanggal_dibuat=datetime.utcnow() - timedelta(seconds=umur_detik), **kolom)
+    db.session.add(job)
+    db.session.commit()
+    return job.id
+
+
+def test_job_aktif_yang_basi_ditandai_gagal(app_context):
+    basi = buat_job('berjalan', job_queue.stale_after + 60)
+    baru = buat_job('antri', 5)
+    selesai = buat_job('selesai', job_queue.stale_after + 60)
+
+    assert job_queue.tandai_job_hilang() >= 1
+    db.session.expire_all()
+    assert db.session.get(AIJob, basi).status == 'gagal'
+    assert db.session.get(AIJob, basi).pesan_error == PESAN_JOB_HILANG
+    assert db.session.get(AIJob, baru).status == 'antri'
+    assert db.session.get(AIJob, selesai).status == 'selesai'
+
+
+def test_tandai_job_hilang_per_id(app_context):
+    a = buat_job('antri', job_queue.stale_after + 60)
+    b = buat_job('antri', job_queue.stale_after + 60)
+
+    assert job_queue.tandai_job_hilang(a) == 1
+    db.session.expire_all()
+    assert db.session.get(AIJob, a).status == 'gagal'
+    assert db.session.get(AIJob, b).status == 'antri'
+
+
+def test_job_lama_dengan_heartbeat_baru_tidak_ditandai(app_context):
+    umur = job_queue.stale_after + 60
+    lama = datetime.utcnow() - timedelta(seconds=umur)
+    # Job lama di proses lain yang heartbeat-nya masih berjalan, dan job lama milik proses ini
+    lain = buat_job('berjalan', umur, tanggal_mulai=lama, pemilik='host-lain:1:abc', diperbarui_pada=datetime.utcnow())
+    sendiri = buat_job('antri', umur, pemilik=job_queue.pemilik, diperbarui_pada=lama)
+    mati = buat_job('berjalan', umur, tanggal_mulai=lama, pemilik='host-lain:2:def', diperbarui_pada=lama)
+
+    for job_id in (lain, sendiri, mati):
+        job_queue.tandai_job_hilang(job_id)
+    db.session.expire_all()
+    assert db.session.get(AIJob, lain).status == 'berjalan'
+    assert db.session.get(AIJob, sendiri).status == 'antri'
+    assert db.session.get(AIJob, mati).status == 'gagal'
+
+
+def test_perbarui_heartbeat_hanya_job_aktif_milik_sendiri(app_context):
+    lama = datetime.utcnow() - timedelta(seconds=job_queue.stale_after + 60)
+    aktif = buat_job('berjalan', 0, pemilik=job_queue.pemilik, diperbarui_pada=lama)
+    selesai = buat_job('selesai', 0, pemilik=job_queue.pemilik, diperbarui_pada=lama)
+
+    assert job_queue.perbarui_heartbeat() >= 1
+    db.session.expire_all()
+    assert db.session.get(AIJob, aktif).diperbarui_pada > lama
+    assert db.session.get(AIJob, selesai).diperbarui_pada == lama
+
+
+def test_jalankan_melewati_job_yang_sudah_gagal(app_context):
+    job_id = buat_job('gagal', 0)
+    dipanggil = []
+
+    job_queue._jalankan(job_id, None, lambda: dipanggil.append(1), {})
+    db.session.expire_all()
+    assert dipanggil == []
+    assert db.session.get(AIJob, job_id).status == 'gagal'
+
+
+def test_jalankan_tidak_menimpa_job_yang_ditandai_gagal_saat_berjalan(app_context):
+    job_id = buat_job('antri', 0)
+
+    def handler():
+        AIJob.query.filter(AIJob.id == job_id).update({AIJob.status: 'gagal', AIJob.pesan_error: PESAN_JOB_HILANG})
+        db.session.commit()
+        return {'ok': True}
+
+    job_queue._jalankan(job_id, None, handler, {})
+    db.session.expire_all()
+    job = db.session.get(AIJob, job_id)
+    assert job.status == 'gagal' and job.hasil is None
+
+
+def test_jalankan_menyimpan_hasil(app_context):
+    job_id = buat_job('antri', 0)
+    job_queue._jalankan(job_id, None, lambda: {'ok': True}, {})
+    db.session.expire_all()
+    job = db.session.get(AIJob, job_id)
+    assert job.status == 'selesai' and job.to_dict()['hasil'] == {'ok': True}
+    assert job.tanggal_mulai and job.tanggal_selesai
+
+
+def test_job_generate_soal_rpp_terhapus(app_context):
+    with pytest.raises(ValueError, match='RPP tidak ditemukan'):
+        job_generate_soal(rpp_id=999999, jenis_soal='pilihan_ganda', jumlah_soal=5)
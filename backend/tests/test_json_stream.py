@@ -0,0 +1,59 @@
+# backend/tests/test_json_stream.py
+import json
+
+from app.services.json_stream import PenguraiArrayBertahap
+
+SOAL = [
+    {"pertanyaan": "Hasil dari 2 + 2?", "pilihan": {"A": "3", "B": "4"}, "jawaban_benar": "B"},
+    {"pertanyaan": "Tulis \"halo\" dengan {kurung} dan [siku] \\ miring", "jawaban_ideal": "}]\"{["},
+    {"pertanyaan": "Sebutkan dua bilangan prima", "jawaban_ideal": "2, 3", "tag": [[1], {"x": []}]},
+]
+
+
+def _alirkan(teks, ukuran):
+    pengurai = PenguraiArrayBertahap()
+    hasil = []
+    for i in range(0, len(teks), ukuran):
+        hasil.extend(pengurai.tambah(teks[i:i + ukuran]))
+    return pengurai, hasil
+
+
+def test_potongan_sekecil_apapun_menghasilkan_objek_yang_sama():
+    teks = "```json\n" + json.dumps(SOAL, ensure_ascii=False) + "\n```"
+    for ukuran in (1, 2, 3, 7, 64, len(teks)):
+        pengurai, hasil = _alirkan(teks, ukuran)
+        assert hasil == SOAL, ukuran
+        assert pengurai.array_selesai and pengurai.jumlah_gagal == 0
+
+
+def test_escape_terpotong_di_batas_potongan():
+    teks = json.dumps([SOAL[1]])
+    # Potong tepat setelah backslash pertama agar escape-nya menyeberang potongan
+    batas = teks.index('\\') + 1
+    pengurai = PenguraiArrayBertahap()
+    assert pengurai.tambah(teks[:batas]) == []
+    assert pengurai.tambah(teks[batas:]) == [SOAL[1]]
+
+
+def test_objek_dikeluarkan_begitu_lengkap():
+    pengurai = PenguraiArrayBertahap()
+    teks = json.dumps(SOAL)
+    akhir_pertama = len(json.dumps(SOAL[0])) + 1
+    assert pengurai.tambah(teks[:akhir_pertama]) == [SOAL[0]]
+    assert not pengurai.array_selesai
+
+
+def test_respons_terpotong_tetap_mengembalikan_objek_lengkap():
+    teks = json.dumps(SOAL)
+    pengurai, hasil = _alirkan(teks[:len(teks) - 20], 5)
+    assert hasil == SOAL[:2]
+    assert not pengurai.array_selesai
+
+
+def test_objek_rusak_dihitung_dan_dilewati():
+    teks = 'Berikut soalnya: [{"a": 1}, {"b": 2,}, {"c": 3}] teks penutup {"d": 4}'
+    pengurai, hasil = _alirkan(teks, 4)
+    assert hasil == [{"a": 1}, {"c": 3}]
+    assert pengurai.jumlah_gagal == 1
+    assert pengurai.array_selesai
+    assert pengurai.tambah('[{"e": 5}]') == []
@@ -0,0 +1,71 @@
+# backend/tests/test_ocr.py
+import io
+from types import SimpleNamespace
+
+import pytest
+from PIL import Image
+
+from app.services import ocr
+
+
+class EngineTiruan:
+    def __init__(self, lang=None, psm=None, selesai=True):
+        self.selesai = selesai
+        self.batas_ms = None
+        self.dibersihkan = False
+
+    def SetImage(self, gambar):
+        pass
+
+    def SetSourceResolution(self, dpi):
+        pass
+
+    def Recognize(self, timeout=0):
+        self.batas_ms = timeout
+        return self.selesai
+
+    def Clear(self):
+        self.dibersihkan = True
+
+    def GetUTF8Text(self):
+        return "teks tesserocr"
+
+
+class EngineLama(EngineTiruan):
+    def Recognize(self):
+        return True
+
+
+def _png():
+    buffer = io.BytesIO()
+    Image.new('RGB', (40, 20), 'white').save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def pasang_engine(monkeypatch):
+    def pasang(engine):
+        monkeypatch.setattr(ocr, 'tesserocr', SimpleNamespace(PSM=lambda psm: psm))
+        monkeypatch.setattr(ocr, '_engine_tesserocr', engine)
+        monkeypatch.setattr(ocr.pytesseract, 'image_to_string', lambda gambar, **kwargs: "teks pytesseract")
+        return engine
+    return pasang
+
+
+def test_timeout_diteruskan_ke_recognize(pasang_engine):
+    engine = pasang_engine(EngineTiruan())
+    assert ocr.ocr_gambar(_png(), timeout=2.5) == "teks tesserocr"
+    assert engine.batas_ms == 2500
+
+
+def test_recognize_melewati_batas_waktu(pasang_engine):
+    engine = pasang_engine(EngineTiruan(selesai=False))
+    with pytest.raises(TimeoutError):
+        ocr.ocr_gambar(_png(), timeout=1)
+    assert engine.dibersihkan
+
+
+def test_tesserocr_lama_diganti_pytesseract_jika_ada_timeout(pasang_engine):
+    pasang_engine(EngineLama())
+    assert ocr.ocr_gambar(_png(), timeout=1) == "teks pytesseract"
+    assert ocr.ocr_gambar(_png(), timeout=0) == "teks tesserocr"
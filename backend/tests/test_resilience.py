@@ -0,0 +1,122 @@
+# backend/tests/test_resilience.py
+import time
+
+import pytest
+
+from app.services.fake_provider import FakeTogetherClient, FakeProviderError
+from app.services.resilience import PelindungLLM, CircuitBreaker, LayananAISibukError
+
+PESAN = [{'role': 'user', 'content': 'Buat RPP singkat.'}]
+
+
+class ProviderBerskenario:
+    """Memanggil fake provider dengan urutan hasil tetap: kode status untuk error, None untuk sukses."""
+
+    def __init__(self, skenario):
+        self.skenario = list(skenario)
+        self.jumlah_panggilan = 0
+        self._sehat = FakeTogetherClient(latensi=0)
+
+    def __call__(self):
+        kode = self.skenario.pop(0) if self.skenario else None
+        self.jumlah_panggilan += 1
+        client = self._sehat if kode is None else FakeTogetherClient(latensi=0, tingkat_error=1.0, kode_error=(kode,))
+        return client.chat.completions.create(model='uji', messages=PESAN)
+
+
+def buat_pelindung(**kwargs):
+    pengaturan = dict(laju_per_menit=60000, burst=1000, jeda_dasar=0, jeda_maks=0,
+                      ambang_breaker=3, cooldown_breaker=0.05)
+    pengaturan.update(kwargs)
+    return PelindungLLM(**pengaturan)
+
+
+def test_429_dicoba_ulang_sampai_sukses(app_context):
+    pelindung = buat_pelindung(maks_retry=3)
+    provider = ProviderBerskenario([429, 429])
+
+    hasil = pelindung.panggil(provider)
+
+    assert hasil.choices[0].message.content
+    assert provider.jumlah_panggilan == 3
+    stats = pelindung.stats()
+    assert stats['retry'] == 2 and stats['sukses'] == 1
+    assert pelindung.breaker.status == CircuitBreaker.TERTUTUP
+
+
+def test_5xx_berulang_membuka_breaker_lalu_gagal_cepat(app_context):
+    pelindung = buat_pelindung(maks_retry=10)
+    provider = ProviderBerskenario([503] * 10)
+
+    with pytest.raises(FakeProviderError):
+        pelindung.panggil(provider)
+    # Retry berhenti begitu breaker terbuka, tidak menghabiskan maks_retry
+    assert provider.jumlah_panggilan == 3
+    assert pelindung.breaker.status == CircuitBreaker.TERBUKA
+
+    with pytest.raises(LayananAISibukError):
+        pelindung.panggil(provider)
+    assert provider.jumlah_panggilan == 3
+    assert pelindung.stats()['ditolak_breaker'] == 1
+
+
+def test_setelah_cooldown_satu_percobaan_menutup_breaker(app_context):
+    pelindung = buat_pelindung(maks_retry=0)
+    provider = ProviderBerskenario([500, 500, 500])
+    for _ in range(3):
+        with pytest.raises(FakeProviderError):
+            pelindung.panggil(provider)
+    assert pelindung.breaker.status == CircuitBreaker.TERBUKA
+
+    time.sleep(0.06)
+    pelindung.panggil(provider)
+    assert pelindung.breaker.status == CircuitBreaker.TERTUTUP
+
+
+def test_percobaan_setengah_terbuka_yang_gagal_membuka_lagi(app_context):
+    pelindung = buat_pelindung(maks_retry=5)
+    provider = ProviderBerskenario([500, 500, 500, 503])
+    with pytest.raises(FakeProviderError):
+        pelindung.panggil(provider)
+
+    time.sleep(0.06)
+    with pytest.raises(FakeProviderError):
+        pelindung.panggil(provider)
+    # Hanya satu panggilan percobaan, tanpa retry, lalu breaker terbuka lagi
+    assert provider.jumlah_panggilan == 4
+    assert pelindung.breaker.status == CircuitBreaker.TERBUKA
+
+
+def test_hanya_satu_percobaan_saat_setengah_terbuka():
+    breaker = CircuitBreaker(ambang_gagal=1, cooldown=0)
+    breaker.catat_gagal()
+    assert breaker.izinkan()
+    assert breaker.status == CircuitBreaker.SETENGAH_TERBUKA
+    assert not breaker.izinkan()
+
+
+def test_error_400_tidak_mereset_hitungan_gagal(app_context):
+    pelindung = buat_pelindung(maks_retry=0)
+    provider = ProviderBerskenario([503, 503, 400, 503])
+    for _ in range(4):
+        with pytest.raises(FakeProviderError):
+            pelindung.panggil(provider)
+    assert pelindung.breaker.status == CircuitBreaker.TERBUKA
+
+
+def test_error_400_saat_setengah_terbuka_melepas_percobaan_tanpa_menutup(app_context):
+    pelindung = buat_pelindung(maks_retry=0)
+    provider = ProviderBerskenario([500, 500, 500, 400])
+    for _ in range(3):
+        with pytest.raises(FakeProviderError):
+            pelindung.panggil(provider)
+
+    time.sleep(0.06)
+    with pytest.raises(FakeProviderError) as info:
+        pelindung.panggil(provider)
+    assert info.value.status_code == 400
+    assert pelindung.breaker.status == CircuitBreaker.SETENGAH_TERBUKA
+
+    # Slot percobaan dilepas, sehingga panggilan berikutnya menjadi percobaan baru
+    pelindung.panggil(provider)
+    assert pelindung.breaker.status == CircuitBreaker.TERTUTUP
@@ -0,0 +1,91 @@
+# backend/tests/test_retrieval.py
+import itertools
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import DokumenReferensi
+from app.services.ai_service import AIService
+from app.services.extraction import BerkasReferensi
+from app.services.retrieval import RetrievalService
+
+_sekolah = itertools.count(1000)
+
+TEKS_PUSTAKA = "Fotosintesis pada tumbuhan hijau terjadi di kloroplas dengan bantuan cahaya matahari."
+TEKS_UNGGAHAN = "Modul guru: sel tumbuhan memiliki dinding sel dan kloroplas untuk fotosintesis."
+
+
+@pytest.fixture
+def sekolah_id():
+    return next(_sekolah)
+
+
+@pytest.fixture
+def retrieval():
+    return RetrievalService(ukuran_passage=50, top_k=4)
+
+
+@pytest.fixture
+def ai_service(app_context, retrieval, monkeypatch):
+    service = AIService(api_key='test', model_name='uji', client=object(), retrieval=retrieval)
+    monkeypatch.setattr(service, 'ringkas_referensi', lambda teks: teks)
+    return service
+
+
+def test_cari_dibatasi_dan_dikecualikan_per_dokumen(app_context, retrieval, sekolah_id):
+    a = retrieval.indeks_teks(sekolah_id, 'a.pdf', f'a{sekolah_id}', TEKS_PUSTAKA)
+    b = retrieval.indeks_teks(sekolah_id, 'b.pdf', f'b{sekolah_id}', TEKS_UNGGAHAN)
+
+    assert retrieval.cari(sekolah_id, 'kloroplas fotosintesis', dokumen=[b.id]) == [TEKS_UNGGAHAN]
+    assert retrieval.cari(sekolah_id, 'kloroplas fotosintesis', kecuali_dokumen=[b.id]) == [TEKS_PUSTAKA]
+    assert len(retrieval.cari(sekolah_id, 'kloroplas fotosintesis')) == 2
+    assert a.id != b.id
+
+
+def test_referensi_rpp_menggabungkan_unggahan_dan_pustaka(ai_service, retrieval, sekolah_id, monkeypatch):
+    retrieval.indeks_teks(sekolah_id, 'pustaka.pdf', f'p{sekolah_id}', TEKS_PUSTAKA)
+    monkeypatch.setattr(ai_service, 'extract_texts', lambda berkas_list: [TEKS_UNGGAHAN])
+    berkas = [BerkasReferensi('modul.pdf', f'modul-{sekolah_id}'.encode())]
+
+    teks = ai_service.siapkan_referensi_rpp({'topik': 'fotosintesis kloroplas', 'mapel': 'IPA'}, berkas, sekolah_id)
+
+    # Passage unggahan guru didahulukan, pustaka sekolah sebagai pelengkap
+    assert teks.index(TEKS_UNGGAHAN) < teks.index(TEKS_PUSTAKA)
+
+
+def test_unggahan_tanpa_passage_cocok_dipakai_utuh(ai_service, retrieval, sekolah_id, monkeypatch):
+    retrieval.indeks_teks(sekolah_id, 'pustaka.pdf', f'p{sekolah_id}', TEKS_PUSTAKA)
+    teks_lain = "Catatan guru tentang jadwal praktikum minggu depan."
+    monkeypatch.setattr(ai_service, 'extract_texts', lambda berkas_list: [teks_lain])
+    berkas = [BerkasReferensi('catatan.pdf', f'catatan-{sekolah_id}'.encode())]
+
+    teks = ai_service.siapkan_referensi_rpp({'topik': 'fotosintesis', 'mapel': 'IPA'}, berkas, sekolah_id)
+
+    assert teks_lain in teks and TEKS_PUSTAKA in teks
+
+
+def test_tanpa_indeks_sekolah_teks_unggahan_dipakai(ai_service, monkeypatch):
+    monkeypatch.setattr(ai_service, 'extract_texts', lambda berkas_list: [TEKS_UNGGAHAN])
+    teks = ai_service.siapkan_referensi_rpp({'topik': 'sel'}, [BerkasReferensi('m.pdf', b'm')], sekolah_id=None)
+    assert TEKS_UNGGAHAN in teks
+
+
+def test_dokumen_pustaka_bersama_tidak_diindeks_ganda(app_context, retrieval):
+    hash_isi = f'bersama-{next(_sekolah)}'
+    pertama = retrieval.indeks_teks(None, 'pustaka.pdf', hash_isi, TEKS_PUSTAKA)
+    kedua = retrieval.indeks_teks(None, 'pustaka-salinan.pdf', hash_isi, TEKS_PUSTAKA)
+    assert pertama.id == kedua.id
+    assert DokumenReferensi.query.filter(
+        RetrievalService.filter_dokumen_sekolah(None), DokumenReferensi.hash_isi == hash_isi
+    ).count() == 1
+
+
+def test_index_parsial_menolak_hash_pustaka_bersama_ganda(app_context):
+    hash_isi = f'bersama-{next(_sekolah)}'
+    db.session.add(DokumenReferensi(nama_file='a.pdf', hash_isi=hash_isi))
+    db.session.commit()
+    db.session.add(DokumenReferensi(nama_file='b.pdf', hash_isi=hash_isi))
+    with pytest.raises(IntegrityError):
+        db.session.commit()
+    db.session.rollback()
@@ -0,0 +1,79 @@
+# backend/tests/test_ujian.py
+import csv
+import io
+import random
+import zipfile
+
+from app.services.ujian import (
+    susun_ujian, seed_dasar, seed_varian, kunci_csv, ringkas_kunci, alirkan_zip, pisahkan_soal, _label
+)
+
+SOAL = [
+    {'pertanyaan': f'Soal {i}', 'pilihan': {'A': f'{i}-a', 'B': f'{i}-b', 'C': f'{i}-c', 'D': f'{i}-d'},
+     'jawaban_benar': 'ABCD'[i % 4]}
+    for i in range(1, 9)
+] + [{'pertanyaan': 'Jelaskan fotosintesis.', 'jawaban_ideal': 'Proses pembuatan makanan.'}]
+LAYOUT_ACAK = {'shuffle_questions': True, 'shuffle_answers': True}
+
+
+def test_pisahkan_soal(app_context):
+    mcq, esai = pisahkan_soal(SOAL + [{'pertanyaan': 'ambigu'}])
+    assert len(mcq) == 8 and len(esai) == 1
+
+
+def test_seed_sama_menghasilkan_varian_sama(app_context):
+    mcq, esai = pisahkan_soal(SOAL)
+    seed = seed_varian(seed_dasar('Ujian', SOAL, LAYOUT_ACAK), 'siswa:7')
+    satu = susun_ujian(mcq, esai, LAYOUT_ACAK, rng=random.Random(seed))
+    dua = susun_ujian(mcq, esai, LAYOUT_ACAK, rng=random.Random(seed))
+    assert satu == dua
+
+    lain = susun_ujian(mcq, esai, LAYOUT_ACAK, rng=random.Random(seed_varian(seed, 'siswa:8')))
+    assert lain != satu
+
+
+def test_seed_dasar_dan_seed_varian_stabil():
+    assert seed_dasar('Ujian', SOAL, LAYOUT_ACAK) == seed_dasar('Ujian', SOAL, dict(reversed(LAYOUT_ACAK.items())))
+    assert seed_dasar('Ujian', SOAL, LAYOUT_ACAK) != seed_dasar('Ujian B', SOAL, LAYOUT_ACAK)
+    assert seed_varian(1, 'varian:1') == seed_varian(1, 'varian:1') != seed_varian(1, 'varian:2')
+
+
+def test_kunci_menunjuk_jawaban_benar_setelah_diacak(app_context):
+    mcq, esai = pisahkan_soal(SOAL)
+    for seed in range(20):
+        deskripsi, kunci = susun_ujian(mcq, esai, LAYOUT_ACAK, rng=random.Random(seed))
+        assert sorted(k['nomor_asli'] for k in kunci) == list(range(1, 9))
+        for soal_pdf, k in zip(deskripsi['soal_pg'], kunci):
+            asli = mcq[k['nomor_asli'] - 1]
+            assert soal_pdf['pertanyaan'] == asli['pertanyaan']
+            posisi = [_label(i) for i in range(len(soal_pdf['pilihan']))].index(k['jawaban'])
+            assert soal_pdf['pilihan'][posisi] == asli['pilihan'][asli['jawaban_benar']]
+
+
+def test_tanpa_acak_urutan_tetap_dan_jawaban_tidak_diketahui(app_context):
+    mcq, esai = pisahkan_soal(SOAL)
+    mcq[0] = dict(mcq[0], jawaban_benar=None)
+    deskripsi, kunci = susun_ujian(mcq, esai, {}, rng=random.Random(3))
+    assert [k['nomor_asli'] for k in kunci] == list(range(1, 9))
+    assert [s['pilihan'] for s in deskripsi['soal_pg']] == [list(q['pilihan'].values()) for q in mcq]
+    assert kunci[0]['jawaban'] is None
+    assert ringkas_kunci(kunci).startswith('1.? 2.C 3.D 4.A')
+
+
+def test_kunci_csv_satu_baris_per_varian():
+    varian_list = [
+        {'kode': 'V01', 'nama': 'Ani', 'seed': 11, 'kunci': [{'nomor_asli': 2, 'jawaban': 'C'}, {'nomor_asli': 1, 'jawaban': 'A'}]},
+        {'kode': 'V02', 'nama': None, 'seed': 12, 'kunci': [{'nomor_asli': 1, 'jawaban': None}, {'nomor_asli': 2, 'jawaban': 'B'}]},
+    ]
+    baris = list(csv.reader(io.StringIO(kunci_csv(varian_list))))
+    assert baris[0] == ['kode', 'nama_siswa', 'seed', 'urutan_soal_asli', 'no_1', 'no_2']
+    assert baris[1] == ['V01', 'Ani', '11', '2 1', 'C', 'A']
+    assert baris[2] == ['V02', '', '12', '1 2', '', 'B']
+
+
+def test_alirkan_zip_menghasilkan_arsip_utuh():
+    berkas = [(f'varian_{i}.pdf', bytes([i]) * 1000) for i in range(5)]
+    potongan = list(alirkan_zip(iter(berkas)))
+    assert len(potongan) > 1
+    with zipfile.ZipFile(io.BytesIO(b''.join(potongan))) as arsip:
+        assert [(nama, arsip.read(nama)) for nama in arsip.namelist()] == berkas
@@ -47,6 +47,54 @@ export const generateRppFromAI = async (formData) => {
     }
 };
 
+// Membaca respons text/event-stream dan memanggil onEvent(event, data) untuk setiap event SSE
+const bacaStreamSSE = async (response, onEvent) => {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let sisa = '';
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        sisa += decoder.decode(value, { stream: true });
+        const blok = sisa.split('\n\n');
+        sisa = blok.pop();
+        for (const teksEvent of blok) {
+            let event = 'message';
+            let data = '';
+            for (const baris of teksEvent.split('\n')) {
+                if (baris.startsWith('event: ')) event = baris.slice(7);
+                else if (baris.startsWith('data: ')) data += baris.slice(6);
+            }
+            onEvent(event, data ? JSON.parse(data) : null);
+        }
+    }
+};
+
+// Versi streaming: onChunk dipanggil untuk setiap potongan markdown, hasil akhir berisi usage
+export const generateRppFromAIStream = async (formData, onChunk) => {
+    const response = await fetch(`${API_URL}/generate-rpp/stream`, {
+        method: 'POST',
+        headers: {
+            'Authorization': getAuthHeader()
+        },
+        body: formData,
+    });
+    if (!response.ok) {
+        const errorData = await response.json();
+        throw new Error(errorData.message || 'Gagal menghasilkan RPP dari AI.');
+    }
+
+    let hasilAkhir = null;
+    let pesanError = null;
+    await bacaStreamSSE(response, (event, data) => {
+        if (event === 'chunk') onChunk(data.teks);
+        else if (event === 'selesai') hasilAkhir = data;
+        else if (event === 'error') pesanError = data.message;
+    });
+    if (pesanError) throw new Error(pesanError);
+    return hasilAkhir;
+};
+
 export const simpanRpp = async (rppData) => {
     try {
         const response = await fetch(`${API_URL}/rpp`, {
@@ -208,6 +256,34 @@ export const generateSoalFromAI = async (data) => {
     }
 };
 
+// Versi streaming: onSoal(indeks, soal) dipanggil begitu satu soal selesai dibuat,
+// onGambar(indeks, saranGambar) saat pencarian gambar untuk soal tersebut selesai
+export const generateSoalFromAIStream = async (data, onSoal, onGambar) => {
+    const response = await fetch(`${API_URL}/generate-soal/stream`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'Authorization': getAuthHeader()
+        },
+        body: JSON.stringify(data),
+    });
+    if (!response.ok) {
+        const errorData = await response.json();
+        throw new Error(errorData.message || 'Gagal menghasilkan soal dari AI.');
+    }
+
+    let hasilAkhir = null;
+    let pesanError = null;
+    await bacaStreamSSE(response, (event, isi) => {
+        if (event === 'soal') onSoal(isi.indeks, isi.soal);
+        else if (event === 'gambar') onGambar(isi.indeks, isi.saran_gambar);
+        else if (event === 'selesai') hasilAkhir = isi;
+        else if (event === 'error') pesanError = isi.message;
+    });
+    if (pesanError) throw new Error(pesanError);
+    return hasilAkhir;
+};
+
 export const simpanSoal = async (soalData) => {
     try {
         const response = await fetch(`${API_URL}/soal`, {
@@ -361,6 +437,41 @@ export const deleteExam = async (idUjian) => {
     }
 };
 
+// Unduh PDF ujian yang sudah disimpan; dirender server dari data ujian tersimpan (tanpa mengirim ulang soal)
+export const downloadSavedExamPdf = async (idUjian, examTitle) => {
+    try {
+        const response = await fetch(`${API_URL}/ujian/${idUjian}/pdf`, {
+            headers: {
+                'Authorization': getAuthHeader()
+            }
+        });
+
+        if (!response.ok) {
+            const contentType = response.headers.get("content-type");
+            if (contentType && contentType.indexOf("application/json") !== -1) {
+                const errorData = await response.json();
+                throw new Error(errorData.message || 'Gagal mengunduh PDF ujian.');
+            } else {
+                throw new Error(`Gagal mengunduh PDF ujian. Status: ${response.status}`);
+            }
+        }
+
+        const blob = await response.blob();
+        const url = window.URL.createObjectURL(blob);
+        const a = document.createElement('a');
+        a.href = url;
+        a.download = `${examTitle.replace(/[^a-zA-Z0-9]/g, '_')}_ujian.pdf`;
+        document.body.appendChild(a);
+        a.click();
+        a.remove();
+        window.URL.revokeObjectURL(url);
+        return { message: 'PDF berhasil diunduh' };
+    } catch (error) {
+        console.error(`Error downloading saved exam PDF with ID ${idUjian}:`, error);
+        throw error;
+    }
+};
+
 export const downloadExamPdf = async (examTitle, questions, layoutSettings = {}) => {
     try {
         if (!questions || !Array.isArray(questions) || questions.length === 0) {
@@ -1,7 +1,7 @@
 // frontend/src/pages/ExamLibraryPage.jsx
 
 import React, { useEffect, useState } from 'react';
-import { getAllExams, deleteExam, downloadExamPdf, getExamById } from '../api/aiService';
+import { getAllExams, deleteExam, downloadExamPdf, downloadSavedExamPdf, getExamById } from '../api/aiService';
 import { Link, useNavigate } from 'react-router-dom';
 import {
     Container, Box, Typography,
@@ -86,9 +86,9 @@ const ExamLibraryPage = () => {
         }
     };
 
-    const handleDownloadExam = async (examTitle, questionsData, layoutSettings) => {
+    const handleDownloadExam = async (examId, examTitle) => {
         try {
-            await downloadExamPdf(examTitle, questionsData, layoutSettings);
+            await downloadSavedExamPdf(examId, examTitle);
             showSnackbar('Ujian PDF berhasil diunduh!', 'success');
         } catch (err) {
             showSnackbar(`${err.message || 'Gagal mengunduh PDF ujian.'}`, 'error');
@@ -236,7 +236,7 @@ const ExamLibraryPage = () => {
                                         </IconButton>
                                         <IconButton
                                             aria-label="download"
-                                            onClick={() => handleDownloadExam(exam.judul, exam.konten_json, exam.layout || {})}
+                                            onClick={() => handleDownloadExam(exam.id, exam.judul)}
                                             color="success"
                                         >
                                             <DownloadIcon />